@@ -0,0 +1,252 @@
+"""
+MoziTranslate - Batch translation jobs module
+Background jobs that extract and translate every page of a document (or a
+page range) with bounded parallelism, with progress, pause, resume and cancel
+"""
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from uuid import uuid4
+
+from config import BATCH_JOB_CONCURRENCY, BATCH_JOB_HISTORY
+
+logger = logging.getLogger("batch_jobs")
+
+# Coroutine function that translates (doc_id, page_number, source_lang, target_lang) into the caches
+PageTranslator = Callable[[str, int, str, str], Awaitable[Any]]
+
+# Job states
+PENDING = "pending"
+RUNNING = "running"
+PAUSED = "paused"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+FINISHED_STATES = (COMPLETED, CANCELLED, FAILED)
+
+# Maximum number of page errors kept per job
+MAX_JOB_ERRORS = 20
+
+
+class BatchJobError(Exception):
+    """Exception raised for invalid batch job operations."""
+    pass
+
+
+class JobNotFoundError(BatchJobError):
+    """Exception raised when a job ID is unknown."""
+    pass
+
+
+class TranslationJob:
+    """State of one batch translation job."""
+
+    def __init__(self, doc_id: str, start_page: int, end_page: int, source_lang: str, target_lang: str):
+        self.job_id = str(uuid4())
+        self.doc_id = doc_id
+        self.start_page = start_page
+        self.end_page = end_page
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.status = PENDING
+        self.pages_done = 0
+        self.pages_failed = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        # Set while the job may run; cleared to pause the workers between pages
+        self._running = asyncio.Event()
+        self._running.set()
+        self._changed = asyncio.Condition()
+        self._version = 0
+
+    @property
+    def total_pages(self) -> int:
+        return self.end_page - self.start_page + 1
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    @property
+    def version(self) -> int:
+        """Counter incremented on every change of the job."""
+        return self._version
+
+    async def notify(self) -> None:
+        """Records a change and wakes up progress watchers."""
+        async with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+
+    async def wait_for_change(self, seen_version: int, timeout: float) -> None:
+        """Waits until the job changes after ``seen_version`` or the timeout expires."""
+        async with self._changed:
+            try:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: self._version != seen_version), timeout
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns a JSON-serializable snapshot of the job."""
+        processed = self.pages_done + self.pages_failed
+        return {
+            'job_id': self.job_id,
+            'doc_id': self.doc_id,
+            'status': self.status,
+            'start_page': self.start_page,
+            'end_page': self.end_page,
+            'source_lang': self.source_lang,
+            'target_lang': self.target_lang,
+            'total_pages': self.total_pages,
+            'pages_done': self.pages_done,
+            'pages_failed': self.pages_failed,
+            'progress': round(processed / self.total_pages * 100, 1) if self.total_pages else 100.0,
+            'errors': list(self.errors),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class BatchJobManager:
+    """
+    Starts and tracks batch translation jobs. Each job translates its pages
+    with at most ``concurrency`` pages in flight; results land in the caches
+    used by the interactive page endpoint.
+    """
+
+    def __init__(self, translate_page: PageTranslator, concurrency: int = BATCH_JOB_CONCURRENCY,
+                 history_size: int = BATCH_JOB_HISTORY):
+        self.translate_page = translate_page
+        self.concurrency = max(1, concurrency)
+        self.history_size = history_size
+        self._jobs: "OrderedDict[str, TranslationJob]" = OrderedDict()
+
+    def start_job(self, doc_id: str, start_page: int, end_page: int,
+                  source_lang: str, target_lang: str) -> TranslationJob:
+        """Creates a job and starts it in the background."""
+        if start_page < 1 or end_page < start_page:
+            raise BatchJobError(f"Invalid page range {start_page}-{end_page}")
+
+        job = TranslationJob(doc_id, start_page, end_page, source_lang, target_lang)
+        self._jobs[job.job_id] = job
+        self._forget_old_jobs()
+        job.task = asyncio.ensure_future(self._run(job))
+        return job
+
+    def _forget_old_jobs(self) -> None:
+        """Drops the oldest finished jobs beyond the history size."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.is_finished]
+        while len(self._jobs) > self.history_size and finished:
+            del self._jobs[finished.pop(0)]
+
+    def get_job(self, job_id: str) -> TranslationJob:
+        """Returns a job by ID."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise JobNotFoundError(f"Job {job_id} not found")
+        return job
+
+    def list_jobs(self, doc_id: Optional[str] = None) -> List[TranslationJob]:
+        """Returns the known jobs, optionally only those of a document."""
+        return [job for job in self._jobs.values() if doc_id is None or job.doc_id == doc_id]
+
+    async def pause_job(self, job_id: str) -> TranslationJob:
+        """Pauses a job after the pages currently in flight."""
+        job = self.get_job(job_id)
+        if job.is_finished:
+            raise BatchJobError(f"Job {job_id} is already {job.status}")
+        job._running.clear()
+        job.status = PAUSED
+        await job.notify()
+        return job
+
+    async def resume_job(self, job_id: str) -> TranslationJob:
+        """Resumes a paused job."""
+        job = self.get_job(job_id)
+        if job.status != PAUSED:
+            raise BatchJobError(f"Job {job_id} is not paused")
+        job.status = RUNNING
+        job._running.set()
+        await job.notify()
+        return job
+
+    async def cancel_job(self, job_id: str) -> TranslationJob:
+        """Cancels a job; pages already translated stay cached."""
+        job = self.get_job(job_id)
+        if job.is_finished:
+            raise BatchJobError(f"Job {job_id} is already {job.status}")
+        if job.task is not None:
+            job.task.cancel()
+            try:
+                await job.task
+            except asyncio.CancelledError:
+                pass
+        return job
+
+    def cancel_document(self, doc_id: str) -> None:
+        """Cancels every unfinished job of a document."""
+        for job in self.list_jobs(doc_id):
+            if not job.is_finished and job.task is not None:
+                job.task.cancel()
+
+    async def watch(self, job_id: str, keepalive: float = 15.0) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields a snapshot of the job whenever it changes, and at least every
+        ``keepalive`` seconds, until the job finishes.
+        """
+        job = self.get_job(job_id)
+        while True:
+            seen_version = job.version
+            yield job.to_dict()
+            if job.is_finished:
+                return
+            await job.wait_for_change(seen_version, keepalive)
+
+    async def _run(self, job: TranslationJob) -> None:
+        """Translates the pages of a job with bounded parallelism."""
+        pages = deque(range(job.start_page, job.end_page + 1))
+        if job.status == PENDING:
+            job.status = RUNNING
+        job.started_at = datetime.now().isoformat()
+        await job.notify()
+
+        async def worker():
+            while pages:
+                await job._running.wait()
+                if not pages:
+                    break
+                page_number = pages.popleft()
+                try:
+                    await self.translate_page(job.doc_id, page_number, job.source_lang, job.target_lang)
+                    job.pages_done += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    job.pages_failed += 1
+                    if len(job.errors) < MAX_JOB_ERRORS:
+                        job.errors.append({'page': page_number, 'error': str(e)})
+                    logger.warning(f"Job {job.job_id}: page {page_number} failed: {str(e)}")
+                await job.notify()
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(self.concurrency, len(pages)))]
+        try:
+            await asyncio.gather(*workers)
+            job.status = FAILED if job.pages_failed == job.total_pages else COMPLETED
+        except asyncio.CancelledError:
+            for task in workers:
+                task.cancel()
+            job.status = CANCELLED
+        except Exception as e:
+            logger.error(f"Job {job.job_id} failed: {str(e)}")
+            job.status = FAILED
+        finally:
+            job.finished_at = datetime.now().isoformat()
+            await job.notify()
@@ -0,0 +1,149 @@
+"""
+MoziTranslate - Concurrency benchmark
+Measures latency of a cheap endpoint while a slow page translation is in
+progress, to check that get_page no longer blocks the event loop.
+
+Usage:
+    python bench_concurrency.py [--delay 3.0] [--requests 200]
+
+A local stub translation server answering after --delay seconds is used as
+the upstream, so no external API is called.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SlowTranslateHandler(BaseHTTPRequestHandler):
+    """Stub gtx endpoint that answers after a fixed delay."""
+    protocol_version = "HTTP/1.1"
+    delay = 3.0
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        self._answer(query["q"][0])
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = urllib.parse.parse_qs(self.rfile.read(length).decode("utf-8"))
+        self._answer(form["q"][0])
+
+    def _answer(self, text: str) -> None:
+        time.sleep(self.delay)
+        body = json.dumps([[[text.upper(), text, None, None]]]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(delay: float) -> str:
+    """Starts the stub upstream in a background thread and returns its URL."""
+    SlowTranslateHandler.delay = delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowTranslateHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/translate_a/single"
+
+
+def make_sample_pdf(pages: int) -> str:
+    """Writes a small text PDF and returns its path."""
+    import fitz
+
+    document = fitz.open()
+    for number in range(pages):
+        page = document.new_page()
+        page.insert_text((72, 72), f"Benchmark page {number + 1}. " * 5)
+    path = os.path.join(tempfile.gettempdir(), "mozi_bench_concurrency.pdf")
+    document.save(path)
+    document.close()
+    return path
+
+
+def start_api_server(port: int) -> None:
+    """Runs the FastAPI app with uvicorn in a background thread."""
+    import uvicorn
+    from main import app
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+
+def measure(url: str, count: int) -> list:
+    """Sends sequential GET requests and returns their latencies in milliseconds."""
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        with urllib.request.urlopen(url) as response:
+            response.read()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def summarize(label: str, latencies: list) -> None:
+    """Prints p50/p99/max for a latency sample."""
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{label:<28} p50={statistics.median(ordered):7.2f} ms  "
+          f"p99={p99:7.2f} ms  max={ordered[-1]:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--delay", type=float, default=3.0, help="stub translation delay in seconds")
+    parser.add_argument("--requests", type=int, default=200, help="probe requests per phase")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    # The upstream URL must be configured before the translation client is imported
+    os.environ["MOZI_TRANSLATE_URL"] = start_stub_server(args.delay)
+    os.environ.setdefault("MOZI_TRANSLATION_MEMORY_DB", os.path.join(tempfile.gettempdir(), "mozi_bench_tm.db"))
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+    from pdf_processor import open_pdf
+    from translation_memory import translation_memory
+
+    translation_memory.clear()
+    start_api_server(args.port)
+    doc_id, _ = open_pdf(make_sample_pdf(pages=4))
+
+    base = f"http://127.0.0.1:{args.port}"
+    probe_url = f"{base}/pdf/cache/stats"
+
+    summarize("idle", measure(probe_url, args.requests))
+
+    # Fire slow page requests in the background and probe while they are in flight
+    slow_threads = []
+    for page in range(1, 5):
+        page_url = f"{base}/pdf/{doc_id}/page/{page}?source_lang=en&target_lang=pt"
+        thread = threading.Thread(target=measure, args=(page_url, 1))
+        thread.start()
+        slow_threads.append(thread)
+    time.sleep(0.2)
+
+    started = time.perf_counter()
+    summarize("during slow translation", measure(probe_url, args.requests))
+    in_flight = any(thread.is_alive() for thread in slow_threads)
+
+    for thread in slow_threads:
+        thread.join()
+    print(f"slow page requests finished after {time.perf_counter() - started + 0.2:.2f} s "
+          f"(still in flight while probing: {in_flight})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+MoziTranslate - History database benchmark
+Measures read/write throughput of the reading history under concurrent
+clients, comparing the per-thread WAL connections of PdfHistoryDB with the
+previous pattern of one connection per call in rollback-journal mode.
+
+Usage:
+    python bench_history.py [--clients 8] [--operations 2000] [--documents 200]
+
+Each client mixes progress updates (80%), single-document reads (15%) and
+history listings (5%), like readers turning pages.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pdf_history_db import PdfHistoryDB
+
+
+class PerCallHistoryDB(PdfHistoryDB):
+    """The previous access pattern: a new connection for every call, rollback journal."""
+
+    journal_mode = "DELETE"
+
+    def _connection(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path)
+
+
+def populate(db: PdfHistoryDB, documents: int) -> None:
+    """Adds the documents the clients read."""
+    for number in range(documents):
+        db.add_or_update_pdf({'pdf_id': f"doc-{number}", 'filename': f"document-{number}.pdf",
+                              'file_path': f"/tmp/document-{number}.pdf", 'total_pages': 300})
+
+
+def run_client(db: PdfHistoryDB, operations: int, documents: int, seed: int,
+               latencies: list, failures: list) -> None:
+    """Runs one client's mix of reads and writes, recording latencies in milliseconds."""
+    rng = random.Random(seed)
+    local_latencies = []
+    local_failures = 0
+    for _ in range(operations):
+        pdf_id = f"doc-{rng.randrange(documents)}"
+        choice = rng.random()
+        started = time.perf_counter()
+        if choice < 0.8:
+            ok = db.update_progress(pdf_id, rng.randint(1, 300), 300)
+        elif choice < 0.95:
+            ok = db.get_pdf_by_id(pdf_id) is not None
+        else:
+            ok = bool(db.get_history(limit=20))
+        local_latencies.append((time.perf_counter() - started) * 1000)
+        local_failures += 0 if ok else 1
+    latencies.extend(local_latencies)
+    failures.append(local_failures)
+
+
+def benchmark(label: str, db: PdfHistoryDB, clients: int, operations: int, documents: int) -> None:
+    """Runs the clients against a database and prints throughput and latency."""
+    populate(db, documents)
+    latencies: list = []
+    failures: list = []
+    threads = [
+        threading.Thread(target=run_client, args=(db, operations, documents, seed, latencies, failures))
+        for seed in range(clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{label:<26} {len(ordered) / elapsed:9.0f} ops/s  p50={statistics.median(ordered):7.2f} ms  "
+          f"p99={p99:7.2f} ms  failed={sum(failures)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--clients", type=int, default=8, help="concurrent client threads")
+    parser.add_argument("--operations", type=int, default=2000, help="operations per client")
+    parser.add_argument("--documents", type=int, default=200, help="documents in the history")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for label, db_class in (("per-call connections", PerCallHistoryDB),
+                                ("per-thread WAL", PdfHistoryDB)):
+            db = db_class(os.path.join(directory, f"{db_class.__name__}.db"))
+            try:
+                benchmark(label, db, args.clients, args.operations, args.documents)
+            finally:
+                db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+MoziTranslate - History pagination benchmark
+Measures history page latency as the table grows: keyset pages against
+OFFSET pages at the same depth, and FTS5 filename search against a LIKE scan.
+
+Usage:
+    python bench_history_pages.py [--rows 10000 100000 300000] [--repeat 50]
+
+Each page holds 20 entries; deep pages start after 90% of the table.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pdf_history_db import HISTORY_COLUMNS, PdfHistoryDB, encode_cursor
+
+WORDS = ["manual", "report", "thesis", "invoice", "contract", "handbook", "guide", "paper",
+         "notes", "slides", "python", "physics", "history", "budget", "annual", "draft"]
+LANGUAGES = ["Português", "English", "Español", "Français"]
+PAGE_SIZE = 20
+
+
+def populate(db: PdfHistoryDB, rows: int, start: int) -> None:
+    """Appends rows to the history, with random names, languages, progress and read dates."""
+    rng = random.Random(start)
+    base = datetime(2020, 1, 1)
+    batch = []
+    for number in range(start, rows):
+        name = "_".join(rng.sample(WORDS, 3)) + f"_{number}.pdf"
+        read = (base + timedelta(seconds=rng.randrange(150_000_000))).isoformat()
+        batch.append((f"doc-{number}", name, rng.randint(1, 300), 300, rng.choice([10.0, 50.0, 100.0]),
+                      rng.choice(LANGUAGES), read, read))
+    with db._connection() as conn:
+        conn.executemany('''
+            INSERT INTO pdf_history (pdf_id, filename, last_page, total_pages, progress, language,
+                                     upload_date, last_read_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', batch)
+
+
+def timed(func, repeat: int) -> float:
+    """Returns the median latency of a call in milliseconds."""
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return statistics.median(latencies)
+
+
+def offset_page(db: PdfHistoryDB, offset: int) -> list:
+    """The OFFSET query keyset pagination replaces."""
+    with db._connection() as conn:
+        return conn.execute(f'''
+            SELECT {', '.join(HISTORY_COLUMNS)} FROM pdf_history
+            ORDER BY last_read_date DESC, id DESC LIMIT ? OFFSET ?
+        ''', (PAGE_SIZE, offset)).fetchall()
+
+
+def like_search(db: PdfHistoryDB, term: str) -> list:
+    """The substring scan the FTS5 index replaces."""
+    with db._connection() as conn:
+        return conn.execute(f'''
+            SELECT {', '.join(HISTORY_COLUMNS)} FROM pdf_history WHERE filename LIKE ?
+            ORDER BY last_read_date DESC, id DESC LIMIT ?
+        ''', (f"%{term}%", PAGE_SIZE)).fetchall()
+
+
+def cursor_at(db: PdfHistoryDB, depth: int) -> str:
+    """Returns the cursor of the page that starts after ``depth`` entries."""
+    with db._connection() as conn:
+        last_read_date, row_id = conn.execute('''
+            SELECT last_read_date, id FROM pdf_history
+            ORDER BY last_read_date DESC, id DESC LIMIT 1 OFFSET ?
+        ''', (depth - 1,)).fetchone()
+    return encode_cursor(last_read_date, row_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 300_000],
+                        help="table sizes to measure, in increasing order")
+    parser.add_argument("--repeat", type=int, default=50, help="calls per measurement")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'first':>8} {'keyset':>8} {'offset':>8} {'filter':>8} {'fts':>8} {'like':>8}   (median ms)")
+    with tempfile.TemporaryDirectory() as directory:
+        db = PdfHistoryDB(os.path.join(directory, "history.db"))
+        populated = 0
+        for rows in sorted(args.rows):
+            populate(db, rows, populated)
+            populated = rows
+            depth = rows * 9 // 10
+            cursor = cursor_at(db, depth)
+            # A selective search: one generated name
+            term = f"_{rows // 3}.pdf"
+            results = [
+                timed(lambda: db.get_history_page(limit=PAGE_SIZE), args.repeat),
+                timed(lambda: db.get_history_page(limit=PAGE_SIZE, cursor=cursor), args.repeat),
+                timed(lambda: offset_page(db, depth), args.repeat),
+                timed(lambda: db.get_history_page(limit=PAGE_SIZE, cursor=cursor, language="English",
+                                                  completed=True), args.repeat),
+                timed(lambda: db.get_history_page(limit=PAGE_SIZE, search=str(rows // 3)), args.repeat),
+                timed(lambda: like_search(db, term), args.repeat)
+            ]
+            print(f"{rows:>8} " + " ".join(f"{value:8.3f}" for value in results))
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+MoziTranslate - Configuration module
+Reads runtime settings from environment variables with sensible defaults
+"""
+import os
+import tempfile
+
+
+def _env_int(name: str, default: int) -> int:
+    """Reads an integer setting from the environment."""
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Reads a float setting from the environment."""
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+# Translation memory (persistent translation cache)
+TRANSLATION_MEMORY_DB = os.environ.get("MOZI_TRANSLATION_MEMORY_DB", "translation_memory.db")
+TRANSLATION_MEMORY_LRU_SIZE = _env_int("MOZI_TRANSLATION_MEMORY_LRU_SIZE", 2048)
+
+# Reading history database (one connection per thread, WAL journal)
+PDF_HISTORY_DB = os.environ.get("MOZI_PDF_HISTORY_DB", "pdf_history.db")
+HISTORY_DB_BUSY_TIMEOUT = _env_float("MOZI_HISTORY_DB_BUSY_TIMEOUT", 5.0)
+HISTORY_DB_CACHED_STATEMENTS = _env_int("MOZI_HISTORY_DB_CACHED_STATEMENTS", 128)
+# Reading-progress updates are buffered and written in one transaction per flush
+PROGRESS_FLUSH_INTERVAL = _env_float("MOZI_PROGRESS_FLUSH_INTERVAL", 5.0)
+PROGRESS_FLUSH_MAX_PENDING = _env_int("MOZI_PROGRESS_FLUSH_MAX_PENDING", 256)
+
+# Content-addressed store of uploaded PDFs
+PDF_STORE_DIR = os.environ.get("MOZI_PDF_STORE_DIR", os.path.join(tempfile.gettempdir(), "mozi_pdf_store"))
+PDF_STORE_MAX_BYTES = _env_int("MOZI_PDF_STORE_MAX_BYTES", 2 * 1024 * 1024 * 1024)
+
+# Uploads (streamed to disk in chunks; large files in resumable sessions)
+UPLOAD_MAX_BYTES = _env_int("MOZI_UPLOAD_MAX_BYTES", 512 * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = _env_int("MOZI_UPLOAD_CHUNK_SIZE", 1024 * 1024)
+UPLOAD_SESSION_TTL = _env_float("MOZI_UPLOAD_SESSION_TTL", 86400.0)
+UPLOAD_WORKERS = _env_int("MOZI_UPLOAD_WORKERS", 4)
+UPLOAD_WRITE_TIMEOUT = _env_float("MOZI_UPLOAD_WRITE_TIMEOUT", 30.0)
+
+# Open document sessions
+DOCUMENT_MAX_OPEN = _env_int("MOZI_DOCUMENT_MAX_OPEN", 32)
+DOCUMENT_IDLE_TIMEOUT = _env_float("MOZI_DOCUMENT_IDLE_TIMEOUT", 1800.0)
+DOCUMENT_MAX_SESSIONS = _env_int("MOZI_DOCUMENT_MAX_SESSIONS", 1000)
+DOCUMENT_SWEEP_INTERVAL = _env_float("MOZI_DOCUMENT_SWEEP_INTERVAL", 60.0)
+# Clients (uploads, reopened tabs) unused for this long are released by the sweep
+DOCUMENT_CLIENT_TIMEOUT = _env_float("MOZI_DOCUMENT_CLIENT_TIMEOUT", 86400.0)
+
+# Document index (per-document analysis: repeated headers, footers and boilerplate)
+DOCUMENT_INDEX_DB = os.environ.get("MOZI_DOCUMENT_INDEX_DB", "document_index.db")
+# Fraction of the page height at the top and bottom where running headers and footers live
+HEADER_FOOTER_BAND = _env_float("MOZI_HEADER_FOOTER_BAND", 0.08)
+# Pages a block must appear on to be treated as repeated
+REPEATED_BLOCK_MIN_PAGES = _env_int("MOZI_REPEATED_BLOCK_MIN_PAGES", 3)
+# Pages the extraction pass stores per transaction
+EXTRACT_BATCH_PAGES = _env_int("MOZI_EXTRACT_BATCH_PAGES", 16)
+# Words around the matches in page search snippets
+SEARCH_SNIPPET_TOKENS = _env_int("MOZI_SEARCH_SNIPPET_TOKENS", 16)
+
+# Page result cache (extracted text and translation per page and language pair)
+PAGE_CACHE_MAX_ENTRIES = _env_int("MOZI_PAGE_CACHE_MAX_ENTRIES", 2000)
+PAGE_CACHE_MAX_BYTES = _env_int("MOZI_PAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+# Rendered page image cache
+IMAGE_CACHE_MAX_ENTRIES = _env_int("MOZI_IMAGE_CACHE_MAX_ENTRIES", 500)
+IMAGE_CACHE_MAX_BYTES = _env_int("MOZI_IMAGE_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+IMAGE_CACHE_MAX_AGE = _env_int("MOZI_IMAGE_CACHE_MAX_AGE", 31536000)
+
+# Upstream translation client
+TRANSLATE_URL = os.environ.get("MOZI_TRANSLATE_URL", "https://translate.googleapis.com/translate_a/single")
+TRANSLATE_TIMEOUT = _env_float("MOZI_TRANSLATE_TIMEOUT", 5.0)
+TRANSLATE_POOL_SIZE = _env_int("MOZI_TRANSLATE_POOL_SIZE", 8)
+TRANSLATE_MAX_CONCURRENCY = _env_int("MOZI_TRANSLATE_MAX_CONCURRENCY", 4)
+TRANSLATE_RATE_PER_SECOND = _env_float("MOZI_TRANSLATE_RATE_PER_SECOND", 5.0)
+TRANSLATE_BURST = _env_int("MOZI_TRANSLATE_BURST", 5)
+# Maximum UTF-8 bytes of short segments packed into one upstream request
+TRANSLATE_BATCH_MAX_BYTES = _env_int("MOZI_TRANSLATE_BATCH_MAX_BYTES", 4500)
+
+# Page pipeline executors and per-stage timeouts (seconds)
+# PyMuPDF documents are not thread-safe, so fitz work runs on a single thread by default
+PDF_WORKERS = _env_int("MOZI_PDF_WORKERS", 1)
+TRANSLATION_WORKERS = _env_int("MOZI_TRANSLATION_WORKERS", 8)
+RENDER_TIMEOUT = _env_float("MOZI_RENDER_TIMEOUT", 30.0)
+EXTRACT_TIMEOUT = _env_float("MOZI_EXTRACT_TIMEOUT", 15.0)
+TRANSLATION_STAGE_TIMEOUT = _env_float("MOZI_TRANSLATION_STAGE_TIMEOUT", 60.0)
+
+# Rendering process pool (0 workers renders on the PDF executor thread instead)
+RENDER_WORKERS = _env_int("MOZI_RENDER_WORKERS", os.cpu_count() or 1)
+RENDER_WORKER_MAX_DOCUMENTS = _env_int("MOZI_RENDER_WORKER_MAX_DOCUMENTS", 16)
+
+# Page image rendering
+MIN_ZOOM = 0.25
+MAX_ZOOM = 4.0
+DEFAULT_IMAGE_QUALITY = _env_int("MOZI_DEFAULT_IMAGE_QUALITY", 80)
+# Share of the page area covered by images above which a page counts as a scan/photo
+IMAGE_PAGE_COVERAGE = _env_float("MOZI_IMAGE_PAGE_COVERAGE", 0.5)
+
+# Progressive rendering: cheap preview first, then the full image or tiles
+PREVIEW_ZOOM = _env_float("MOZI_PREVIEW_ZOOM", 0.5)
+PREVIEW_QUALITY = _env_int("MOZI_PREVIEW_QUALITY", 60)
+TILE_SIZE = _env_int("MOZI_TILE_SIZE", 512)
+MAX_TILE_ZOOM = _env_float("MOZI_MAX_TILE_ZOOM", 8.0)
+
+# History card thumbnails (small JPEGs rendered in the background at upload)
+THUMBNAIL_DIR = os.environ.get("MOZI_THUMBNAIL_DIR", os.path.join(tempfile.gettempdir(), "mozi_thumbnails"))
+THUMBNAIL_WIDTH = _env_int("MOZI_THUMBNAIL_WIDTH", 160)
+THUMBNAIL_QUALITY = _env_int("MOZI_THUMBNAIL_QUALITY", 70)
+THUMBNAIL_MAX_BYTES = _env_int("MOZI_THUMBNAIL_MAX_BYTES", 64 * 1024 * 1024)
+
+# Server-side read-ahead of upcoming pages
+READ_AHEAD_MAX_WINDOW = _env_int("MOZI_READ_AHEAD_MAX_WINDOW", 6)
+READ_AHEAD_CONCURRENCY = _env_int("MOZI_READ_AHEAD_CONCURRENCY", 2)
+# Seconds of reading the prefetch window should cover at the reader's current pace
+READ_AHEAD_HORIZON = _env_float("MOZI_READ_AHEAD_HORIZON", 20.0)
+# Seconds after which an inactive reader and its unread prefetches are forgotten
+READ_AHEAD_IDLE_TIMEOUT = _env_float("MOZI_READ_AHEAD_IDLE_TIMEOUT", 600.0)
+
+# Whole-document batch translation jobs
+BATCH_JOB_CONCURRENCY = _env_int("MOZI_BATCH_JOB_CONCURRENCY", 3)
+BATCH_JOB_HISTORY = _env_int("MOZI_BATCH_JOB_HISTORY", 100)
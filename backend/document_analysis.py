@@ -0,0 +1,123 @@
+"""
+MoziTranslate - Document analysis module
+Finds the text blocks that repeat across the pages of a document (running
+headers, footers, boilerplate) and the number-only blocks (page numbers),
+so they are translated once or not at all
+"""
+import hashlib
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from config import HEADER_FOOTER_BAND
+from translation_memory import normalize_segment
+
+# Roles of a page unit
+ROLE_TEXT = "text"
+ROLE_NUMBER = "number"
+ROLE_REPEATED = "repeated"
+
+# Position bands of a unit on its page
+BAND_HEADER = "header"
+BAND_FOOTER = "footer"
+BAND_BODY = "body"
+
+_NUMBER = re.compile(r"\d+")
+# Digits with punctuation only ("12", "- 12 -", "3/40", "2.1")
+_NUMBER_ONLY = re.compile(r"^[\W\d_]*\d[\W\d_]*$")
+# A well-formed roman numeral in one case ("xiv", "XIV"); words such as "mix" or "CD"
+# match too, so these only count as page numbers in the header and footer bands
+_ROMAN_NUMERAL = re.compile(
+    r"^(?=[mdclxvi])m{0,3}(cm|cd|d?c{0,3})(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})\.?$"
+    r"|^(?=[MDCLXVI])M{0,3}(CM|CD|D?C{0,3})(XC|XL|L?X{0,3})(IX|IV|V?I{0,3})\.?$"
+)
+
+
+def position_band(bbox: List[float], page_height: float, band: float = HEADER_FOOTER_BAND) -> str:
+    """Tells whether a unit lies in the header band, the footer band or the body of its page."""
+    if page_height <= 0:
+        return BAND_BODY
+    if bbox[3] <= page_height * band:
+        return BAND_HEADER
+    if bbox[1] >= page_height * (1 - band):
+        return BAND_FOOTER
+    return BAND_BODY
+
+
+def is_number_only(text: str, band: str = BAND_BODY) -> bool:
+    """
+    Detects units that need no translation, such as page numbers. Roman
+    numerals are only recognized in the header and footer bands.
+    """
+    text = text.strip()
+    if _NUMBER_ONLY.match(text):
+        return True
+    return band != BAND_BODY and bool(_ROMAN_NUMERAL.match(text))
+
+
+def block_signature(text: str, band: str) -> str:
+    """
+    Returns the signature of a unit for repeat detection: its position band
+    and its normalized text. In the header and footer bands digits are
+    masked, so "Page 3" and "Page 4" of a running footer share one
+    signature; body text must repeat exactly.
+    """
+    text = normalize_segment(text)
+    if band != BAND_BODY:
+        text = _NUMBER.sub("#", text)
+    return hashlib.sha256(f"{band}\x00{text}".encode("utf-8")).hexdigest()[:32]
+
+
+def find_repeated_blocks(pages: Iterable[List[Dict[str, Any]]], min_pages: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Finds the units that appear on at least ``min_pages`` pages.
+
+    Args:
+        pages: Segments of every page, each with ``text`` and ``band``
+        min_pages: Number of pages a unit must appear on to count as repeated
+
+    Returns:
+        Dict mapping block signatures to their band, a sample text and the
+        number of pages they appear on
+    """
+    blocks: Dict[str, Dict[str, Any]] = {}
+    for segments in pages:
+        seen_on_page: Set[str] = set()
+        for segment in segments:
+            if is_number_only(segment['text'], segment['band']):
+                continue
+            signature = block_signature(segment['text'], segment['band'])
+            if signature in seen_on_page:
+                continue
+            seen_on_page.add(signature)
+            block = blocks.setdefault(signature, {'band': segment['band'], 'sample_text': segment['text'],
+                                                  'pages': 0})
+            block['pages'] += 1
+    return {signature: block for signature, block in blocks.items() if block['pages'] >= min_pages}
+
+
+def classify_segment(segment: Dict[str, Any], repeated_signatures: Optional[Set[str]]) -> str:
+    """Returns the role of a unit given the repeated blocks of its document (None if not analyzed yet)."""
+    if is_number_only(segment['text'], segment['band']):
+        return ROLE_NUMBER
+    if repeated_signatures and block_signature(segment['text'], segment['band']) in repeated_signatures:
+        return ROLE_REPEATED
+    return ROLE_TEXT
+
+
+def reuse_translation(source_text: str, translated_text: str, text: str) -> Optional[str]:
+    """
+    Adapts the translation of one occurrence of a repeated block to another
+    occurrence that differs only in its numbers ("Page 3" -> "Page 4").
+
+    Returns:
+        The adapted translation, or None if the numbers of the source do not
+        appear in the same order in its translation
+    """
+    if normalize_segment(source_text) == normalize_segment(text):
+        return translated_text
+    source_numbers = _NUMBER.findall(source_text)
+    new_numbers = _NUMBER.findall(text)
+    if len(source_numbers) != len(new_numbers) or _NUMBER.findall(translated_text) != source_numbers:
+        return None
+    replacements = iter(new_numbers)
+    return _NUMBER.sub(lambda match: next(replacements), translated_text)
@@ -0,0 +1,465 @@
+"""
+MoziTranslate - Document index module
+Per-document analysis results stored in SQLite and keyed on the PDF content
+hash: the extracted units of every page, the repeated blocks of a document
+and their translations, and a full-text index of the original and translated
+text of its pages
+"""
+import json
+import logging
+import re
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from config import DOCUMENT_INDEX_DB, SEARCH_SNIPPET_TOKENS
+
+logger = logging.getLogger("document_index")
+
+# Language key of the original text of a page in the page text index
+ORIGINAL_TEXT = ""
+
+# Words of a search query; the FTS tokenizer splits text the same way
+_SEARCH_TERM = re.compile(r"\w+")
+
+# Snippet highlight markers (private use characters, absent from page text)
+_HIGHLIGHT_START = "\ue000"
+_HIGHLIGHT_END = "\ue001"
+
+
+def encode_segments(segments: List[Dict[str, Any]]) -> bytes:
+    """
+    Packs the units of a page into a compressed blob: a JSON array of
+    ``[text, bbox, band]`` triples, with bounding boxes rounded to 1/100 point.
+    """
+    rows = [[segment['text'], [round(value, 2) for value in segment['bbox']], segment['band']]
+            for segment in segments]
+    return zlib.compress(json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_segments(blob: bytes) -> List[Dict[str, Any]]:
+    """Unpacks the units of a page packed by ``encode_segments``."""
+    return [{'text': text, 'bbox': bbox, 'band': band}
+            for text, bbox, band in json.loads(zlib.decompress(blob).decode("utf-8"))]
+
+
+class SearchUnavailableError(Exception):
+    """Exception raised when SQLite was built without FTS5."""
+    pass
+
+
+def build_match_query(content_hash: str, query: str) -> Optional[str]:
+    """
+    Builds an FTS5 query for pages of one document whose text contains
+    every word of ``query`` (the last one as a prefix, for search as you type).
+
+    Returns:
+        The FTS5 query, or None if ``query`` has no words
+    """
+    terms = _SEARCH_TERM.findall(query)
+    if not terms:
+        return None
+    phrases = [f'"{term}"' for term in terms]
+    phrases[-1] += "*"
+    return f'content_hash : "{content_hash}" AND text : ({" AND ".join(phrases)})'
+
+
+def parse_snippet(snippet: str) -> Tuple[str, List[Tuple[int, int]]]:
+    """Removes the highlight markers of a snippet and returns it with the (start, end) offsets of the matches."""
+    text: List[str] = []
+    highlights: List[Tuple[int, int]] = []
+    length = 0
+    start = 0
+    for part in re.split(f"([{_HIGHLIGHT_START}{_HIGHLIGHT_END}])", snippet):
+        if part == _HIGHLIGHT_START:
+            start = length
+        elif part == _HIGHLIGHT_END:
+            highlights.append((start, length))
+        else:
+            text.append(part)
+            length += len(part)
+    return "".join(text), highlights
+
+
+class DocumentIndex:
+    """
+    SQLite store of document analyses. The repeated-block signatures of
+    recently used documents are also kept in memory, since they are checked
+    for every translated page.
+    """
+
+    def __init__(self, db_path: str = DOCUMENT_INDEX_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._signatures: Dict[str, Set[str]] = {}
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.init_database()
+
+    def init_database(self):
+        """Initialize the SQLite database with the document analysis tables"""
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS document_analysis (
+                    content_hash TEXT PRIMARY KEY,
+                    page_count INTEGER NOT NULL,
+                    analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS repeated_blocks (
+                    content_hash TEXT NOT NULL,
+                    signature TEXT NOT NULL,
+                    band TEXT NOT NULL,
+                    sample_text TEXT NOT NULL,
+                    page_count INTEGER NOT NULL,
+                    PRIMARY KEY (content_hash, signature)
+                )
+            ''')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS block_translations (
+                    content_hash TEXT NOT NULL,
+                    signature TEXT NOT NULL,
+                    source_lang TEXT NOT NULL,
+                    target_lang TEXT NOT NULL,
+                    source_text TEXT NOT NULL,
+                    translated_text TEXT NOT NULL,
+                    PRIMARY KEY (content_hash, signature, source_lang, target_lang)
+                )
+            ''')
+            # Units of every page, extracted once per file and read instead of PyMuPDF afterwards
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS page_extracts (
+                    content_hash TEXT NOT NULL,
+                    page_number INTEGER NOT NULL,
+                    segments BLOB NOT NULL,
+                    char_count INTEGER NOT NULL,
+                    image_only INTEGER NOT NULL,
+                    PRIMARY KEY (content_hash, page_number)
+                ) WITHOUT ROWID
+            ''')
+            self.fts_enabled = self._init_page_text_index()
+            self._conn.commit()
+
+    def _init_page_text_index(self) -> bool:
+        """Creates the page text table and its FTS5 index; returns False if SQLite lacks FTS5."""
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS page_texts (
+                id INTEGER PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                page_number INTEGER NOT NULL,
+                language TEXT NOT NULL,
+                text TEXT NOT NULL,
+                UNIQUE (content_hash, page_number, language)
+            )
+        ''')
+        try:
+            # The content hash is indexed too, so a search only visits the pages of one document
+            self._conn.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS page_text_fts USING fts5(
+                    content_hash, text, content='page_texts', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 unavailable, page search is disabled: {str(e)}")
+            return False
+        self._conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS page_text_fts_insert AFTER INSERT ON page_texts BEGIN
+                INSERT INTO page_text_fts(rowid, content_hash, text) VALUES (new.id, new.content_hash, new.text);
+            END
+        ''')
+        self._conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS page_text_fts_delete AFTER DELETE ON page_texts BEGIN
+                INSERT INTO page_text_fts(page_text_fts, rowid, content_hash, text)
+                VALUES ('delete', old.id, old.content_hash, old.text);
+            END
+        ''')
+        self._conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS page_text_fts_update AFTER UPDATE OF text ON page_texts BEGIN
+                INSERT INTO page_text_fts(page_text_fts, rowid, content_hash, text)
+                VALUES ('delete', old.id, old.content_hash, old.text);
+                INSERT INTO page_text_fts(rowid, content_hash, text) VALUES (new.id, new.content_hash, new.text);
+            END
+        ''')
+        return True
+
+    def save_analysis(self, content_hash: str, page_count: int, repeated: Dict[str, Dict[str, Any]]) -> None:
+        """Stores the analysis of a document, replacing any previous one."""
+        with self._lock:
+            try:
+                self._conn.execute('DELETE FROM repeated_blocks WHERE content_hash = ?', (content_hash,))
+                self._conn.executemany('''
+                    INSERT INTO repeated_blocks (content_hash, signature, band, sample_text, page_count)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [(content_hash, signature, block['band'], block['sample_text'], block['pages'])
+                      for signature, block in repeated.items()])
+                self._conn.execute('''
+                    INSERT OR REPLACE INTO document_analysis (content_hash, page_count, analyzed_at)
+                    VALUES (?, ?, ?)
+                ''', (content_hash, page_count, datetime.now().isoformat()))
+                self._conn.commit()
+            except sqlite3.Error:
+                self._conn.rollback()
+                raise
+            self._signatures[content_hash] = set(repeated)
+
+    def is_analyzed(self, content_hash: str) -> bool:
+        """Whether a document has been analyzed."""
+        return self.get_repeated_signatures(content_hash) is not None
+
+    def get_repeated_signatures(self, content_hash: str) -> Optional[Set[str]]:
+        """Returns the signatures of the repeated blocks of a document, or None if it was not analyzed."""
+        with self._lock:
+            signatures = self._signatures.get(content_hash)
+            if signatures is not None:
+                return signatures
+
+            row = self._conn.execute(
+                'SELECT 1 FROM document_analysis WHERE content_hash = ?', (content_hash,)
+            ).fetchone()
+            if row is None:
+                return None
+            rows = self._conn.execute(
+                'SELECT signature FROM repeated_blocks WHERE content_hash = ?', (content_hash,)
+            ).fetchall()
+            signatures = {signature for (signature,) in rows}
+            self._signatures[content_hash] = signatures
+            return signatures
+
+    def get_analysis(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Returns the stored analysis of a document, or None if it was not analyzed."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT page_count, analyzed_at FROM document_analysis WHERE content_hash = ?',
+                (content_hash,)
+            ).fetchone()
+            if row is None:
+                return None
+            blocks = self._conn.execute('''
+                SELECT band, sample_text, page_count FROM repeated_blocks
+                WHERE content_hash = ? ORDER BY page_count DESC
+            ''', (content_hash,)).fetchall()
+            return {
+                'page_count': row[0],
+                'analyzed_at': row[1],
+                'repeated_blocks': [
+                    {'band': band, 'sample_text': sample_text, 'pages': pages}
+                    for band, sample_text, pages in blocks
+                ]
+            }
+
+    def get_block_translation(self, content_hash: str, signature: str,
+                              source_lang: str, target_lang: str) -> Optional[Tuple[str, str]]:
+        """Returns (source_text, translated_text) of a translated repeated block, or None."""
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT source_text, translated_text FROM block_translations
+                WHERE content_hash = ? AND signature = ? AND source_lang = ? AND target_lang = ?
+            ''', (content_hash, signature, source_lang, target_lang)).fetchone()
+            return (row[0], row[1]) if row else None
+
+    def put_block_translation(self, content_hash: str, signature: str, source_lang: str,
+                              target_lang: str, source_text: str, translated_text: str) -> None:
+        """Stores the translation of one occurrence of a repeated block."""
+        with self._lock:
+            try:
+                self._conn.execute('''
+                    INSERT OR IGNORE INTO block_translations
+                    (content_hash, signature, source_lang, target_lang, source_text, translated_text)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (content_hash, signature, source_lang, target_lang, source_text, translated_text))
+                self._conn.commit()
+            except sqlite3.Error as e:
+                # The block is simply translated again next time
+                logger.error(f"Failed to store block translation: {str(e)}")
+
+    def put_page_extract(self, content_hash: str, page_number: int,
+                         segments: List[Dict[str, Any]], image_only: bool = False) -> None:
+        """
+        Stores the extracted units of a page, replacing any earlier extract.
+
+        Args:
+            content_hash: Content hash of the document
+            page_number: 1-based page number
+            segments: Units of the page with ``text``, ``bbox`` and ``band``
+            image_only: Whether the page has no text but shows images (e.g. a scan)
+        """
+        self.put_page_extracts(content_hash, [(page_number, segments, image_only)])
+
+    def put_page_extracts(self, content_hash: str,
+                          extracts: Iterable[Tuple[int, List[Dict[str, Any]], bool]]) -> None:
+        """
+        Stores the extracted units of several pages in one transaction,
+        replacing any earlier extracts.
+
+        Args:
+            content_hash: Content hash of the document
+            extracts: (page_number, segments, image_only) tuples, as for ``put_page_extract``
+        """
+        rows = [
+            (content_hash, page_number, encode_segments(segments),
+             sum(len(segment['text']) for segment in segments), int(image_only))
+            for page_number, segments, image_only in extracts
+        ]
+        if not rows:
+            return
+        with self._lock:
+            try:
+                self._conn.executemany('''
+                    INSERT OR REPLACE INTO page_extracts (content_hash, page_number, segments, char_count, image_only)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', rows)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                # The pages are extracted again the next time they are needed
+                self._conn.rollback()
+                logger.error(f"Failed to store page extracts: {str(e)}")
+
+    def get_page_extract(self, content_hash: str, page_number: int) -> Optional[Dict[str, Any]]:
+        """
+        Returns the stored extract of a page, or None if it was not extracted.
+
+        Returns:
+            Dict with segments, char_count, empty and image_only
+        """
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT segments, char_count, image_only FROM page_extracts
+                WHERE content_hash = ? AND page_number = ?
+            ''', (content_hash, page_number)).fetchone()
+        if row is None:
+            return None
+        return {
+            'segments': decode_segments(row[0]),
+            'char_count': row[1],
+            'empty': row[1] == 0,
+            'image_only': bool(row[2])
+        }
+
+    def get_page_segments(self, content_hash: str) -> Dict[int, List[Dict[str, Any]]]:
+        """Returns the stored units of every extracted page of a document, by page number."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT page_number, segments FROM page_extracts WHERE content_hash = ?', (content_hash,)
+            ).fetchall()
+        return {page_number: decode_segments(blob) for page_number, blob in rows}
+
+    def get_extracted_pages(self, content_hash: str) -> Set[int]:
+        """Returns the numbers of the extracted pages of a document."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT page_number FROM page_extracts WHERE content_hash = ?', (content_hash,)
+            ).fetchall()
+        return {page_number for (page_number,) in rows}
+
+    def get_extract_summary(self, content_hash: str) -> Dict[str, int]:
+        """Returns the extracted pages of a document, their characters and how many are empty or image-only."""
+        with self._lock:
+            pages, characters, empty, image_only = self._conn.execute('''
+                SELECT COUNT(*), COALESCE(SUM(char_count), 0), COALESCE(SUM(char_count = 0), 0),
+                       COALESCE(SUM(image_only), 0)
+                FROM page_extracts WHERE content_hash = ?
+            ''', (content_hash,)).fetchone()
+        return {'pages': pages, 'characters': characters, 'empty_pages': empty, 'image_only_pages': image_only}
+
+    def put_page_texts(self, content_hash: str, pages: Iterable[Tuple[int, str, str]]) -> None:
+        """
+        Indexes page texts in one transaction, replacing earlier texts of the
+        same page and language; unchanged texts are not rewritten.
+
+        Args:
+            content_hash: Content hash of the document
+            pages: (page_number, language, text) tuples; the language of
+                original text is ``ORIGINAL_TEXT``
+        """
+        rows = [(content_hash, page_number, language, text) for page_number, language, text in pages if text]
+        if not rows:
+            return
+        with self._lock:
+            try:
+                self._conn.executemany('''
+                    INSERT INTO page_texts (content_hash, page_number, language, text) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(content_hash, page_number, language) DO UPDATE
+                    SET text = excluded.text WHERE text != excluded.text
+                ''', rows)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                # The pages are indexed again the next time they are produced
+                self._conn.rollback()
+                logger.error(f"Failed to index page text: {str(e)}")
+
+    def count_indexed_pages(self, content_hash: str) -> int:
+        """Returns the number of pages of a document with indexed text."""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(DISTINCT page_number) FROM page_texts WHERE content_hash = ?', (content_hash,)
+            ).fetchone()[0]
+
+    def search_pages(self, content_hash: str, query: str, language: Optional[str] = None,
+                     limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Finds the pages of a document whose original or translated text
+        contains every word of a query, best matches first.
+
+        Args:
+            content_hash: Content hash of the document
+            query: Words to find (the last one as a prefix)
+            language: Only search the translations into this language
+                (``ORIGINAL_TEXT`` for the original text); all texts by default
+            limit: Maximum number of results
+
+        Returns:
+            List of dicts with page_number, language, score, a snippet and
+            the (start, end) offsets of the matches in the snippet
+
+        Raises:
+            ValueError: If the query has no words
+            SearchUnavailableError: If SQLite was built without FTS5
+        """
+        if not self.fts_enabled:
+            raise SearchUnavailableError("Full-text search is not available")
+        match_query = build_match_query(content_hash, query)
+        if match_query is None:
+            raise ValueError("Search query must contain at least one word")
+
+        language_filter = 'AND page_texts.language = ?' if language is not None else ''
+        params: List[Any] = [_HIGHLIGHT_START, _HIGHLIGHT_END, SEARCH_SNIPPET_TOKENS, match_query]
+        if language is not None:
+            params.append(language)
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(f'''
+                SELECT page_texts.page_number, page_texts.language,
+                       snippet(page_text_fts, 1, ?, ?, '…', ?), bm25(page_text_fts, 0.0, 1.0) AS score
+                FROM page_text_fts JOIN page_texts ON page_texts.id = page_text_fts.rowid
+                WHERE page_text_fts MATCH ? {language_filter}
+                ORDER BY score
+                LIMIT ?
+            ''', params).fetchall()
+
+        results = []
+        for page_number, text_language, snippet, score in rows:
+            snippet, highlights = parse_snippet(snippet)
+            results.append({
+                'page_number': page_number,
+                'language': text_language or None,
+                'original': text_language == ORIGINAL_TEXT,
+                # bm25 is lower for better matches
+                'score': round(-score, 4),
+                'snippet': snippet,
+                'highlights': [list(highlight) for highlight in highlights]
+            })
+        return results
+
+    def close(self) -> None:
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+# Initialize global document index instance
+document_index = DocumentIndex()
@@ -0,0 +1,439 @@
+"""
+MoziTranslate - Document session module
+Bounded pool of open document handles: least recently used and idle handles
+are closed, handles in use are reference counted, and sessions whose handle
+was closed are reopened transparently from their file path. Each client that
+opens a document gets its own client ID on the shared session
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from uuid import uuid4
+
+from config import DOCUMENT_CLIENT_TIMEOUT, DOCUMENT_IDLE_TIMEOUT, DOCUMENT_MAX_OPEN, DOCUMENT_MAX_SESSIONS
+
+logger = logging.getLogger("document_sessions")
+
+# Opens a document handle from a path; the handle must have close()
+DocumentOpener = Callable[[str], Any]
+# Computes the content hash of a file
+FileHasher = Callable[[str], str]
+# Finds the file path of a doc_id the manager does not know (e.g. after a restart)
+PathResolver = Callable[[str], Optional[str]]
+
+# Separates the document ID embedded in a client ID from the client's own part
+CLIENT_ID_SEPARATOR = "~"
+
+
+def client_document_id(client_id: str) -> Optional[str]:
+    """Returns the document ID embedded in a client ID, or None if the ID is not a client ID."""
+    doc_id, separator, _ = client_id.partition(CLIENT_ID_SEPARATOR)
+    return doc_id if separator and doc_id else None
+
+
+class DocumentNotFoundError(Exception):
+    """Exception raised when a document ID is unknown and cannot be resolved."""
+    pass
+
+
+class DocumentSession:
+    """One opened document: its file, content hash, page count and (possibly closed) handle."""
+
+    def __init__(self, doc_id: str, file_path: str, content_hash: str, page_count: int, document: Any):
+        self.doc_id = doc_id
+        self.file_path = file_path
+        self.content_hash = content_hash
+        self.page_count = page_count
+        self.document = document
+        self.refs = 0
+        self.last_used = time.monotonic()
+        # Held while an evicted handle is reopened, so concurrent users reopen it once
+        self.reopen_lock = threading.Lock()
+        # Set by close() while the handle is in use; the handle is closed on release
+        self.closing = False
+
+
+class ClientHandle:
+    """One client's use of a shared session, e.g. an upload or a browser tab reading it."""
+
+    def __init__(self, client_id: str, doc_id: str):
+        self.client_id = client_id
+        self.doc_id = doc_id
+        self.last_used = time.monotonic()
+
+
+class DocumentSessionManager:
+    """
+    Keeps at most ``max_open`` document handles open.
+
+    A session outlives its handle: when the handle is evicted (least
+    recently used beyond ``max_open``, or idle for ``idle_timeout``
+    seconds), the session keeps its path and metadata and the handle is
+    reopened on the next access. Handles in use (see ``acquire``) are never
+    evicted. Opening a file that already has a session returns that session.
+
+    Clients share sessions through client IDs (see ``add_client``), which
+    every method accepts in place of the document ID. A session ends when
+    its last client is released, so one client closing a document does not
+    end it for the others. A client ID embeds its document ID, so a client
+    the manager no longer knows (after a restart or once it expired) is
+    registered again on its next access.
+    """
+
+    def __init__(self, opener: DocumentOpener, hasher: FileHasher,
+                 max_open: int = DOCUMENT_MAX_OPEN, idle_timeout: float = DOCUMENT_IDLE_TIMEOUT,
+                 max_sessions: int = DOCUMENT_MAX_SESSIONS, path_resolver: Optional[PathResolver] = None,
+                 client_timeout: float = DOCUMENT_CLIENT_TIMEOUT):
+        self.opener = opener
+        self.hasher = hasher
+        self.max_open = max(1, max_open)
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.path_resolver = path_resolver
+        self.client_timeout = client_timeout
+        self._sessions: "OrderedDict[str, DocumentSession]" = OrderedDict()
+        self._by_path: Dict[str, str] = {}
+        self._clients: Dict[str, ClientHandle] = {}
+        # Number of clients of each document ID
+        self._client_counts: Dict[str, int] = {}
+        # One lock per document ID being restored, so concurrent requests restore it once
+        self._restoring: Dict[str, threading.Lock] = {}
+        self._lock = threading.RLock()
+        self._opened = 0
+        self._reopened = 0
+        self._reused = 0
+        self._evicted = 0
+
+    @staticmethod
+    def _path_key(file_path: str) -> str:
+        """Normalizes a path so that different spellings of one file match."""
+        return os.path.normcase(os.path.realpath(file_path))
+
+    def open(self, file_path: str, doc_id: Optional[str] = None) -> DocumentSession:
+        """
+        Returns the session of a file, opening the file if it has none.
+
+        Args:
+            file_path: Path to the document
+            doc_id: ID for a new session (a random UUID by default)
+
+        Returns:
+            The existing or new session
+        """
+        path_key = self._path_key(file_path)
+        session = self._reuse(path_key)
+        if session is None:
+            # Opening and hashing read the file, so they run without the lock; a
+            # concurrent open of the same file may win, and this handle is dropped
+            document = self.opener(file_path)
+            try:
+                content_hash = self.hasher(file_path)
+                page_count = len(document)
+            except Exception:
+                document.close()
+                raise
+            with self._lock:
+                session = self._reuse(path_key)
+                if session is None:
+                    self._opened += 1
+                    session = DocumentSession(doc_id or str(uuid4()), file_path, content_hash,
+                                              page_count, document)
+                    self._sessions[session.doc_id] = session
+                    self._by_path[path_key] = session.doc_id
+                    self._enforce_limits()
+                    return session
+            document.close()
+        self._ensure_open(session)
+        return session
+
+    def _reuse(self, path_key: str) -> Optional[DocumentSession]:
+        """Returns the session of an already opened file (its handle may be closed), or None."""
+        with self._lock:
+            existing_id = self._by_path.get(path_key)
+            if existing_id is None or existing_id not in self._sessions:
+                return None
+            self._reused += 1
+            session = self._sessions[existing_id]
+            self._touch(session)
+            return session
+
+    def has_path(self, file_path: str) -> bool:
+        """Whether a session (with an open or evicted handle) uses a file."""
+        with self._lock:
+            return self._path_key(file_path) in self._by_path
+
+    def add_client(self, doc_id: str) -> str:
+        """
+        Registers a new client of a session.
+
+        Returns:
+            The client ID (the document ID and a random part), accepted wherever the document ID is
+
+        Raises:
+            DocumentNotFoundError: If the document ID is unknown and cannot be resolved
+        """
+        doc_id = self.get_session(doc_id).doc_id
+        with self._lock:
+            return self._register_client(f"{doc_id}{CLIENT_ID_SEPARATOR}{uuid4().hex}", doc_id)
+
+    def _register_client(self, client_id: str, doc_id: str) -> str:
+        """Records a client of a session. Callers hold the lock."""
+        self._clients[client_id] = ClientHandle(client_id, doc_id)
+        self._client_counts[doc_id] = self._client_counts.get(doc_id, 0) + 1
+        return client_id
+
+    def resolve(self, doc_id: str) -> str:
+        """
+        Returns the document ID a client ID refers to (marking the client as
+        active), the document ID embedded in a client ID the manager does not
+        know, or the ID itself.
+        """
+        with self._lock:
+            client = self._clients.get(doc_id)
+            if client is None:
+                return client_document_id(doc_id) or doc_id
+            client.last_used = time.monotonic()
+            return client.doc_id
+
+    def release_client(self, client_id: str) -> Optional[str]:
+        """
+        Releases a client, or ends a session opened without clients when
+        given its document ID. The session ends with its last client.
+
+        Returns:
+            The document ID of the session that ended, or None if other clients still use it
+
+        Raises:
+            DocumentNotFoundError: If the ID is unknown
+        """
+        with self._lock:
+            client = self._clients.pop(client_id, None)
+            if client is None:
+                if client_document_id(client_id) is not None:
+                    # Already released (e.g. expired, or before a restart): nothing is left to end
+                    return None
+                if self._client_counts.get(client_id):
+                    # The shared document ID of a session with clients: only they can end it
+                    return None
+                self.close(client_id)
+                return client_id
+            remaining = self._client_counts[client.doc_id] - 1
+            if remaining:
+                self._client_counts[client.doc_id] = remaining
+                return None
+            del self._client_counts[client.doc_id]
+            if client.doc_id in self._sessions:
+                self.close(client.doc_id)
+            return client.doc_id
+
+    def expire_clients(self) -> Dict[str, Optional[str]]:
+        """
+        Releases the clients unused for longer than the client timeout,
+        e.g. browser tabs closed without closing their document.
+
+        Returns:
+            The released client IDs, each with the document ID of the session it ended (or None)
+        """
+        deadline = time.monotonic() - self.client_timeout
+        with self._lock:
+            expired = [client.client_id for client in self._clients.values() if client.last_used < deadline]
+            return {client_id: self.release_client(client_id) for client_id in expired}
+
+    def get_session(self, doc_id: str) -> DocumentSession:
+        """
+        Returns the session of a document or client ID, restoring it through
+        the path resolver if it is unknown. A client ID the manager does not
+        know is registered again. The handle may be closed.
+
+        Raises:
+            DocumentNotFoundError: If the ID is unknown and cannot be resolved
+        """
+        requested_id = doc_id
+        doc_id = self.resolve(doc_id)
+        session = self._known_session(doc_id) or self._restore(doc_id)
+        return self._readd_client(requested_id, session)
+
+    def _known_session(self, doc_id: str) -> Optional[DocumentSession]:
+        """Returns the session of a document ID (marking it as used), or None if it is unknown."""
+        with self._lock:
+            session = self._sessions.get(doc_id)
+            if session is not None:
+                self._touch(session)
+            return session
+
+    def _restore(self, doc_id: str) -> DocumentSession:
+        """
+        Restores an unknown session through the path resolver. Concurrent
+        restores of one ID wait for the first instead of repeating it, and
+        none of them holds the manager lock while the file is looked up,
+        opened and hashed.
+        """
+        with self._lock:
+            restore_lock = self._restoring.setdefault(doc_id, threading.Lock())
+        try:
+            with restore_lock:
+                # Restored by another request while this one waited
+                session = self._known_session(doc_id)
+                if session is not None:
+                    return session
+                file_path = self.path_resolver(doc_id) if self.path_resolver else None
+                if not file_path or not os.path.exists(file_path):
+                    raise DocumentNotFoundError(f"Document with ID {doc_id} not found")
+                logger.info(f"Restoring session {doc_id} from {file_path}")
+                return self.open(file_path, doc_id)
+        finally:
+            with self._lock:
+                if self._restoring.get(doc_id) is restore_lock:
+                    del self._restoring[doc_id]
+
+    def _readd_client(self, requested_id: str, session: DocumentSession) -> DocumentSession:
+        """Registers again a client ID of the session that the manager no longer knows."""
+        if requested_id != session.doc_id and client_document_id(requested_id) is not None:
+            with self._lock:
+                if requested_id not in self._clients:
+                    logger.info(f"Restoring client {requested_id} of session {session.doc_id}")
+                    self._register_client(requested_id, session.doc_id)
+        return session
+
+    @contextmanager
+    def acquire(self, doc_id: str) -> Iterator[Any]:
+        """
+        Yields the open handle of a document, reopening it if it was evicted.
+        The handle is not evicted or closed while it is held.
+        """
+        while True:
+            session = self.get_session(doc_id)
+            with self._lock:
+                # Hold the reference first, so enforcing the limit cannot close this handle;
+                # a session closed since the lookup is looked up (or restored) again
+                if self._sessions.get(session.doc_id) is session:
+                    session.refs += 1
+                    break
+        try:
+            self._ensure_open(session)
+        except Exception:
+            with self._lock:
+                session.refs -= 1
+            raise
+        try:
+            yield session.document
+        finally:
+            with self._lock:
+                session.refs -= 1
+                session.last_used = time.monotonic()
+                if session.closing and session.refs == 0:
+                    self._close_handle(session)
+                else:
+                    self._enforce_limits()
+
+    def close(self, doc_id: str) -> None:
+        """
+        Ends a session, whatever clients it has (see ``release_client``).
+        A handle in use is closed when it is released.
+
+        Raises:
+            DocumentNotFoundError: If the ID is unknown
+        """
+        with self._lock:
+            session = self._sessions.pop(doc_id, None)
+            if session is None:
+                raise DocumentNotFoundError(f"Document with ID {doc_id} not found")
+            self._by_path.pop(self._path_key(session.file_path), None)
+            if session.refs:
+                session.closing = True
+            else:
+                self._close_handle(session)
+
+    def evict_idle(self) -> int:
+        """Closes the handles unused for longer than the idle timeout and returns how many were closed."""
+        deadline = time.monotonic() - self.idle_timeout
+        closed = 0
+        with self._lock:
+            for session in self._sessions.values():
+                if session.document is not None and not session.refs and session.last_used < deadline:
+                    self._close_handle(session)
+                    self._evicted += 1
+                    closed += 1
+        return closed
+
+    def close_all(self) -> None:
+        """Closes every handle and forgets every session."""
+        with self._lock:
+            for session in self._sessions.values():
+                self._close_handle(session)
+            self._sessions.clear()
+            self._by_path.clear()
+            self._clients.clear()
+            self._client_counts.clear()
+
+    def _touch(self, session: DocumentSession) -> None:
+        """Marks a session as most recently used; the caller must hold the lock."""
+        session.last_used = time.monotonic()
+        self._sessions.move_to_end(session.doc_id)
+
+    def _ensure_open(self, session: DocumentSession) -> None:
+        """Reopens an evicted handle, opening the file without the manager lock; callers do not hold it."""
+        if session.document is not None:
+            return
+        with session.reopen_lock:
+            if session.document is not None:
+                return
+            document = self.opener(session.file_path)
+            with self._lock:
+                # A session closed while its file was reopened keeps the handle only while it is in use
+                if session.refs or self._sessions.get(session.doc_id) is session:
+                    session.document = document
+                    self._reopened += 1
+                    self._enforce_limits()
+                    return
+            document.close()
+
+    def _close_handle(self, session: DocumentSession) -> None:
+        """Closes the handle of a session; the caller must hold the lock."""
+        if session.document is not None:
+            try:
+                session.document.close()
+            except Exception as e:
+                logger.warning(f"Failed to close document {session.doc_id}: {str(e)}")
+            session.document = None
+
+    def _enforce_limits(self) -> None:
+        """Closes least recently used idle handles beyond the limit; the caller must hold the lock."""
+        open_sessions = [session for session in self._sessions.values() if session.document is not None]
+        excess = len(open_sessions) - self.max_open
+        for session in open_sessions:
+            if excess <= 0:
+                break
+            if not session.refs:
+                self._close_handle(session)
+                self._evicted += 1
+                excess -= 1
+
+        # Sessions are cheap, but forget the oldest closed ones beyond the limit, unless clients use them
+        while len(self._sessions) > self.max_sessions:
+            oldest = next((session for session in self._sessions.values()
+                           if session.document is None and session.doc_id not in self._client_counts), None)
+            if oldest is None:
+                break
+            del self._sessions[oldest.doc_id]
+            self._by_path.pop(self._path_key(oldest.file_path), None)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Returns open handle and session counters."""
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'open_handles': sum(1 for session in self._sessions.values() if session.document is not None),
+                'in_use': sum(1 for session in self._sessions.values() if session.refs),
+                'clients': len(self._clients),
+                'opened': self._opened,
+                'reopened': self._reopened,
+                'reused': self._reused,
+                'evicted': self._evicted,
+                'max_open': self.max_open,
+                'idle_timeout': self.idle_timeout
+            }
@@ -2,27 +2,85 @@
 MoziTranslate - Main FastAPI application
 Provides API endpoints for PDF upload, page rendering and translation
 """
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
+import asyncio
+import json
+import math
 import os
 import traceback
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 # Import local modules
-from translator import translate_with_cache, TranslationError
+from translator import TranslationError
 from pdf_processor import (
-    save_uploaded_pdf, 
-    get_document, 
-    render_page_to_image,
-    extract_text_from_page,
+    store_uploaded_file,
     get_page_count,
+    get_document_hash,
+    add_document_client,
     close_document,
     PDFProcessingError,
+    document_sessions,
     open_pdf
 )
 from pdf_history_db import pdf_history_db
+from translation_memory import translation_memory
+from document_index import document_index, ORIGINAL_TEXT, SearchUnavailableError
+from pdf_store import pdf_store
+from thumbnails import thumbnail_store
+from upload_sessions import (
+    upload_sessions,
+    IncrementalUpload,
+    InvalidUploadError,
+    UploadNotFoundError,
+    UploadOffsetError,
+    UploadTooLargeError
+)
+from page_cache import page_cache, image_cache
+from config import (
+    DEFAULT_IMAGE_QUALITY,
+    IMAGE_CACHE_MAX_AGE,
+    MAX_TILE_ZOOM,
+    MAX_ZOOM,
+    MIN_ZOOM,
+    PREVIEW_QUALITY,
+    PREVIEW_ZOOM,
+    PROGRESS_FLUSH_INTERVAL,
+    RENDER_TIMEOUT,
+    TILE_SIZE,
+    UPLOAD_CHUNK_SIZE,
+    UPLOAD_WRITE_TIMEOUT
+)
+from batch_jobs import BatchJobError, JobNotFoundError
+from render_engine import IMAGE_FORMATS, WEBP_SUPPORTED, RenderOptions, normalize_render_options
+from page_pipeline import (
+    load_page,
+    load_page_image,
+    stream_page,
+    warm_page_image,
+    read_ahead,
+    batch_jobs,
+    get_page_dimensions,
+    page_image_etag,
+    run_stage,
+    page_flights,
+    image_flights,
+    pdf_executor,
+    upload_executor,
+    cancel_on_disconnect,
+    schedule_document_analysis,
+    generate_thumbnail,
+    schedule_thumbnails,
+    cancel_client_work,
+    THUMBNAIL_OPTIONS,
+    sweep_idle_documents,
+    shutdown_executors,
+    ClientDisconnectedError,
+    StageTimeoutError
+)
 
 app = FastAPI(
     title="MoziTranslate API",
@@ -39,16 +97,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def _history_file_path(doc_id: str) -> Optional[str]:
+    """Finds the stored file of a document ID in the history, to restore evicted or lost sessions"""
+    pdf_data = pdf_history_db.get_pdf_by_id(doc_id)
+    return pdf_data.get('file_path') if pdf_data else None
+
+document_sessions.path_resolver = _history_file_path
+
+async def flush_progress_periodically(interval: float = PROGRESS_FLUSH_INTERVAL):
+    """Write buffered reading progress to the history in one transaction per interval"""
+    while True:
+        await asyncio.sleep(interval)
+        await run_in_threadpool(pdf_history_db.flush_progress)
+
+@app.on_event("startup")
+async def start_document_sweeper():
+    """Close idle document handles and write buffered progress periodically"""
+    app.state.document_sweeper = asyncio.ensure_future(sweep_idle_documents())
+    app.state.progress_flusher = asyncio.ensure_future(flush_progress_periodically())
+
+@app.on_event("shutdown")
+def shutdown_page_pipeline():
+    """Stop the page pipeline executors and write buffered progress"""
+    app.state.document_sweeper.cancel()
+    app.state.progress_flusher.cancel()
+    shutdown_executors()
+    # Closing the history writes the progress still buffered
+    pdf_history_db.close()
+
 # Models for request/response
 class UploadResponse(BaseModel):
+    # Client ID of this upload or reopen, used for the /pdf/{doc_id} endpoints
     doc_id: str
+    # ID of the document in the history, shared by every client of the file
+    pdf_id: str
     page_count: int
     filename: str
+    already_known: bool = False
+    # Page the reader stopped at, for files already in the history
+    last_page: int = 1
+
+class UploadSessionRequest(BaseModel):
+    filename: str
+    total_size: int
+
+class PageSegment(BaseModel):
+    text: str
+    translated_text: str
+    bbox: List[float]
 
 class PageResponse(BaseModel):
-    page_image: str
+    image_url: str
+    preview_url: str
+    tile_url: str
+    page_width: float
+    page_height: float
     original_text: str
     translated_text: str
+    segments: List[PageSegment] = []
     page_number: int
     total_pages: int
 
@@ -65,6 +171,12 @@ class PdfHistoryItem(BaseModel):
     last_read_date: str
     thumbnail_path: Optional[str] = None
 
+class TranslateDocumentRequest(BaseModel):
+    source_lang: str = "auto"
+    target_lang: str = "en"
+    start_page: int = 1
+    end_page: Optional[int] = None
+
 class ProgressUpdateRequest(BaseModel):
     pdf_id: str
     current_page: int
@@ -80,49 +192,202 @@ class AddPdfHistoryRequest(BaseModel):
     language: str = "Português"
     language_flag: str = "🇧🇷"
     upload_date: Optional[str] = None
-    total_pages: int
 
-# Cache for page translations
-translation_cache: Dict[str, Dict[int, str]] = {}
+def _thumbnail_pages(last_page: int) -> List[int]:
+    """Pages shown on a history card: the first one and the one the reader stopped at"""
+    return [1, last_page] if last_page > 1 else [1]
+
+def _schedule_history_thumbnails(doc_id: str, last_page: int) -> None:
+    """Render the history card thumbnails of a document in the background and record the cover"""
+    async def record_cover(paths: Dict[int, str]):
+        if 1 in paths:
+            await run_in_threadpool(pdf_history_db.set_thumbnail, doc_id, paths[1])
+    
+    schedule_thumbnails(doc_id, _thumbnail_pages(last_page), record_cover)
+
+async def _write_chunk(upload: IncrementalUpload, chunk: bytes) -> None:
+    """Writes one upload chunk to disk off the event loop"""
+    await run_stage("upload", upload_executor, UPLOAD_WRITE_TIMEOUT, upload.write, chunk)
+
+async def _open_uploaded_pdf(filename: str, temp_path: str, content_hash: str) -> UploadResponse:
+    """
+    Move a completely received upload into the PDF store, open it and record it in the history
+    """
+    # Identical uploads share one stored file
+    file_path, already_stored = await run_stage(
+        "store", upload_executor, UPLOAD_WRITE_TIMEOUT, store_uploaded_file, temp_path, content_hash
+    )
+    
+    # A file already in the history keeps its ID, reading progress and warm caches
+    known_pdf = await run_in_threadpool(pdf_history_db.get_pdf_by_hash, content_hash)
+    doc_id, _ = await run_stage("open", pdf_executor, RENDER_TIMEOUT, open_pdf, file_path,
+                                known_pdf['pdf_id'] if known_pdf else None)
+    
+    # Get page count
+    page_count = await run_stage("open", pdf_executor, RENDER_TIMEOUT, get_page_count, doc_id)
+    
+    # Save to history with file path; a known file keeps its stored (or buffered) progress
+    pdf_data = {
+        'pdf_id': doc_id,
+        'filename': filename,
+        'file_path': file_path,
+        'content_hash': content_hash,
+        'total_pages': page_count
+    }
+    last_page = known_pdf['last_page'] if known_pdf else 1
+    if known_pdf:
+        pdf_data['language'] = known_pdf['language']
+        pdf_data['language_flag'] = known_pdf['language_flag']
+    await run_in_threadpool(pdf_history_db.add_or_update_pdf, pdf_data)
+    
+    # Find repeated headers and footers in the background
+    schedule_document_analysis(doc_id)
+    # Small previews for the history cards, so listing them never renders full pages
+    _schedule_history_thumbnails(doc_id, last_page)
+    
+    # Each upload gets its own client ID, so closing it leaves other readers of the file alone
+    return UploadResponse(
+        doc_id=add_document_client(doc_id),
+        pdf_id=doc_id,
+        page_count=page_count,
+        filename=filename,
+        already_known=already_stored,
+        last_page=last_page
+    )
 
 @app.post("/pdf/upload", response_model=UploadResponse)
 async def upload_pdf(file: UploadFile = File(...)):
     """
-    Upload a PDF file and get a document ID for future reference
+    Upload a PDF file and get a document ID for future reference.
+    The file is copied to disk in fixed-size chunks while it is hashed and
+    validated, so memory use does not grow with the file size
     """
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="File must be a PDF")
     
+    upload = upload_sessions.new_upload()
     try:
-        # Read file content
-        contents = await file.read()
-        
-        # Save and process the PDF
-        doc_id, file_path = save_uploaded_pdf(contents)
-        
-        # Get page count
-        page_count = get_page_count(doc_id)
-        
-        # Save to history with file path
-        pdf_data = {
-            'pdf_id': doc_id,
-            'filename': file.filename,
-            'file_path': file_path,
-            'total_pages': page_count,
-            'last_page': 1,
-            'progress': 0.0
-        }
-        pdf_history_db.add_or_update_pdf(pdf_data)
-        
-        return UploadResponse(
-            doc_id=doc_id,
-            page_count=page_count,
-            filename=file.filename
-        )
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            await _write_chunk(upload, chunk)
+        content_hash = upload.finish()
+        return await _open_uploaded_pdf(file.filename, upload.temp_path, content_hash)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except (InvalidUploadError, PDFProcessingError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to process PDF: {str(e)}")
+    finally:
+        # Nothing is left to remove once the file has moved into the store
+        upload.discard()
+
+# Resumable Upload Endpoints
+
+@app.post("/pdf/uploads", status_code=201)
+async def create_upload_session(request: UploadSessionRequest):
+    """
+    Start a resumable upload of a large PDF, sent afterwards in chunks
+    """
+    if not request.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+    try:
+        session = await run_stage("upload", upload_executor, UPLOAD_WRITE_TIMEOUT,
+                                  upload_sessions.create, request.filename, request.total_size)
+        return {"status": "success", "data": {**session.to_dict(), 'chunk_size': UPLOAD_CHUNK_SIZE}}
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Registered before /pdf/uploads/{upload_id}, which would otherwise match it
+@app.get("/pdf/uploads/stats")
+async def get_upload_statistics():
+    """
+    Get active resumable upload and completion counters
+    """
+    return {"status": "success", "data": upload_sessions.get_statistics()}
+
+@app.get("/pdf/uploads/{upload_id}")
+async def get_upload_session(upload_id: str):
+    """
+    Get the offset a resumable upload has reached, to continue it after an interruption
+    """
+    try:
+        return {"status": "success", "data": upload_sessions.get(upload_id).to_dict()}
+    except UploadNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.put("/pdf/uploads/{upload_id}")
+async def upload_chunk(request: Request, upload_id: str, offset: int = Query(..., ge=0)):
+    """
+    Append the request body to a resumable upload. The body must start at
+    the current offset of the upload; bytes received before a disconnect are kept
+    """
+    try:
+        session = upload_sessions.begin_chunk(upload_id, offset)
+    except UploadNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UploadOffsetError as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(e.offset)})
+    
+    try:
+        buffer = bytearray()
+        async for piece in request.stream():
+            buffer += piece
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                await _write_chunk(session.upload, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await _write_chunk(session.upload, bytes(buffer))
+        return {"status": "success", "data": session.to_dict()}
+    except (UploadTooLargeError, InvalidUploadError) as e:
+        # The file can never become a valid upload; drop what was received
+        # (end_chunk may run again below, which is harmless)
+        upload_sessions.end_chunk(session)
+        upload_sessions.abort(upload_id)
+        status_code = 413 if isinstance(e, UploadTooLargeError) else 400
+        raise HTTPException(status_code=status_code, detail=str(e))
+    finally:
+        upload_sessions.end_chunk(session)
+
+@app.post("/pdf/uploads/{upload_id}/complete", response_model=UploadResponse)
+async def complete_upload_session(upload_id: str):
+    """
+    Finish a resumable upload once every byte has arrived and open the PDF
+    """
+    try:
+        session, content_hash = upload_sessions.complete(upload_id)
+    except UploadNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UploadOffsetError as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(e.offset)})
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        return await _open_uploaded_pdf(session.filename, session.upload.temp_path, content_hash)
     except PDFProcessingError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process PDF: {str(e)}")
+    finally:
+        session.upload.discard()
+
+@app.delete("/pdf/uploads/{upload_id}")
+async def abort_upload_session(upload_id: str):
+    """
+    Abandon a resumable upload and delete the bytes received so far
+    """
+    try:
+        upload_sessions.abort(upload_id)
+        return {"status": "success", "message": f"Upload {upload_id} aborted"}
+    except UploadNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UploadOffsetError as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(e.offset)})
 
 @app.post("/pdf/reopen/{pdf_id}", response_model=UploadResponse)
 async def reopen_pdf_from_history(pdf_id: str):
@@ -131,12 +396,16 @@ async def reopen_pdf_from_history(pdf_id: str):
     """
     try:
         # Get PDF data from history
-        pdf_data = pdf_history_db.get_pdf_by_id(pdf_id)
+        pdf_data = await run_in_threadpool(pdf_history_db.get_pdf_by_id, pdf_id)
         
         if not pdf_data:
             raise HTTPException(status_code=404, detail="PDF not found in history")
         
         file_path = pdf_data.get('file_path')
+        content_hash = pdf_data.get('content_hash')
+        if content_hash and (not file_path or not os.path.exists(file_path)) and pdf_store.contains(content_hash):
+            # The original path is gone, but the same content is in the PDF store
+            file_path = pdf_store.path_for(content_hash)
         if not file_path:
             raise HTTPException(status_code=400, detail="File path not found in history")
         
@@ -144,16 +413,24 @@ async def reopen_pdf_from_history(pdf_id: str):
         if not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="PDF file no longer exists at the stored location")
         
-        # Open the PDF using the stored file path
-        new_doc_id, _ = open_pdf(file_path)
+        # Open the PDF using the stored file path, off the event loop; a file
+        # that is already open keeps its document ID and handle
+        new_doc_id, _ = await run_stage("open", pdf_executor, RENDER_TIMEOUT, open_pdf, file_path, pdf_id)
         
         # Get page count
-        page_count = get_page_count(new_doc_id)
+        page_count = await run_stage("open", pdf_executor, RENDER_TIMEOUT, get_page_count, new_doc_id)
+        
+        # The analysis and thumbnails are stored by content hash, so they are only made once per file
+        schedule_document_analysis(new_doc_id)
+        last_page = pdf_data.get('last_page') or 1
+        _schedule_history_thumbnails(new_doc_id, last_page)
         
         return UploadResponse(
-            doc_id=new_doc_id,
+            doc_id=add_document_client(new_doc_id),
+            pdf_id=new_doc_id,
             page_count=page_count,
-            filename=pdf_data['filename']
+            filename=pdf_data['filename'],
+            last_page=last_page
         )
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -163,70 +440,67 @@ async def reopen_pdf_from_history(pdf_id: str):
 
 @app.get("/pdf/{doc_id}/page/{page_number}", response_model=PageResponse)
 async def get_page(
+    request: Request,
     doc_id: str, 
     page_number: int, 
     source_lang: str = "auto",
     target_lang: str = "en",
-    background_tasks: BackgroundTasks = None
+    zoom: float = 2.0,
+    prefetch: bool = False
 ):
     """
-    Get a specific page from a PDF with translation
+    Get a specific page from a PDF with translation.
+    Foreground reads (prefetch=false) also schedule server-side read-ahead
+    of the following pages
     """
     try:
-        # Validate page number
-        total_pages = get_page_count(doc_id)
+        # Validate page number; an unknown session is restored from the history,
+        # which opens and hashes the file, so the lookup runs on the PDF executor
+        total_pages = await run_stage("open", pdf_executor, RENDER_TIMEOUT, get_page_count, doc_id)
         if page_number < 1 or page_number > total_pages:
             raise HTTPException(
                 status_code=400, 
                 detail=f"Invalid page number. Must be between 1 and {total_pages}"
             )
+        if zoom < MIN_ZOOM or zoom > MAX_ZOOM:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid zoom. Must be between {MIN_ZOOM} and {MAX_ZOOM}"
+            )
         
-        # Render page to image - Try multiple times if necessary
-        max_attempts = 3
-        page_image = None
-        last_error = None
-        
-        for attempt in range(max_attempts):
-            try:
-                page_image = render_page_to_image(doc_id, page_number)
-                break  # If successful, exit the loop
-            except Exception as e:
-                last_error = str(e)
-                # Wait a bit before retrying
-                import time
-                time.sleep(0.5)
-                
-        if page_image is None:
-            raise PDFProcessingError(f"Failed to render page after {max_attempts} attempts: {last_error}")
-            
-        # Extract text from page
-        original_text = extract_text_from_page(doc_id, page_number)
-        
-        # Generate cache key for this translation
-        cache_key = f"{doc_id}_{page_number}_{source_lang}_{target_lang}"
+        if not prefetch:
+            read_ahead.record_foreground(doc_id, page_number, source_lang, target_lang)
         
-        # Check if translation is cached
-        if doc_id in translation_cache and page_number in translation_cache[doc_id]:
-            translated_text = translation_cache[doc_id][page_number]
-        else:
-            # Translate text
-            try:
-                translated_text = translate_with_cache(original_text, source_lang, target_lang)
-                
-                # Cache the translation
-                if doc_id not in translation_cache:
-                    translation_cache[doc_id] = {}
-                translation_cache[doc_id][page_number] = translated_text
-            except TranslationError as e:
-                raise HTTPException(status_code=500, detail=f"Translation error: {str(e)}")
+        # Extraction and translation run off the event loop and are
+        # abandoned if the client goes away
+        page = await cancel_on_disconnect(
+            request.is_disconnected,
+            load_page(doc_id, page_number, source_lang, target_lang)
+        )
+        if not prefetch:
+            read_ahead.on_page_served(doc_id, page_number, total_pages, source_lang, target_lang)
+        page_width, page_height = await get_page_dimensions(doc_id, page_number)
         
+        # The image itself is served by the cacheable binary endpoints: a cheap
+        # preview first, then the full image or tiles at high zoom
+        page_path = f"/pdf/{doc_id}/page/{page_number}"
         return PageResponse(
-            page_image=page_image,
-            original_text=original_text,
-            translated_text=translated_text,
+            image_url=f"{page_path}/image?zoom={zoom}",
+            preview_url=f"{page_path}/image?zoom={zoom}&preview=true",
+            tile_url=f"{page_path}/tile?zoom={{zoom}}&x={{x}}&y={{y}}&tile_size={TILE_SIZE}",
+            page_width=page_width,
+            page_height=page_height,
             page_number=page_number,
-            total_pages=total_pages
+            total_pages=total_pages,
+            **page
         )
+    except ClientDisconnectedError:
+        # Nobody is listening any more; 499 is the conventional "client closed request" code
+        return Response(status_code=499)
+    except StageTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except TranslationError as e:
+        raise HTTPException(status_code=500, detail=f"Translation error: {str(e)}")
     except PDFProcessingError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
@@ -238,17 +512,397 @@ async def get_page(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to process page: {str(e)}")
 
+@app.get("/pdf/{doc_id}/page/{page_number}/stream")
+async def stream_page_translation(
+    doc_id: str,
+    page_number: int,
+    source_lang: str = "auto",
+    target_lang: str = "en"
+):
+    """
+    Stream the translation of a page as NDJSON, one translated chunk per line
+    as soon as it is ready, so readers can start before the whole page is done
+    """
+    try:
+        total_pages = await run_stage("open", pdf_executor, RENDER_TIMEOUT, _validate_page_number, doc_id, page_number)
+    except StageTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except PDFProcessingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    read_ahead.record_foreground(doc_id, page_number, source_lang, target_lang)
+    
+    async def message_stream():
+        # The status line is already sent, so failures become a final error message
+        try:
+            async for message in stream_page(doc_id, page_number, source_lang, target_lang):
+                if message['type'] == "start":
+                    message.update(page_number=page_number, total_pages=total_pages)
+                yield json.dumps(message) + "\n"
+            read_ahead.on_page_served(doc_id, page_number, total_pages, source_lang, target_lang)
+        except (StageTimeoutError, TranslationError, PDFProcessingError) as e:
+            yield json.dumps({'type': "error", 'detail': str(e)}) + "\n"
+        except Exception as e:
+            print(f"Error streaming page {page_number}:")
+            traceback.print_exc()
+            yield json.dumps({'type': "error", 'detail': f"Failed to process page: {str(e)}"}) + "\n"
+    
+    return StreamingResponse(
+        message_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Checks an If-None-Match header value against an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def _build_render_options(
+    zoom: float,
+    image_format: str,
+    quality: int,
+    width: Optional[int],
+    dpi: Optional[int],
+    grayscale: bool,
+    accept: str
+) -> RenderOptions:
+    """Validates image query parameters and builds the (normalized) render options"""
+    if zoom < MIN_ZOOM or zoom > MAX_ZOOM:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid zoom. Must be between {MIN_ZOOM} and {MAX_ZOOM}"
+        )
+    image_format = image_format.lower().replace("jpg", "jpeg")
+    if image_format not in IMAGE_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid format. Must be one of: {', '.join(IMAGE_FORMATS)}"
+        )
+    if image_format == "webp" and not WEBP_SUPPORTED:
+        raise HTTPException(status_code=400, detail="WebP output is not available on this server")
+    if quality < 1 or quality > 100:
+        raise HTTPException(status_code=400, detail="Invalid quality. Must be between 1 and 100")
+    if width is not None and width < 1:
+        raise HTTPException(status_code=400, detail="Invalid width. Must be a positive number of pixels")
+    if dpi is not None and dpi < 1:
+        raise HTTPException(status_code=400, detail="Invalid dpi. Must be a positive number")
+    
+    return normalize_render_options(RenderOptions(
+        image_format=image_format,
+        quality=quality,
+        zoom=zoom,
+        width=width,
+        dpi=dpi,
+        grayscale=grayscale,
+        # Only automatic format selection depends on what the client accepts
+        allow_webp=image_format == "auto" and "image/webp" in accept
+    ))
+
+async def _page_image_response(
+    request: Request,
+    doc_id: str,
+    page_number: int,
+    content_hash: str,
+    options: RenderOptions,
+    background_tasks: Optional[BackgroundTasks] = None,
+    warm_options: Optional[RenderOptions] = None
+) -> Response:
+    """
+    Serves a rendered page variant with ETag and Cache-Control headers,
+    optionally rendering another variant in the background afterwards
+    """
+    # The ETag is derived from content hash, page and render options, so a
+    # revalidation is answered without rendering anything
+    etag = page_image_etag(content_hash, page_number, options)
+    cache_headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={IMAGE_CACHE_MAX_AGE}, immutable"
+    }
+    if options.image_format == "auto":
+        cache_headers["Vary"] = "Accept"
+    
+    if warm_options is not None and background_tasks is not None:
+        background_tasks.add_task(warm_page_image, doc_id, page_number, warm_options)
+    
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers)
+    
+    image, media_type, _ = await cancel_on_disconnect(
+        request.is_disconnected,
+        load_page_image(doc_id, page_number, options)
+    )
+    return Response(content=image, media_type=media_type, headers=cache_headers)
+
+def _validate_page_number(doc_id: str, page_number: int) -> int:
+    """Checks a page number against the document and returns the page count"""
+    total_pages = get_page_count(doc_id)
+    if page_number < 1 or page_number > total_pages:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid page number. Must be between 1 and {total_pages}"
+        )
+    return total_pages
+
+def _page_document_hash(doc_id: str, page_number: int) -> str:
+    """Checks a page number and returns the content hash of the document, restoring its session if needed"""
+    _validate_page_number(doc_id, page_number)
+    return get_document_hash(doc_id)
+
+@app.get("/pdf/{doc_id}/page/{page_number}/image")
+async def get_page_image(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    doc_id: str,
+    page_number: int,
+    zoom: float = 2.0,
+    image_format: str = Query("auto", alias="format"),
+    quality: int = DEFAULT_IMAGE_QUALITY,
+    width: Optional[int] = None,
+    dpi: Optional[int] = None,
+    grayscale: bool = False,
+    preview: bool = False
+):
+    """
+    Get the rendered image of a page as raw bytes, with HTTP caching headers.
+    Resolution comes from width (pixels), then dpi, then zoom; format "auto"
+    picks PNG for text pages and JPEG/WebP for scanned pages.
+    With preview=true a cheap low-resolution JPEG is returned at once and the
+    requested full image is rendered into the cache in the background
+    """
+    try:
+        # Restoring an unknown session opens and hashes the file, so it runs on the PDF executor
+        content_hash = await run_stage("open", pdf_executor, RENDER_TIMEOUT, _page_document_hash, doc_id, page_number)
+        options = _build_render_options(zoom, image_format, quality, width, dpi, grayscale,
+                                        request.headers.get("accept", ""))
+        
+        if preview:
+            preview_options = RenderOptions(
+                image_format="jpeg",
+                quality=PREVIEW_QUALITY,
+                zoom=PREVIEW_ZOOM,
+                grayscale=grayscale
+            )
+            return await _page_image_response(request, doc_id, page_number, content_hash, preview_options,
+                                              background_tasks, warm_options=options)
+        
+        return await _page_image_response(request, doc_id, page_number, content_hash, options)
+    except ClientDisconnectedError:
+        return Response(status_code=499)
+    except StageTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except PDFProcessingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        print(f"Error rendering page {page_number}:")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to render page: {str(e)}")
+
+@app.get("/pdf/{doc_id}/page/{page_number}/tile")
+async def get_page_tile(
+    request: Request,
+    doc_id: str,
+    page_number: int,
+    x: int,
+    y: int,
+    zoom: float = 4.0,
+    tile_size: int = TILE_SIZE,
+    image_format: str = Query("auto", alias="format"),
+    quality: int = DEFAULT_IMAGE_QUALITY,
+    grayscale: bool = False
+):
+    """
+    Get one square tile of a page rendered at a high zoom, so zooming in
+    only rasterizes the visible region. Tile (x, y) covers pixels
+    [x * tile_size, (x + 1) * tile_size) horizontally at the given zoom
+    """
+    try:
+        content_hash = await run_stage("open", pdf_executor, RENDER_TIMEOUT, _page_document_hash, doc_id, page_number)
+        if zoom < MIN_ZOOM or zoom > MAX_TILE_ZOOM:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid zoom. Must be between {MIN_ZOOM} and {MAX_TILE_ZOOM}"
+            )
+        if tile_size < 64 or tile_size > 2048:
+            raise HTTPException(status_code=400, detail="Invalid tile_size. Must be between 64 and 2048")
+        
+        page_width, page_height = await get_page_dimensions(doc_id, page_number)
+        columns = math.ceil(page_width * zoom / tile_size)
+        rows = math.ceil(page_height * zoom / tile_size)
+        if x < 0 or x >= columns or y < 0 or y >= rows:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid tile. This zoom has {columns} columns and {rows} rows"
+            )
+        
+        # Tile edges in page points
+        step = tile_size / zoom
+        clip = (x * step, y * step, min(page_width, (x + 1) * step), min(page_height, (y + 1) * step))
+        # The zoom was checked against the tile range above; validate the other options
+        options = _build_render_options(min(zoom, MAX_ZOOM), image_format, quality, None, None,
+                                        grayscale, request.headers.get("accept", ""))
+        options = options._replace(zoom=zoom, clip=clip)
+        
+        return await _page_image_response(request, doc_id, page_number, content_hash, options)
+    except ClientDisconnectedError:
+        return Response(status_code=499)
+    except StageTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except PDFProcessingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        print(f"Error rendering tile of page {page_number}:")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to render tile: {str(e)}")
+
+# Plain function: FastAPI runs it on its threadpool, so the document index is not read on the event loop
+@app.get("/pdf/{doc_id}/analysis")
+def get_document_analysis(doc_id: str):
+    """
+    Get the repeated blocks (running headers, footers, boilerplate) found in a document,
+    and how far the extraction pass has got (extracted, empty and image-only pages)
+    """
+    try:
+        content_hash = get_document_hash(doc_id)
+        extraction = document_index.get_extract_summary(content_hash)
+        analysis = document_index.get_analysis(content_hash)
+        if analysis is None:
+            return {"status": "success", "data": {"analyzed": False, "extraction": extraction}}
+        return {"status": "success", "data": {"analyzed": True, **analysis, "extraction": extraction}}
+    except PDFProcessingError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/pdf/{doc_id}/search")
+def search_document(
+    doc_id: str,
+    q: str,
+    language: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100)
+):
+    """
+    Find the pages whose original or translated text contains every word of q, best matches first.
+    Only the full-text index is read: pages are indexed when the document is analyzed
+    (original text) and when they are translated (translated text)
+    """
+    try:
+        content_hash = get_document_hash(doc_id)
+        # "original" restricts the search to the original text, a language code to that translation
+        text_language = ORIGINAL_TEXT if language == "original" else language
+        results = document_index.search_pages(content_hash, q, text_language, limit)
+        return {
+            "status": "success",
+            "data": {
+                "query": q,
+                "results": results,
+                "indexed_pages": document_index.count_indexed_pages(content_hash),
+                "total_pages": get_page_count(doc_id)
+            }
+        }
+    except PDFProcessingError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SearchUnavailableError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+# Batch Translation Endpoints
+
+@app.post("/pdf/{doc_id}/translate", status_code=202)
+async def start_document_translation(doc_id: str, request: TranslateDocumentRequest):
+    """
+    Start a background job that translates every page of a document, or a page range
+    """
+    try:
+        total_pages = await run_stage("open", pdf_executor, RENDER_TIMEOUT, get_page_count, doc_id)
+        end_page = request.end_page or total_pages
+        if request.start_page < 1 or end_page > total_pages or end_page < request.start_page:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid page range. Pages must be between 1 and {total_pages}"
+            )
+        
+        job = batch_jobs.start_job(doc_id, request.start_page, end_page,
+                                   request.source_lang, request.target_lang)
+        return {"status": "success", "data": job.to_dict()}
+    except StageTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except PDFProcessingError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except BatchJobError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to start translation job: {str(e)}")
+
+@app.get("/pdf/jobs/{job_id}")
+async def get_translation_job(job_id: str):
+    """
+    Get the progress of a batch translation job
+    """
+    try:
+        return {"status": "success", "data": batch_jobs.get_job(job_id).to_dict()}
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/pdf/jobs/{job_id}/events")
+async def stream_translation_job(job_id: str):
+    """
+    Stream the progress of a batch translation job as Server-Sent Events
+    """
+    try:
+        batch_jobs.get_job(job_id)
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    async def event_stream():
+        async for snapshot in batch_jobs.watch(job_id):
+            yield f"event: progress\ndata: {json.dumps(snapshot)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/pdf/jobs/{job_id}/{action}")
+async def control_translation_job(job_id: str, action: str):
+    """
+    Pause, resume or cancel a batch translation job
+    """
+    actions = {
+        "pause": batch_jobs.pause_job,
+        "resume": batch_jobs.resume_job,
+        "cancel": batch_jobs.cancel_job
+    }
+    if action not in actions:
+        raise HTTPException(status_code=404, detail=f"Unknown job action: {action}")
+    
+    try:
+        job = await actions[action](job_id)
+        return {"status": "success", "data": job.to_dict()}
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except BatchJobError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 @app.delete("/pdf/{doc_id}")
 async def close_pdf(doc_id: str):
     """
-    Close a PDF document and free resources
+    Close a PDF document for this client: its read-ahead and batch jobs stop,
+    and the document is closed once no other client uses it
     """
     try:
-        close_document(doc_id)
-          # Also remove from translation cache
-        if doc_id in translation_cache:
-            del translation_cache[doc_id]
-            
+        closed_doc_id = await run_stage("close", pdf_executor, RENDER_TIMEOUT, close_document, doc_id)
+        cancel_client_work(doc_id, closed_doc_id)
         return {"status": "success", "message": "Document closed successfully"}
     except PDFProcessingError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -256,25 +910,38 @@ async def close_pdf(doc_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to close document: {str(e)}")
 
 # PDF History Endpoints
+# Plain functions: FastAPI runs them on its threadpool, so SQLite never blocks the event loop
 
 @app.get("/pdf/history")
-async def get_pdf_history(limit: int = 10):
+def get_pdf_history(
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    search: Optional[str] = None,
+    language: Optional[str] = None,
+    completed: Optional[bool] = None
+):
     """
-    Get PDF history ordered by last read date
+    Get PDF history ordered by last read date, one page at a time.
+    Pass the returned next_cursor to get the following page; search matches
+    filename words by prefix, and language/completed filter the entries
     """
     try:
-        history = pdf_history_db.get_history(limit=limit)
-        return {"status": "success", "data": history}
+        page = pdf_history_db.get_history_page(limit=limit, cursor=cursor, search=search,
+                                               language=language, completed=completed)
+        return {"status": "success", "data": page['items'], "next_cursor": page['next_cursor']}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get history: {str(e)}")
 
 @app.post("/pdf/history")
-async def add_pdf_to_history(request: AddPdfHistoryRequest):
+def add_pdf_to_history(request: AddPdfHistoryRequest):
     """
-    Add or update a PDF in history
+    Add or update a PDF in history. Fields left out of the request keep their
+    stored values, so re-adding a known PDF does not reset its reading progress
     """
     try:
-        pdf_data = request.dict()
+        pdf_data = request.dict(exclude_unset=True)
         success = pdf_history_db.add_or_update_pdf(pdf_data)
         
         if success:
@@ -285,7 +952,7 @@ async def add_pdf_to_history(request: AddPdfHistoryRequest):
         raise HTTPException(status_code=500, detail=f"Failed to add PDF to history: {str(e)}")
 
 @app.put("/pdf/history/progress")
-async def update_reading_progress(request: ProgressUpdateRequest):
+def update_reading_progress(request: ProgressUpdateRequest):
     """
     Update reading progress for a specific PDF
     """
@@ -303,8 +970,74 @@ async def update_reading_progress(request: ProgressUpdateRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update progress: {str(e)}")
 
+# Registered before /pdf/history/{pdf_id}, which would otherwise match it
+@app.get("/pdf/history/stats")
+def get_history_statistics(days: int = Query(30, ge=1, le=366)):
+    """
+    Get history statistics, with per-language and per-day breakdowns.
+    Read from aggregates maintained on every history write, so the cost
+    does not grow with the history
+    """
+    try:
+        stats = pdf_history_db.get_statistics(days=days)
+        return {"status": "success", "data": stats}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get statistics: {str(e)}")
+
+def _thumbnail_headers(content_hash: str, page_number: int) -> Dict[str, str]:
+    """HTTP caching headers of a stored thumbnail"""
+    return {
+        "ETag": page_image_etag(content_hash, page_number, THUMBNAIL_OPTIONS),
+        "Cache-Control": f"public, max-age={IMAGE_CACHE_MAX_AGE}, immutable"
+    }
+
+@app.get("/pdf/history/{pdf_id}/thumbnail")
+async def get_pdf_thumbnail(request: Request, pdf_id: str, page: int = Query(1, ge=1)):
+    """
+    Get the thumbnail of a page of a PDF in history as a small cacheable JPEG.
+    Thumbnails are rendered in the background at upload (first and last read
+    page); a missing one is rendered on demand, reopening the stored file if needed
+    """
+    try:
+        pdf_data = await run_in_threadpool(pdf_history_db.get_pdf_by_id, pdf_id)
+        if not pdf_data:
+            raise HTTPException(status_code=404, detail="PDF not found in history")
+        
+        content_hash = pdf_data.get('content_hash')
+        # Thumbnails are immutable per content hash, so revalidations are answered without reading them
+        if content_hash and _etag_matches(request.headers.get("if-none-match"),
+                                          page_image_etag(content_hash, page, THUMBNAIL_OPTIONS)):
+            return Response(status_code=304, headers=_thumbnail_headers(content_hash, page))
+        
+        image = None
+        if content_hash:
+            try:
+                image = await run_stage("thumbnail", upload_executor, UPLOAD_WRITE_TIMEOUT,
+                                        thumbnail_store.read, content_hash, page)
+            except FileNotFoundError:
+                pass
+        if image is None:
+            # Not rendered yet (or evicted): the session is restored from the history if it was
+            # closed, which opens the file, so it happens on the PDF executor
+            content_hash = await run_stage("open", pdf_executor, RENDER_TIMEOUT,
+                                           _page_document_hash, pdf_id, page)
+            path = await generate_thumbnail(pdf_id, page)
+            if page == 1 and pdf_data.get('thumbnail_path') != path:
+                await run_in_threadpool(pdf_history_db.set_thumbnail, pdf_id, path)
+            image = await run_stage("thumbnail", upload_executor, UPLOAD_WRITE_TIMEOUT,
+                                    thumbnail_store.read, content_hash, page)
+        return Response(content=image, media_type="image/jpeg", headers=_thumbnail_headers(content_hash, page))
+    except StageTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except PDFProcessingError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get thumbnail: {str(e)}")
+
 @app.get("/pdf/history/{pdf_id}")
-async def get_pdf_from_history(pdf_id: str):
+def get_pdf_from_history(pdf_id: str):
     """
     Get specific PDF from history by ID
     """
@@ -319,14 +1052,18 @@ async def get_pdf_from_history(pdf_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to get PDF from history: {str(e)}")
 
 @app.delete("/pdf/history/{pdf_id}")
-async def remove_pdf_from_history(pdf_id: str):
+def remove_pdf_from_history(pdf_id: str):
     """
-    Remove PDF from history
+    Remove PDF from history, with its thumbnails unless another entry has the same content
     """
     try:
+        pdf_data = pdf_history_db.get_pdf_by_id(pdf_id)
         success = pdf_history_db.remove_pdf(pdf_id)
         
         if success:
+            content_hash = pdf_data.get('content_hash') if pdf_data else None
+            if content_hash and pdf_history_db.get_pdf_by_hash(content_hash) is None:
+                thumbnail_store.remove(content_hash)
             return {"status": "success", "message": "PDF removed from history"}
         else:
             raise HTTPException(status_code=404, detail="PDF not found in history")
@@ -334,30 +1071,87 @@ async def remove_pdf_from_history(pdf_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to remove PDF from history: {str(e)}")
 
 @app.delete("/pdf/history")
-async def clear_pdf_history():
+def clear_pdf_history():
     """
-    Clear all PDF history
+    Clear all PDF history and its thumbnails
     """
     try:
         success = pdf_history_db.clear_history()
         
         if success:
+            thumbnail_store.clear()
             return {"status": "success", "message": "History cleared"}
         else:
             raise HTTPException(status_code=500, detail="Failed to clear history")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to clear history: {str(e)}")
 
-@app.get("/pdf/history/stats")
-async def get_history_statistics():
+# Cache Endpoints
+
+@app.get("/pdf/cache/stats")
+async def get_page_cache_statistics():
     """
-    Get history statistics
+    Get page result cache counters, and how many page and image requests
+    joined identical work already in flight instead of repeating it
     """
     try:
-        stats = pdf_history_db.get_statistics()
+        stats = {
+            'pages': page_cache.get_statistics(),
+            'images': image_cache.get_statistics(),
+            'coalescing': {
+                'pages': page_flights.get_statistics(),
+                'images': image_flights.get_statistics()
+            }
+        }
         return {"status": "success", "data": stats}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get statistics: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get page cache statistics: {str(e)}")
+
+@app.get("/pdf/store/stats")
+async def get_pdf_store_statistics():
+    """
+    Get usage and deduplication counters of the content-addressed PDF store
+    """
+    return {"status": "success", "data": pdf_store.get_statistics()}
+
+@app.get("/pdf/thumbnails/stats")
+def get_thumbnail_statistics():
+    """
+    Get the number and total size of the stored history thumbnails
+    """
+    return {"status": "success", "data": thumbnail_store.get_statistics()}
+
+@app.get("/pdf/sessions/stats")
+async def get_document_session_statistics():
+    """
+    Get open document handle and session counters
+    """
+    return {"status": "success", "data": document_sessions.get_statistics()}
+
+@app.get("/pdf/read-ahead/stats")
+async def get_read_ahead_statistics():
+    """
+    Get read-ahead scheduler counters and prefetch hit rate
+    """
+    try:
+        stats = read_ahead.get_statistics()
+        return {"status": "success", "data": stats}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get read-ahead statistics: {str(e)}")
+
+# Translation Memory Endpoints
+
+# Plain function: FastAPI runs it on its threadpool, so counting the memory entries never blocks the event loop
+@app.get("/translation/memory/stats")
+def get_translation_memory_statistics():
+    """
+    Get translation memory hit/miss counters
+    """
+    try:
+        stats = translation_memory.get_statistics()
+        return {"status": "success", "data": stats}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get translation memory statistics: {str(e)}")
 
 if __name__ == "__main__":
     import uvicorn
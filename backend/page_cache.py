@@ -0,0 +1,157 @@
+"""
+MoziTranslate - Page result cache module
+Bounded LRU caches of extracted/translated page text and rendered page
+images, keyed on the PDF content hash so results outlive the per-session
+document ID
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+from config import (
+    IMAGE_CACHE_MAX_BYTES,
+    IMAGE_CACHE_MAX_ENTRIES,
+    PAGE_CACHE_MAX_BYTES,
+    PAGE_CACHE_MAX_ENTRIES
+)
+
+# Keys start with (content_hash, page_number); the rest depends on the cache
+PageKey = Tuple[Hashable, ...]
+
+
+def make_page_key(content_hash: str, page_number: int,
+                  source_lang: str, target_lang: str) -> PageKey:
+    """Builds the cache key for the text and translation of a page."""
+    return (content_hash, page_number, source_lang, target_lang)
+
+
+def make_image_key(content_hash: str, page_number: int, variant: Hashable) -> PageKey:
+    """Builds the cache key for a rendered page image variant (e.g. its render options)."""
+    return (content_hash, page_number, variant)
+
+
+def _entry_size(entry: Dict[str, Any]) -> int:
+    """Approximates the memory used by an entry in bytes."""
+    size = 0
+    for value in entry.values():
+        if isinstance(value, (str, bytes)):
+            size += len(value)
+        elif isinstance(value, list):
+            size += sum(_entry_size(item) for item in value if isinstance(item, dict))
+    return size
+
+
+class PageCache:
+    """
+    Thread-safe LRU cache of per-page entries with entry-count and byte limits.
+
+    Entries are dicts, e.g. ``original_text`` and ``translated_text`` for
+    page results or the encoded ``image`` for rendered pages.
+    """
+
+    def __init__(self, max_entries: int = PAGE_CACHE_MAX_ENTRIES, max_bytes: int = PAGE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[PageKey, Dict[str, Any]]" = OrderedDict()
+        self._sizes: Dict[PageKey, int] = {}
+        # Keys grouped by (content_hash, page_number) to reuse data across language pairs
+        self._siblings: Dict[Tuple[Hashable, ...], Set[PageKey]] = {}
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: PageKey) -> Optional[Dict[str, Any]]:
+        """Returns a copy of the cached entry, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return dict(entry)
+
+    def get_shared(self, content_hash: str, page_number: int, field: str) -> Optional[Any]:
+        """
+        Returns a language-independent field of a page (e.g. its extracted
+        text) cached under any language pair, so a language switch does not
+        extract the page again.
+        """
+        with self._lock:
+            for key in self._siblings.get((content_hash, page_number), ()):
+                value = self._entries[key].get(field)
+                if value is not None:
+                    return value
+            return None
+
+    def get_original_text(self, content_hash: str, page_number: int) -> Optional[str]:
+        """Returns the extracted text of a page cached under any language pair."""
+        return self.get_shared(content_hash, page_number, 'original_text')
+
+    def put(self, key: PageKey, entry: Dict[str, Any]) -> None:
+        """Stores an entry, evicting least recently used entries as needed."""
+        size = _entry_size(entry)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = dict(entry)
+            self._sizes[key] = size
+            self._siblings.setdefault(key[:2], set()).add(key)
+            self._total_bytes += size
+
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self._evictions += 1
+
+    def _discard(self, key: PageKey) -> None:
+        """Removes an entry; the caller must hold the lock."""
+        del self._entries[key]
+        self._total_bytes -= self._sizes.pop(key)
+        siblings = self._siblings.get(key[:2])
+        if siblings is not None:
+            siblings.discard(key)
+            if not siblings:
+                del self._siblings[key[:2]]
+
+    def invalidate(self, content_hash: str) -> int:
+        """Removes every cached page of a document and returns how many were dropped."""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == content_hash]
+            for key in keys:
+                self._discard(key)
+            return len(keys)
+
+    def clear(self) -> None:
+        """Removes every entry and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._siblings.clear()
+            self._total_bytes = 0
+            self._hits = self._misses = self._evictions = 0
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Returns hit/miss/eviction counters and current usage."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': round(self._hits / lookups, 3) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes
+            }
+
+
+# Initialize global cache instances
+page_cache = PageCache()
+image_cache = PageCache(IMAGE_CACHE_MAX_ENTRIES, IMAGE_CACHE_MAX_BYTES)
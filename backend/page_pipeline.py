@@ -0,0 +1,647 @@
+"""
+MoziTranslate - Page pipeline module
+Runs the render, extract and translate stages of a page off the event loop,
+on bounded executors with per-stage timeouts
+"""
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from config import (
+    DOCUMENT_SWEEP_INTERVAL,
+    EXTRACT_BATCH_PAGES,
+    EXTRACT_TIMEOUT,
+    PDF_WORKERS,
+    RENDER_TIMEOUT,
+    REPEATED_BLOCK_MIN_PAGES,
+    THUMBNAIL_QUALITY,
+    THUMBNAIL_WIDTH,
+    TRANSLATION_STAGE_TIMEOUT,
+    TRANSLATION_WORKERS,
+    UPLOAD_WORKERS,
+    UPLOAD_WRITE_TIMEOUT
+)
+from page_cache import image_cache, page_cache, make_image_key, make_page_key
+from document_analysis import (
+    block_signature,
+    classify_segment,
+    find_repeated_blocks,
+    position_band,
+    reuse_translation,
+    ROLE_NUMBER,
+    ROLE_REPEATED
+)
+from document_index import document_index, ORIGINAL_TEXT
+from pdf_processor import (
+    document_sessions,
+    extract_page_content,
+    get_page_count,
+    get_document_hash,
+    get_document_path,
+    get_page_size,
+    PDFProcessingError
+)
+from batch_jobs import BatchJobManager
+from read_ahead import ReadAheadScheduler
+from render_engine import normalize_render_options, render_engine, render_page_job, RenderOptions
+from segmentation import pack_units, segment_page
+from single_flight import SingleFlight
+from thumbnails import thumbnail_store
+from translator import translate_units
+
+# Units of a page are joined with a blank line in the page texts
+UNIT_SEPARATOR = "\n\n"
+
+logger = logging.getLogger("page_pipeline")
+
+T = TypeVar("T")
+
+# Bounded executors: fitz work and upstream translation never run on the event loop
+pdf_executor = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix="pdf")
+translation_executor = ThreadPoolExecutor(max_workers=TRANSLATION_WORKERS, thread_name_prefix="translation")
+# Upload chunks are written to disk here, so large uploads never block the event loop or the PDF workers
+upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+
+# Concurrent requests for the same page (a prefetch and a navigation, several tabs of one
+# document) share one extraction and translation, or one render, keyed like the caches
+page_flights = SingleFlight("page")
+image_flights = SingleFlight("image")
+
+# Polling interval used to detect that the client went away
+DISCONNECT_POLL_INTERVAL = 0.25
+
+# History card thumbnails: a small JPEG at a fixed width, so every page yields a few kilobytes
+THUMBNAIL_OPTIONS = RenderOptions(image_format="jpeg", quality=THUMBNAIL_QUALITY, width=THUMBNAIL_WIDTH)
+
+# Called with {page_number: path} once the thumbnails of a document are stored
+ThumbnailCallback = Callable[[Dict[int, str]], Awaitable[None]]
+
+
+class StageTimeoutError(Exception):
+    """Exception raised when a pipeline stage exceeds its timeout."""
+    pass
+
+
+class ClientDisconnectedError(Exception):
+    """Exception raised when the client disconnects before the page is ready."""
+    pass
+
+
+async def run_stage(stage: str, executor: Executor, timeout: float,
+                    func: Callable[..., T], *args: Any) -> T:
+    """
+    Runs a blocking function on an executor and waits for it with a timeout.
+
+    Args:
+        stage: Stage name used in errors and logs
+        executor: Executor that runs the function
+        timeout: Maximum seconds to wait for the result
+        func: Blocking function to run
+        *args: Positional arguments for the function
+
+    Returns:
+        The function result
+
+    Raises:
+        StageTimeoutError: If the stage does not finish in time
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(executor, func, *args)
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        logger.error(f"Stage '{stage}' timed out after {timeout}s")
+        raise StageTimeoutError(f"Stage '{stage}' timed out after {timeout}s")
+
+
+async def cancel_on_disconnect(is_disconnected: Callable[[], Awaitable[bool]], work: Awaitable[T]) -> T:
+    """
+    Awaits work, cancelling it as soon as the client disconnects.
+
+    Args:
+        is_disconnected: Coroutine function reporting whether the client went away
+            (e.g. ``request.is_disconnected``)
+        work: Awaitable producing the response data
+
+    Returns:
+        The result of the work
+
+    Raises:
+        ClientDisconnectedError: If the client disconnected first
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await is_disconnected():
+                task.cancel()
+                raise ClientDisconnectedError("Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def render_page_bytes(doc_id: str, page_number: int, options: RenderOptions,
+                            max_attempts: int = 3) -> Tuple[bytes, str]:
+    """
+    Renders and encodes a page on the render process pool (or on the PDF
+    executor when the pool is disabled), retrying transient failures.
+
+    Returns:
+        Tuple of (encoded image bytes, media type)
+    """
+    file_path = get_document_path(doc_id)
+    content_hash = get_document_hash(doc_id)
+    last_error = None
+    for attempt in range(max_attempts):
+        # A broken pool is restarted when its executor is requested again
+        executor = render_engine.executor if render_engine.enabled else pdf_executor
+        try:
+            return await run_stage("render", executor, RENDER_TIMEOUT, render_page_job,
+                                   file_path, content_hash, page_number, options)
+        except StageTimeoutError:
+            raise
+        except ValueError as e:
+            # Invalid page or unsupported format: retrying cannot help
+            raise PDFProcessingError(str(e))
+        except Exception as e:
+            last_error = str(e)
+            # Wait a bit before retrying without blocking other requests
+            await asyncio.sleep(0.5)
+    raise PDFProcessingError(f"Failed to render page after {max_attempts} attempts: {last_error}")
+
+
+def page_image_etag(content_hash: str, page_number: int, options: RenderOptions) -> str:
+    """
+    Returns the strong ETag of a rendered page variant. It only depends on
+    the file content and the (normalized) render options, so it is known
+    before rendering.
+    """
+    variant = f"{content_hash}:{page_number}:{tuple(normalize_render_options(options))!r}"
+    digest = hashlib.sha256(variant.encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+async def load_page_image(doc_id: str, page_number: int, options: RenderOptions) -> Tuple[bytes, str, str]:
+    """
+    Returns the encoded image of a page with its media type and ETag,
+    answering from the image cache when possible. Concurrent calls for the
+    same variant (page, zoom and other render options) share one render.
+    """
+    # Options that cannot change the image do not split the cache
+    options = normalize_render_options(options)
+    content_hash = get_document_hash(doc_id)
+    etag = page_image_etag(content_hash, page_number, options)
+    cache_key = make_image_key(content_hash, page_number, options)
+    cached_image = image_cache.get(cache_key)
+    if cached_image is not None:
+        return cached_image['image'], cached_image['media_type'], etag
+
+    async def render() -> Tuple[bytes, str]:
+        image, media_type = await render_page_bytes(doc_id, page_number, options)
+        image_cache.put(cache_key, {'image': image, 'media_type': media_type})
+        return image, media_type
+
+    image, media_type = await image_flights.run(cache_key, render)
+    return image, media_type, etag
+
+
+async def warm_page_image(doc_id: str, page_number: int, options: RenderOptions) -> None:
+    """Renders a page variant into the image cache in the background, ignoring failures."""
+    try:
+        await load_page_image(doc_id, page_number, options)
+    except Exception as e:
+        logger.warning(f"Background render of page {page_number} of {doc_id} failed: {str(e)}")
+
+
+async def get_page_dimensions(doc_id: str, page_number: int) -> Tuple[float, float]:
+    """Returns the page size in points, read on the PDF executor."""
+    return await run_stage("extract", pdf_executor, EXTRACT_TIMEOUT,
+                           get_page_size, doc_id, page_number)
+
+
+def _extract_page(doc_id: str, page_number: int) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Extracts the translatable units of a page with their bounding boxes and
+    position bands, and whether the page is image-only.
+    """
+    page_dict, image_only = extract_page_content(doc_id, page_number)
+    page_height = page_dict.get('height', 0)
+    segments = [
+        {'text': unit.text, 'bbox': list(unit.bbox), 'band': position_band(unit.bbox, page_height)}
+        for unit in segment_page(page_dict)
+    ]
+    return segments, image_only
+
+
+def _extract_and_store_page(doc_id: str, page_number: int) -> List[Dict[str, Any]]:
+    """Extracts the units of a page and stores them in the document index."""
+    segments, image_only = _extract_page(doc_id, page_number)
+    document_index.put_page_extract(get_document_hash(doc_id), page_number, segments, image_only)
+    return segments
+
+
+async def extract_page(doc_id: str, page_number: int) -> List[Dict[str, Any]]:
+    """Extracts the units of a page on the PDF executor and stores them in the document index."""
+    return await run_stage("extract", pdf_executor, EXTRACT_TIMEOUT, _extract_and_store_page, doc_id, page_number)
+
+
+async def extract_segments(doc_id: str, page_number: int) -> List[Dict[str, Any]]:
+    """
+    Returns the translatable units of a page, reusing the units stored by the
+    extraction pass (shared by every language pair) and extracting them on
+    the PDF executor otherwise.
+    """
+    content_hash = get_document_hash(doc_id)
+    extract = await run_stage("extract", pdf_executor, EXTRACT_TIMEOUT,
+                              document_index.get_page_extract, content_hash, page_number)
+    if extract is not None:
+        return extract['segments']
+    return await extract_page(doc_id, page_number)
+
+
+def translate_page_units(content_hash: str, segments: List[Dict[str, Any]],
+                         source_lang: str, target_lang: str) -> List[str]:
+    """
+    Translates the units of a page, skipping the ones the document analysis
+    makes redundant: number-only units are kept as they are, and repeated
+    blocks reuse the translation of their first occurrence in the document.
+
+    Returns:
+        Translated units in input order
+    """
+    repeated_signatures = document_index.get_repeated_signatures(content_hash)
+    translated: List[Any] = [None] * len(segments)
+    pending: List[int] = []
+    for index, segment in enumerate(segments):
+        role = classify_segment(segment, repeated_signatures)
+        if role == ROLE_NUMBER:
+            translated[index] = segment['text']
+            continue
+        if role == ROLE_REPEATED:
+            stored = document_index.get_block_translation(
+                content_hash, block_signature(segment['text'], segment['band']), source_lang, target_lang
+            )
+            if stored is not None:
+                translated[index] = reuse_translation(stored[0], stored[1], segment['text'])
+                if translated[index] is not None:
+                    continue
+        pending.append(index)
+
+    results = translate_units([segments[index]['text'] for index in pending], source_lang, target_lang)
+    for index, result in zip(pending, results):
+        translated[index] = result
+        segment = segments[index]
+        if classify_segment(segment, repeated_signatures) == ROLE_REPEATED:
+            document_index.put_block_translation(
+                content_hash, block_signature(segment['text'], segment['band']), source_lang, target_lang,
+                segment['text'], result
+            )
+    return translated
+
+
+async def translate_segments(content_hash: str, segments: List[Dict[str, Any]],
+                             source_lang: str, target_lang: str) -> List[str]:
+    """Translates page units on the translation executor (the translation memory is consulted first)."""
+    return await run_stage("translate", translation_executor, TRANSLATION_STAGE_TIMEOUT,
+                           translate_page_units, content_hash, segments, source_lang, target_lang)
+
+
+def _page_result(segments: List[Dict[str, Any]], translated: List[str]) -> Dict[str, Any]:
+    """Builds the cached page entry from its units and their translations."""
+    return {
+        'original_text': UNIT_SEPARATOR.join(segment['text'] for segment in segments),
+        'translated_text': UNIT_SEPARATOR.join(translated),
+        'segments': [
+            {'text': segment['text'], 'translated_text': translated_text, 'bbox': segment['bbox']}
+            for segment, translated_text in zip(segments, translated)
+        ]
+    }
+
+
+async def _index_page_text(content_hash: str, page_number: int, target_lang: str, result: Dict[str, Any]) -> None:
+    """Adds the original and translated text of a produced page to the page search index, on the PDF executor."""
+    await run_stage("index", pdf_executor, EXTRACT_TIMEOUT, document_index.put_page_texts, content_hash, [
+        (page_number, ORIGINAL_TEXT, result['original_text']),
+        (page_number, target_lang, result['translated_text'])
+    ])
+
+
+async def load_page(doc_id: str, page_number: int, source_lang: str, target_lang: str) -> Dict[str, Any]:
+    """
+    Produces the original text and translation of a page,
+    answering from the page cache when possible. Concurrent calls for the
+    same page and language pair share one extraction and translation.
+
+    Returns:
+        Dict with original_text, translated_text and the translated
+        segments (units) of the page with their bounding boxes
+    """
+    content_hash = get_document_hash(doc_id)
+    cache_key = make_page_key(content_hash, page_number, source_lang, target_lang)
+    cached_page = page_cache.get(cache_key)
+    if cached_page is not None:
+        return cached_page
+
+    async def produce() -> Dict[str, Any]:
+        segments = await extract_segments(doc_id, page_number)
+        translated = await translate_segments(content_hash, segments, source_lang, target_lang)
+
+        result = _page_result(segments, translated)
+        page_cache.put(cache_key, result)
+        await _index_page_text(content_hash, page_number, target_lang, result)
+        return result
+
+    return await page_flights.run(cache_key, produce)
+
+
+async def stream_page(doc_id: str, page_number: int, source_lang: str,
+                      target_lang: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Produces the translation of a page as a sequence of messages, so the
+    first chunks can be shown before the whole page is translated.
+
+    The units of the page are packed into chunks that are translated
+    concurrently but emitted in reading order:
+    - ``start``: the original text and the number of chunks
+    - ``chunk``: one translated chunk with its offsets in the original and translated text
+    - ``complete``: the full translation; the page cache is populated first
+
+    Cached pages are emitted as a single chunk.
+    """
+    content_hash = get_document_hash(doc_id)
+    cache_key = make_page_key(content_hash, page_number, source_lang, target_lang)
+    cached_page = page_cache.get(cache_key)
+    if cached_page is not None:
+        original_text = cached_page['original_text']
+        chunk_count = 1 if original_text else 0
+        yield {'type': "start", 'original_text': original_text, 'chunk_count': chunk_count}
+        if chunk_count:
+            yield {'type': "chunk", 'index': 0, 'source_offset': 0, 'source_length': len(original_text),
+                   'offset': 0, 'text': cached_page['translated_text']}
+        yield {'type': "complete", **cached_page}
+        return
+
+    segments = await extract_segments(doc_id, page_number)
+    texts = [segment['text'] for segment in segments]
+    chunks = pack_units(texts, separator_size=len(UNIT_SEPARATOR))
+    yield {'type': "start", 'original_text': UNIT_SEPARATOR.join(texts), 'chunk_count': len(chunks)}
+
+    tasks = [asyncio.ensure_future(translate_segments(content_hash, segments[start:end], source_lang, target_lang))
+             for start, end in chunks]
+    translated: List[str] = []
+    source_offset = 0
+    offset = 0
+    try:
+        for index, ((start, end), task) in enumerate(zip(chunks, tasks)):
+            translated_chunk = await task
+            # Chunks after the first carry the separator, so chunk texts concatenate to the page text
+            separator = UNIT_SEPARATOR if start else ""
+            source_chunk = separator + UNIT_SEPARATOR.join(texts[start:end])
+            text = separator + UNIT_SEPARATOR.join(translated_chunk)
+            yield {'type': "chunk", 'index': index, 'source_offset': source_offset,
+                   'source_length': len(source_chunk), 'offset': offset, 'text': text}
+            translated.extend(translated_chunk)
+            source_offset += len(source_chunk)
+            offset += len(text)
+    finally:
+        # The client went away or a chunk failed: drop the remaining chunks
+        for task in tasks:
+            task.cancel()
+
+    result = _page_result(segments, translated)
+    page_cache.put(cache_key, result)
+    await _index_page_text(content_hash, page_number, target_lang, result)
+    yield {'type': "complete", **result}
+
+
+async def prefetch_page(doc_id: str, page_number: int, source_lang: str, target_lang: str) -> None:
+    """
+    Warms the caches for a page the reader is likely to open next: its text
+    and translation, and the full image variant the viewer requests by default.
+    """
+    await load_page(doc_id, page_number, source_lang, target_lang)
+    # Browsers advertise WebP support for images, so warm that variant of "auto"
+    await load_page_image(doc_id, page_number, RenderOptions(allow_webp=True))
+
+
+async def extract_document(doc_id: str) -> int:
+    """
+    Extracts every page of a document that is not in the document index
+    yet, so page requests, batch jobs and search read the stored units
+    instead of PyMuPDF. Pages are extracted one at a time on the PDF
+    executor, so foreground requests interleave, and stored in one
+    transaction per ``EXTRACT_BATCH_PAGES`` pages.
+
+    Returns:
+        Number of pages extracted
+    """
+    content_hash = get_document_hash(doc_id)
+    extracted = await run_stage("extract", pdf_executor, EXTRACT_TIMEOUT,
+                                document_index.get_extracted_pages, content_hash)
+    missing = [page_number for page_number in range(1, get_page_count(doc_id) + 1)
+               if page_number not in extracted]
+    pending: List[Tuple[int, List[Dict[str, Any]], bool]] = []
+    try:
+        for page_number in missing:
+            segments, image_only = await run_stage("extract", pdf_executor, EXTRACT_TIMEOUT,
+                                                   _extract_page, doc_id, page_number)
+            pending.append((page_number, segments, image_only))
+            if len(pending) >= EXTRACT_BATCH_PAGES:
+                batch, pending = pending, []
+                await run_stage("extract", pdf_executor, EXTRACT_TIMEOUT,
+                                document_index.put_page_extracts, content_hash, batch)
+        if pending:
+            batch, pending = pending, []
+            await run_stage("extract", pdf_executor, EXTRACT_TIMEOUT,
+                            document_index.put_page_extracts, content_hash, batch)
+    finally:
+        if pending:
+            # Interrupted (e.g. the document was closed): keep the pages extracted so far
+            pdf_executor.submit(document_index.put_page_extracts, content_hash, pending)
+    return len(missing)
+
+
+def _store_analysis(content_hash: str, page_count: int) -> int:
+    """
+    Finds the repeated blocks of a document from the stored units of its
+    pages and stores them, along with the original text of every page for search.
+
+    Returns:
+        Number of repeated blocks
+    """
+    stored = document_index.get_page_segments(content_hash)
+    pages = [stored.get(page_number, []) for page_number in range(1, page_count + 1)]
+    repeated = find_repeated_blocks(pages, REPEATED_BLOCK_MIN_PAGES)
+    document_index.save_analysis(content_hash, page_count, repeated)
+    # Every page is extracted now: make the whole original text searchable
+    document_index.put_page_texts(content_hash, [
+        (page_number, ORIGINAL_TEXT, UNIT_SEPARATOR.join(segment['text'] for segment in segments))
+        for page_number, segments in enumerate(pages, start=1)
+    ])
+    return len(repeated)
+
+
+async def analyze_document(doc_id: str) -> None:
+    """
+    Runs the extraction pass of a document, then finds its repeated blocks
+    (running headers, footers, boilerplate) and stores them in the document
+    index, along with the original text of every page for search.
+    """
+    content_hash = get_document_hash(doc_id)
+    if await run_stage("index", pdf_executor, EXTRACT_TIMEOUT, document_index.is_analyzed, content_hash):
+        return
+    extracted = await extract_document(doc_id)
+    page_count = get_page_count(doc_id)
+    # Reading the units, finding the blocks and writing the index stay off the event loop
+    repeated = await run_stage("index", pdf_executor, EXTRACT_TIMEOUT, _store_analysis, content_hash, page_count)
+    logger.info(f"Analyzed {page_count} pages of {doc_id} ({extracted} extracted): "
+                f"{repeated} repeated blocks")
+
+
+_analysis_tasks: Dict[str, asyncio.Task] = {}
+
+
+def schedule_document_analysis(doc_id: str) -> None:
+    """
+    Starts the analysis of a document in the background, unless it is running.
+    A document already analyzed is skipped by the task, which reads the index
+    on the PDF executor rather than on the event loop.
+    """
+    if doc_id in _analysis_tasks:
+        return
+
+    async def run():
+        try:
+            await analyze_document(doc_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Analysis of {doc_id} failed: {str(e)}")
+        finally:
+            _analysis_tasks.pop(doc_id, None)
+
+    _analysis_tasks[doc_id] = asyncio.ensure_future(run())
+
+
+def cancel_document_analysis(doc_id: str) -> None:
+    """Stops the background analysis of a document."""
+    task = _analysis_tasks.pop(doc_id, None)
+    if task is not None:
+        task.cancel()
+
+
+async def generate_thumbnail(doc_id: str, page_number: int) -> str:
+    """
+    Renders the thumbnail of a page into the thumbnail store, unless it is
+    stored already. Thumbnails bypass the image cache: they are read from disk.
+
+    Returns:
+        Path of the stored thumbnail
+    """
+    content_hash = get_document_hash(doc_id)
+    if thumbnail_store.contains(content_hash, page_number):
+        return thumbnail_store.path_for(content_hash, page_number)
+    image, _ = await render_page_bytes(doc_id, page_number, THUMBNAIL_OPTIONS)
+    # Disk writes share the upload executor
+    return await run_stage("thumbnail", upload_executor, UPLOAD_WRITE_TIMEOUT,
+                           thumbnail_store.put, content_hash, page_number, image)
+
+
+_thumbnail_tasks: Dict[str, asyncio.Task] = {}
+
+
+def schedule_thumbnails(doc_id: str, page_numbers: Iterable[int],
+                        on_ready: Optional[ThumbnailCallback] = None) -> None:
+    """
+    Renders page thumbnails of a document in the background, one page at a
+    time, unless a thumbnail job of the document is running. Pages that fail
+    are skipped; ``on_ready`` receives the paths of the others.
+    """
+    if doc_id in _thumbnail_tasks:
+        return
+    pages = sorted(set(page_numbers))
+
+    async def run():
+        paths: Dict[int, str] = {}
+        try:
+            for page_number in pages:
+                try:
+                    paths[page_number] = await generate_thumbnail(doc_id, page_number)
+                except (PDFProcessingError, StageTimeoutError) as e:
+                    logger.warning(f"Thumbnail of page {page_number} of {doc_id} failed: {str(e)}")
+            if paths and on_ready is not None:
+                await on_ready(paths)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Thumbnails of {doc_id} failed: {str(e)}")
+        finally:
+            _thumbnail_tasks.pop(doc_id, None)
+
+    _thumbnail_tasks[doc_id] = asyncio.ensure_future(run())
+
+
+def cancel_thumbnails(doc_id: str) -> None:
+    """Stops the background thumbnail job of a document."""
+    task = _thumbnail_tasks.pop(doc_id, None)
+    if task is not None:
+        task.cancel()
+
+
+def cancel_client_work(client_id: str, closed_doc_id: Optional[str]) -> None:
+    """
+    Stops the read-ahead and batch jobs of a released client and, if its
+    release closed the shared document, the document's background analysis
+    and thumbnails, which other clients may still be waiting for otherwise.
+    """
+    read_ahead.cancel_document(client_id)
+    batch_jobs.cancel_document(client_id)
+    if closed_doc_id is not None:
+        cancel_document_analysis(closed_doc_id)
+        cancel_thumbnails(closed_doc_id)
+
+
+async def sweep_idle_documents(interval: float = DOCUMENT_SWEEP_INTERVAL) -> None:
+    """
+    Periodically releases clients, closes document handles and forgets
+    read-ahead readers left idle, e.g. by browser tabs closed without
+    calling DELETE /pdf/{doc_id}.
+    Handles are closed on the PDF executor, which owns the PyMuPDF work.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            expired = await run_stage("close", pdf_executor, EXTRACT_TIMEOUT, document_sessions.expire_clients)
+            for client_id, closed_doc_id in expired.items():
+                cancel_client_work(client_id, closed_doc_id)
+            closed = await run_stage("close", pdf_executor, EXTRACT_TIMEOUT, document_sessions.evict_idle)
+            readers = read_ahead.expire_idle()
+            if expired or closed or readers:
+                logger.info(f"Released {len(expired)} idle clients, closed {closed} idle documents "
+                            f"and forgot {readers} idle readers")
+        except Exception as e:
+            logger.warning(f"Idle document sweep failed: {str(e)}")
+
+
+# Initialize global read-ahead scheduler and batch job manager instances
+read_ahead = ReadAheadScheduler(prefetch_page)
+batch_jobs = BatchJobManager(load_page)
+
+
+def shutdown_executors() -> None:
+    """Stops read-ahead, the pipeline executors and render workers, dropping queued work."""
+    read_ahead.cancel_all()
+    for doc_id in list(_analysis_tasks):
+        cancel_document_analysis(doc_id)
+    for doc_id in list(_thumbnail_tasks):
+        cancel_thumbnails(doc_id)
+    pdf_executor.shutdown(wait=False, cancel_futures=True)
+    document_sessions.close_all()
+    translation_executor.shutdown(wait=False, cancel_futures=True)
+    upload_executor.shutdown(wait=False, cancel_futures=True)
+    render_engine.shutdown()
@@ -1,17 +1,120 @@
 import sqlite3
+import base64
 import json
+import re
+import threading
+import weakref
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from pathlib import Path
 
+from config import HISTORY_DB_BUSY_TIMEOUT, HISTORY_DB_CACHED_STATEMENTS, PDF_HISTORY_DB
+from progress_buffer import ProgressBuffer
+
+# Columns returned for history entries
+HISTORY_COLUMNS = ['pdf_id', 'filename', 'file_path', 'last_page', 'total_pages', 
+                   'progress', 'language', 'language_flag', 'upload_date', 
+                   'last_read_date', 'thumbnail_path', 'content_hash']
+
+# Words of a filename search; everything else separates them, as in the FTS tokenizer
+_SEARCH_TERM = re.compile(r"\w+")
+
+def encode_cursor(last_read_date: str, row_id: int) -> str:
+    """Encode the position after a history entry as an opaque pagination cursor"""
+    return base64.urlsafe_b64encode(json.dumps([last_read_date, row_id]).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """
+    Decode a pagination cursor into (last_read_date, id)
+    
+    Raises:
+        ValueError: If the cursor was not produced by encode_cursor
+    """
+    try:
+        last_read_date, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not isinstance(last_read_date, str) or not isinstance(row_id, int):
+            raise ValueError
+        return last_read_date, row_id
+    except Exception:
+        raise ValueError("Invalid history cursor")
+
+def build_search_query(search: str) -> Optional[str]:
+    """Build an FTS5 query matching filenames with words starting with every searched word"""
+    terms = _SEARCH_TERM.findall(search)
+    return " ".join(f'"{term}"*' for term in terms) if terms else None
+
+class _ThreadConnection:
+    """Connection of one thread, closed when the thread ends and drops its thread-local state"""
+    
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+    
+    def __del__(self):
+        self.conn.close()
+
 class PdfHistoryDB:
-    def __init__(self, db_path: str = "pdf_history.db"):
+    """
+    Reading history stored in SQLite.
+    
+    Each thread keeps its own connection (with its prepared statement cache)
+    while it lives, instead of connecting per call; worker threads that are
+    retired close their connection with them. The
+    database runs in WAL mode, so readers never wait for a writer and
+    concurrent writers wait up to the busy timeout instead of failing.
+    
+    Progress updates are buffered (see ``ProgressBuffer``) and written by
+    ``flush_progress``; reads of single documents overlay the pending
+    values, and listings flush first.
+    """
+    
+    journal_mode = "WAL"
+    
+    def __init__(self, db_path: str = PDF_HISTORY_DB, busy_timeout: float = HISTORY_DB_BUSY_TIMEOUT,
+                 cached_statements: int = HISTORY_DB_CACHED_STATEMENTS):
         self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        # Connections of live threads, for close(); entries vanish when their thread ends
+        self._connections: "weakref.WeakSet[_ThreadConnection]" = weakref.WeakSet()
+        self._connections_lock = threading.Lock()
+        self.progress_buffer = ProgressBuffer(self._write_progress)
         self.init_database()
     
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Returns the connection of the calling thread, opening it on first use.
+        Used as ``with self._connection() as conn:``, which commits on success
+        and rolls back on error without closing the connection.
+        """
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout,
+                                   cached_statements=self.cached_statements, check_same_thread=False)
+            # WAL is a property of the database file; these settings are per connection
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout * 1000)}')
+            # Only the thread-local state holds the connection, so it is closed when the thread ends
+            holder = _ThreadConnection(conn)
+            self._local.holder = holder
+            with self._connections_lock:
+                self._connections.add(holder)
+        return holder.conn
+    
+    def close(self):
+        """Write pending progress and close the connections of every thread"""
+        self.flush_progress()
+        with self._connections_lock:
+            holders, self._connections = list(self._connections), weakref.WeakSet()
+        # Threads that used a closed connection open a new one on their next call
+        self._local = threading.local()
+        for holder in holders:
+            holder.conn.close()
+    
     def init_database(self):
         """Initialize the SQLite database with the pdf_history table"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
+            conn.execute(f'PRAGMA journal_mode={self.journal_mode}')
             cursor = conn.cursor()
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS pdf_history (
@@ -27,70 +130,216 @@ class PdfHistoryDB:
                     upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     last_read_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     thumbnail_path TEXT,
+                    content_hash TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
             
+            # Add columns introduced after the table was first created
+            columns = {row[1] for row in cursor.execute('PRAGMA table_info(pdf_history)')}
+            if 'content_hash' not in columns:
+                cursor.execute('ALTER TABLE pdf_history ADD COLUMN content_hash TEXT')
+            
             # Create index for better performance
             cursor.execute('''
                 CREATE INDEX IF NOT EXISTS idx_pdf_id ON pdf_history(pdf_id)
             ''')
             cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_last_read_date ON pdf_history(last_read_date DESC)
+                CREATE INDEX IF NOT EXISTS idx_content_hash ON pdf_history(content_hash)
             ''')
+            # Keyset pagination walks (last_read_date, id) in order, optionally within a filter
+            cursor.execute('DROP INDEX IF EXISTS idx_last_read_date')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_last_read_keyset ON pdf_history(last_read_date DESC, id DESC)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_language_keyset
+                ON pdf_history(language, last_read_date DESC, id DESC)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_completed_keyset
+                ON pdf_history((progress >= 100), last_read_date DESC, id DESC)
+            ''')
+            
+            # Full-text index of filenames, kept in sync by triggers
+            self.fts_enabled = self._init_filename_index(cursor)
+            
+            # Aggregates for the statistics, kept in sync by triggers
+            self._init_statistics(cursor)
             
             conn.commit()
     
+    def _init_filename_index(self, cursor: sqlite3.Cursor) -> bool:
+        """Create the FTS5 filename index; returns False if SQLite lacks FTS5"""
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pdf_history_fts'"
+        ).fetchone()
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS pdf_history_fts USING fts5(
+                    filename, content='pdf_history', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"FTS5 unavailable, filename search falls back to LIKE: {e}")
+            return False
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS pdf_history_fts_insert AFTER INSERT ON pdf_history BEGIN
+                INSERT INTO pdf_history_fts(rowid, filename) VALUES (new.id, new.filename);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS pdf_history_fts_delete AFTER DELETE ON pdf_history BEGIN
+                INSERT INTO pdf_history_fts(pdf_history_fts, rowid, filename) VALUES ('delete', old.id, old.filename);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS pdf_history_fts_update AFTER UPDATE OF filename ON pdf_history BEGIN
+                INSERT INTO pdf_history_fts(pdf_history_fts, rowid, filename) VALUES ('delete', old.id, old.filename);
+                INSERT INTO pdf_history_fts(rowid, filename) VALUES (new.id, new.filename);
+            END
+        ''')
+        if not exists:
+            # Index the rows written before the index existed
+            cursor.execute("INSERT INTO pdf_history_fts(pdf_history_fts) VALUES ('rebuild')")
+        return True
+    
+    def _init_statistics(self, cursor: sqlite3.Cursor):
+        """
+        Create the aggregate tables behind get_statistics and the triggers that
+        maintain them on every insert, update and delete of a history row
+        """
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_stats_language'"
+        ).fetchone()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS history_stats_language (
+                language TEXT PRIMARY KEY,
+                documents INTEGER NOT NULL DEFAULT 0,
+                completed INTEGER NOT NULL DEFAULT 0,
+                progress_sum REAL NOT NULL DEFAULT 0,
+                pages_read INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS history_stats_daily (
+                day TEXT PRIMARY KEY,
+                uploaded INTEGER NOT NULL DEFAULT 0,
+                last_read INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        # Statements adding (sign 1) or removing (sign -1) one row to the aggregates
+        def add_row(row: str, sign: int) -> str:
+            return f'''
+                INSERT INTO history_stats_language (language, documents, completed, progress_sum, pages_read)
+                VALUES (COALESCE({row}.language, ''), {sign}, {sign} * (COALESCE({row}.progress, 0) >= 100),
+                        {sign} * COALESCE({row}.progress, 0), {sign} * COALESCE({row}.last_page, 0))
+                ON CONFLICT(language) DO UPDATE
+                SET documents = documents + excluded.documents, completed = completed + excluded.completed,
+                    progress_sum = progress_sum + excluded.progress_sum, pages_read = pages_read + excluded.pages_read;
+                INSERT INTO history_stats_daily (day, uploaded) VALUES (COALESCE(date({row}.upload_date), ''), {sign})
+                ON CONFLICT(day) DO UPDATE SET uploaded = uploaded + excluded.uploaded;
+                INSERT INTO history_stats_daily (day, last_read) VALUES (COALESCE(date({row}.last_read_date), ''), {sign})
+                ON CONFLICT(day) DO UPDATE SET last_read = last_read + excluded.last_read;
+            '''
+        
+        cleanup = '''
+            DELETE FROM history_stats_language WHERE documents = 0;
+            DELETE FROM history_stats_daily WHERE uploaded = 0 AND last_read = 0;
+        '''
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS history_stats_insert AFTER INSERT ON pdf_history BEGIN
+                {add_row('new', 1)}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS history_stats_delete AFTER DELETE ON pdf_history BEGIN
+                {add_row('old', -1)}
+                {cleanup}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS history_stats_update
+            AFTER UPDATE OF language, progress, last_page, upload_date, last_read_date ON pdf_history BEGIN
+                {add_row('old', -1)}
+                {add_row('new', 1)}
+                {cleanup}
+            END
+        ''')
+        if not exists:
+            # Aggregate the rows written before the statistics tables existed
+            self._rebuild_statistics(cursor)
+    
+    def _rebuild_statistics(self, cursor: sqlite3.Cursor):
+        """Recompute the aggregate tables from the history rows"""
+        cursor.execute('DELETE FROM history_stats_language')
+        cursor.execute('DELETE FROM history_stats_daily')
+        cursor.execute('''
+            INSERT INTO history_stats_language (language, documents, completed, progress_sum, pages_read)
+            SELECT COALESCE(language, ''), COUNT(*), SUM(COALESCE(progress, 0) >= 100),
+                   SUM(COALESCE(progress, 0)), SUM(COALESCE(last_page, 0))
+            FROM pdf_history GROUP BY COALESCE(language, '')
+        ''')
+        cursor.execute('''
+            INSERT INTO history_stats_daily (day, uploaded)
+            SELECT COALESCE(date(upload_date), ''), COUNT(*) FROM pdf_history GROUP BY 1
+        ''')
+        cursor.execute('''
+            INSERT INTO history_stats_daily (day, last_read)
+            SELECT COALESCE(date(last_read_date), ''), COUNT(*) FROM pdf_history GROUP BY 1
+            ON CONFLICT(day) DO UPDATE SET last_read = excluded.last_read
+        ''')
+    
     def add_or_update_pdf(self, pdf_data: Dict[str, Any]) -> bool:
-        """Add a new PDF or update existing one in history"""
+        """
+        Add a new PDF or update existing one in history.
+        
+        The reading progress of an existing entry (last page, total pages and
+        progress) is only replaced by the values present in pdf_data, so
+        recording a known file again does not reset it.
+        """
+        progress_updates = ", ".join(
+            f"{column} = excluded.{column}" if column in pdf_data else f"{column} = {column}"
+            for column in ('last_page', 'total_pages', 'progress')
+        )
+        if any(column in pdf_data for column in ('last_page', 'progress')):
+            # The row is rewritten with newer values than any buffered progress
+            self.progress_buffer.discard(pdf_data['pdf_id'])
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 now = datetime.now().isoformat()
                 
-                # Check if PDF already exists
-                cursor.execute('SELECT id FROM pdf_history WHERE pdf_id = ?', (pdf_data['pdf_id'],))
-                existing = cursor.fetchone()
-                
-                if existing:
-                    # Update existing record
-                    cursor.execute('''
-                        UPDATE pdf_history 
-                        SET filename = ?, last_page = ?, total_pages = ?, 
-                            progress = ?, language = ?, language_flag = ?,
-                            last_read_date = ?, updated_at = ?
-                        WHERE pdf_id = ?
-                    ''', (
-                        pdf_data['filename'],
-                        pdf_data.get('last_page', 1),
-                        pdf_data.get('total_pages', 0),
-                        pdf_data.get('progress', 0.0),
-                        pdf_data.get('language', 'Português'),
-                        pdf_data.get('language_flag', '🇧🇷'),
-                        now,
-                        now,
-                        pdf_data['pdf_id']
-                    ))
-                else:
-                    # Insert new record
-                    cursor.execute('''
-                        INSERT INTO pdf_history 
-                        (pdf_id, filename, file_path, last_page, total_pages, 
-                         progress, language, language_flag, upload_date, last_read_date)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        pdf_data['pdf_id'],
-                        pdf_data['filename'],
-                        pdf_data.get('file_path', ''),
-                        pdf_data.get('last_page', 1),
-                        pdf_data.get('total_pages', 0),
-                        pdf_data.get('progress', 0.0),
-                        pdf_data.get('language', 'Português'),
-                        pdf_data.get('language_flag', '🇧🇷'),
-                        pdf_data.get('upload_date', now),
-                        now
-                    ))
+                # Insert or update in one statement, so concurrent writers cannot
+                # both miss the row and collide on the unique pdf_id
+                cursor.execute(f'''
+                    INSERT INTO pdf_history 
+                    (pdf_id, filename, file_path, last_page, total_pages, 
+                     progress, language, language_flag, upload_date, last_read_date,
+                     content_hash)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(pdf_id) DO UPDATE
+                    SET filename = excluded.filename, {progress_updates},
+                        language = excluded.language, language_flag = excluded.language_flag,
+                        file_path = COALESCE(NULLIF(excluded.file_path, ''), file_path),
+                        content_hash = COALESCE(excluded.content_hash, content_hash),
+                        last_read_date = excluded.last_read_date, updated_at = excluded.last_read_date
+                ''', (
+                    pdf_data['pdf_id'],
+                    pdf_data['filename'],
+                    pdf_data.get('file_path', ''),
+                    pdf_data.get('last_page', 1),
+                    pdf_data.get('total_pages', 0),
+                    pdf_data.get('progress', 0.0),
+                    pdf_data.get('language', 'Português'),
+                    pdf_data.get('language_flag', '🇧🇷'),
+                    pdf_data.get('upload_date', now),
+                    now,
+                    pdf_data.get('content_hash')
+                ))
                 
                 conn.commit()
                 return True
@@ -99,59 +348,140 @@ class PdfHistoryDB:
             return False
     
     def update_progress(self, pdf_id: str, current_page: int, total_pages: int) -> bool:
-        """Update reading progress for a specific PDF"""
+        """Buffer a reading progress update for a specific PDF; it is written by the next flush"""
         try:
-            progress = round((current_page / total_pages) * 100, 1) if total_pages > 0 else 0
-            now = datetime.now().isoformat()
+            if self.progress_buffer.pending(pdf_id) is None:
+                with self._connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('SELECT 1 FROM pdf_history WHERE pdf_id = ?', (pdf_id,))
+                    if cursor.fetchone() is None:
+                        return False
             
-            with sqlite3.connect(self.db_path) as conn:
+            self.progress_buffer.record(pdf_id, current_page, total_pages)
+            return True
+        except Exception as e:
+            print(f"Error updating progress: {e}")
+            return False
+    
+    def _write_progress(self, updates: List[Dict[str, Any]]):
+        """Write buffered progress updates in one transaction"""
+        with self._connection() as conn:
+            conn.executemany('''
+                UPDATE pdf_history 
+                SET last_page = :last_page, total_pages = :total_pages, progress = :progress, 
+                    last_read_date = :last_read_date, updated_at = :last_read_date
+                WHERE pdf_id = :pdf_id
+            ''', updates)
+    
+    def flush_progress(self) -> int:
+        """Write buffered progress updates and return how many documents were written"""
+        try:
+            return self.progress_buffer.flush()
+        except Exception as e:
+            print(f"Error writing progress: {e}")
+            return 0
+    
+    def set_thumbnail(self, pdf_id: str, thumbnail_path: str) -> bool:
+        """Record the path of the thumbnail shown on the history card of a PDF"""
+        try:
+            with self._connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE pdf_history 
-                    SET last_page = ?, total_pages = ?, progress = ?, 
-                        last_read_date = ?, updated_at = ?
-                    WHERE pdf_id = ?
-                ''', (current_page, total_pages, progress, now, now, pdf_id))
-                
+                # Not a read, so last_read_date and the statistics are left alone
+                cursor.execute('UPDATE pdf_history SET thumbnail_path = ? WHERE pdf_id = ?',
+                               (thumbnail_path, pdf_id))
                 conn.commit()
                 return cursor.rowcount > 0
         except Exception as e:
-            print(f"Error updating progress: {e}")
+            print(f"Error setting thumbnail: {e}")
             return False
-    
+
     def get_history(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Get PDF history ordered by last read date"""
+        return self.get_history_page(limit=limit)['items']
+    
+    def get_history_page(self, limit: int = 10, cursor: Optional[str] = None, search: Optional[str] = None,
+                         language: Optional[str] = None, completed: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        Get one page of PDF history ordered by last read date, newest first
+        
+        Pages are addressed by keyset: the cursor holds the (last_read_date, id)
+        of the last entry of the previous page, so every page is an index range
+        scan whatever its depth.
+        
+        Args:
+            limit: Maximum entries per page
+            cursor: next_cursor of the previous page (None for the first page)
+            search: Words the filename must contain (as word prefixes)
+            language: Only entries read in this language
+            completed: Only finished (True) or unfinished (False) entries
+            
+        Returns:
+            Dict with the page 'items' and the 'next_cursor' (None on the last page)
+            
+        Raises:
+            ValueError: If the cursor is invalid
+        """
+        conditions = []
+        params: List[Any] = []
+        if cursor:
+            last_read_date, row_id = decode_cursor(cursor)
+            conditions.append('(last_read_date, id) < (?, ?)')
+            params.extend([last_read_date, row_id])
+        if language:
+            conditions.append('language = ?')
+            params.append(language)
+        if completed is not None:
+            conditions.append('(progress >= 100) = ?')
+            params.append(1 if completed else 0)
+        if search:
+            search_query = build_search_query(search)
+            if search_query is None:
+                return {'items': [], 'next_cursor': None}
+            if self.fts_enabled:
+                conditions.append('id IN (SELECT rowid FROM pdf_history_fts WHERE pdf_history_fts MATCH ?)')
+                params.append(search_query)
+            else:
+                # Without FTS5 every word is a substring match, which scans the table
+                for term in _SEARCH_TERM.findall(search):
+                    conditions.append("filename LIKE ? ESCAPE '\\'")
+                    params.append('%' + term.replace('_', '\\_') + '%')
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
+        # Buffered updates change the order, so they are written first
+        self.flush_progress()
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT pdf_id, filename, file_path, last_page, total_pages, 
-                           progress, language, language_flag, upload_date, 
-                           last_read_date, thumbnail_path
+            with self._connection() as conn:
+                rows = conn.execute(f'''
+                    SELECT {', '.join(HISTORY_COLUMNS)}, id
                     FROM pdf_history 
-                    ORDER BY last_read_date DESC 
+                    {where}
+                    ORDER BY last_read_date DESC, id DESC 
                     LIMIT ?
-                ''', (limit,))
-                
-                rows = cursor.fetchall()
-                columns = ['pdf_id', 'filename', 'file_path', 'last_page', 'total_pages', 
-                          'progress', 'language', 'language_flag', 'upload_date', 
-                          'last_read_date', 'thumbnail_path']
-                
-                return [dict(zip(columns, row)) for row in rows]
+                ''', (*params, limit + 1)).fetchall()
         except Exception as e:
             print(f"Error getting history: {e}")
-            return []
+            return {'items': [], 'next_cursor': None}
+        
+        # One extra row tells whether another page follows
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit and page:
+            last = dict(zip(HISTORY_COLUMNS, page[-1]))
+            next_cursor = encode_cursor(last['last_read_date'], page[-1][-1])
+        return {
+            'items': [dict(zip(HISTORY_COLUMNS, row)) for row in page],
+            'next_cursor': next_cursor
+        }
     
     def get_pdf_by_id(self, pdf_id: str) -> Optional[Dict[str, Any]]:
         """Get specific PDF from history by ID"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT pdf_id, filename, file_path, last_page, total_pages, 
                            progress, language, language_flag, upload_date, 
-                           last_read_date, thumbnail_path
+                           last_read_date, thumbnail_path, content_hash
                     FROM pdf_history 
                     WHERE pdf_id = ?
                 ''', (pdf_id,))
@@ -160,17 +490,42 @@ class PdfHistoryDB:
                 if row:
                     columns = ['pdf_id', 'filename', 'file_path', 'last_page', 'total_pages', 
                               'progress', 'language', 'language_flag', 'upload_date', 
-                              'last_read_date', 'thumbnail_path']
-                    return dict(zip(columns, row))
+                              'last_read_date', 'thumbnail_path', 'content_hash']
+                    pdf_data = dict(zip(columns, row))
+                    # Progress not written yet is newer than the stored row
+                    pending = self.progress_buffer.pending(pdf_id)
+                    if pending:
+                        pdf_data.update(pending)
+                    return pdf_data
                 return None
         except Exception as e:
             print(f"Error getting PDF by ID: {e}")
             return None
     
+    def get_pdf_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Get the most recently read PDF in history with the given content hash"""
+        self.flush_progress()
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT pdf_id FROM pdf_history 
+                    WHERE content_hash = ?
+                    ORDER BY last_read_date DESC
+                    LIMIT 1
+                ''', (content_hash,))
+                
+                row = cursor.fetchone()
+                return self.get_pdf_by_id(row[0]) if row else None
+        except Exception as e:
+            print(f"Error getting PDF by hash: {e}")
+            return None
+    
     def remove_pdf(self, pdf_id: str) -> bool:
         """Remove PDF from history"""
+        self.progress_buffer.discard(pdf_id)
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('DELETE FROM pdf_history WHERE pdf_id = ?', (pdf_id,))
                 conn.commit()
@@ -181,8 +536,9 @@ class PdfHistoryDB:
     
     def clear_history(self) -> bool:
         """Clear all PDF history"""
+        self.progress_buffer.discard()
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('DELETE FROM pdf_history')
                 conn.commit()
@@ -191,42 +547,73 @@ class PdfHistoryDB:
             print(f"Error clearing history: {e}")
             return False
     
-    def get_statistics(self) -> Dict[str, Any]:
-        """Get history statistics"""
+    def get_statistics(self, days: int = 30) -> Dict[str, Any]:
+        """
+        Get history statistics from the aggregate tables maintained by triggers,
+        without scanning the history
+        
+        Args:
+            days: Most recent days included in the per-day breakdown
+        """
+        self.flush_progress()
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Total documents
-                cursor.execute('SELECT COUNT(*) FROM pdf_history')
-                total_docs = cursor.fetchone()[0]
-                
-                # Completed documents (progress >= 100)
-                cursor.execute('SELECT COUNT(*) FROM pdf_history WHERE progress >= 100')
-                completed_docs = cursor.fetchone()[0]
-                
-                # Average progress
-                cursor.execute('SELECT AVG(progress) FROM pdf_history')
-                avg_progress = cursor.fetchone()[0] or 0
-                
-                # Total pages read
-                cursor.execute('SELECT SUM(last_page) FROM pdf_history')
-                total_pages = cursor.fetchone()[0] or 0
-                
-                return {
-                    'total_documents': total_docs,
-                    'completed_documents': completed_docs,
-                    'average_progress': round(avg_progress, 1),
-                    'total_pages_read': total_pages
-                }
+            with self._connection() as conn:
+                languages = conn.execute('''
+                    SELECT language, documents, completed, progress_sum, pages_read
+                    FROM history_stats_language ORDER BY documents DESC, language
+                ''').fetchall()
+                daily = conn.execute('''
+                    SELECT day, uploaded, last_read FROM history_stats_daily
+                    WHERE day != '' ORDER BY day DESC LIMIT ?
+                ''', (days,)).fetchall()
+            
+            total_docs = sum(row[1] for row in languages)
+            progress_sum = sum(row[3] for row in languages)
+            return {
+                'total_documents': total_docs,
+                'completed_documents': sum(row[2] for row in languages),
+                'average_progress': round(progress_sum / total_docs, 1) if total_docs else 0,
+                'total_pages_read': sum(row[4] for row in languages),
+                'by_language': [
+                    {
+                        'language': language,
+                        'total_documents': documents,
+                        'completed_documents': completed,
+                        'average_progress': round(language_progress / documents, 1) if documents else 0,
+                        'total_pages_read': pages_read
+                    }
+                    for language, documents, completed, language_progress, pages_read in languages
+                ],
+                'by_day': [
+                    {'date': day, 'uploaded': uploaded, 'last_read': last_read}
+                    for day, uploaded, last_read in daily
+                ]
+            }
         except Exception as e:
             print(f"Error getting statistics: {e}")
             return {
                 'total_documents': 0,
                 'completed_documents': 0,
                 'average_progress': 0,
-                'total_pages_read': 0
+                'total_pages_read': 0,
+                'by_language': [],
+                'by_day': []
             }
 
-# Initialize global database instance
-pdf_history_db = PdfHistoryDB()
+_instance: Optional[PdfHistoryDB] = None
+_instance_lock = threading.Lock()
+
+def get_pdf_history_db() -> PdfHistoryDB:
+    """Return the global history database, opening (and migrating) it on first use"""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = PdfHistoryDB()
+        return _instance
+
+def __getattr__(name: str) -> Any:
+    # The global instance is created on first access rather than on import, so
+    # importing the module (e.g. from tests) leaves the default database file alone
+    if name == 'pdf_history_db':
+        return get_pdf_history_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
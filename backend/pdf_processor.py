@@ -2,32 +2,71 @@
 MoziTranslate - PDF processing module
 Uses PyMuPDF (fitz) to extract text and render PDF pages
 """
-import os
 import fitz  # PyMuPDF
-import base64
-import tempfile
+import hashlib
 import logging
-from typing import Dict, List, Optional, Tuple, Any
-from uuid import uuid4
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple, Any
+
+from document_sessions import DocumentNotFoundError, DocumentSession, DocumentSessionManager
+from pdf_store import pdf_store
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("pdf_processor")
 
-# Store open documents with their IDs for reuse
-_open_documents: Dict[str, Tuple[fitz.Document, str]] = {}
-
 class PDFProcessingError(Exception):
     """Exception raised for errors in PDF processing."""
     pass
 
-def open_pdf(file_path: str) -> Tuple[str, fitz.Document]:
+def compute_file_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Computes the SHA-256 hash of a file without loading it into memory.
+    
+    Args:
+        file_path: Path to the file
+        chunk_size: Number of bytes read per iteration
+        
+    Returns:
+        Hex-encoded SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _open_pdf_file(file_path: str) -> fitz.Document:
+    """Opens a file with PyMuPDF, checking that it is a PDF."""
+    document = fitz.open(file_path)
+    if not document.is_pdf:
+        document.close()
+        raise PDFProcessingError("The file is not a valid PDF")
+    # Opening a stored file counts as a use for the store eviction order
+    content_hash = pdf_store.hash_from_path(file_path)
+    if content_hash:
+        pdf_store.touch(content_hash)
+    return document
+
+def _file_hash(file_path: str) -> str:
+    """Returns the content hash of a file, read from the name of files in the PDF store."""
+    return pdf_store.hash_from_path(file_path) or compute_file_hash(file_path)
+
+# Open documents, bounded and reopened on demand; keyed by document ID
+document_sessions = DocumentSessionManager(_open_pdf_file, _file_hash)
+
+# Files of open sessions stay in the store
+pdf_store.is_protected = document_sessions.has_path
+
+def open_pdf(file_path: str, doc_id: Optional[str] = None) -> Tuple[str, fitz.Document]:
     """
     Opens a PDF file and returns a document ID and the document object.
+    If the file is already open, its existing document ID is returned.
     
     Args:
         file_path: Path to the PDF file
+        doc_id: ID to give the document if it is not open yet (random by default)
         
     Returns:
         Tuple of (doc_id, document)
@@ -36,91 +75,128 @@ def open_pdf(file_path: str) -> Tuple[str, fitz.Document]:
         PDFProcessingError: If the file cannot be opened or is not a valid PDF
     """
     try:
-        document = fitz.open(file_path)
-        if document.is_pdf:
-            # Generate a unique ID for this document
-            doc_id = str(uuid4())
-            # Store the document for future reference
-            _open_documents[doc_id] = (document, file_path)
-            logger.info(f"PDF opened successfully: {file_path} (ID: {doc_id}, {len(document)} pages)")
-            return doc_id, document
-        else:
-            document.close()
-            raise PDFProcessingError("The file is not a valid PDF")
+        session = document_sessions.open(file_path, doc_id)
+        logger.info(f"PDF opened successfully: {file_path} (ID: {session.doc_id}, {session.page_count} pages)")
+        return session.doc_id, session.document
     except Exception as e:
         logger.error(f"Failed to open PDF: {str(e)}")
         raise PDFProcessingError(f"Failed to open PDF file: {str(e)}")
 
-def get_document(doc_id: str) -> fitz.Document:
+def _get_session(doc_id: str) -> DocumentSession:
+    """Returns the session of a document, restoring it if needed."""
+    try:
+        return document_sessions.get_session(doc_id)
+    except DocumentNotFoundError as e:
+        logger.error(str(e))
+        raise PDFProcessingError(str(e))
+
+@contextmanager
+def use_document(doc_id: str) -> Iterator[fitz.Document]:
+    """
+    Yields the open document of a session, reopening it if its handle was
+    evicted; the handle is not evicted while in use.
+    
+    Raises:
+        PDFProcessingError: If the document ID is not found
+    """
+    _get_session(doc_id)
+    with document_sessions.acquire(doc_id) as document:
+        yield document
+
+def get_document_path(doc_id: str) -> str:
     """
-    Retrieves a previously opened document by its ID.
+    Returns the file path of a previously opened document.
     
     Args:
         doc_id: Document ID returned from open_pdf
         
     Returns:
-        The document object
+        Path of the PDF file on disk
         
     Raises:
         PDFProcessingError: If the document ID is not found
     """
-    if doc_id in _open_documents:
-        return _open_documents[doc_id][0]
-    
-    logger.error(f"Document with ID {doc_id} not found")
-    raise PDFProcessingError(f"Document with ID {doc_id} not found")
+    return _get_session(doc_id).file_path
 
-def close_document(doc_id: str) -> None:
+def get_document_hash(doc_id: str) -> str:
     """
-    Closes a previously opened document and removes it from memory.
+    Returns the SHA-256 content hash of a previously opened document.
     
     Args:
-        doc_id: Document ID to close
+        doc_id: Document ID returned from open_pdf
+        
+    Returns:
+        Hex-encoded SHA-256 digest of the PDF file
         
     Raises:
         PDFProcessingError: If the document ID is not found
     """
-    if doc_id in _open_documents:
-        document, _ = _open_documents[doc_id]
-        document.close()
-        del _open_documents[doc_id]
-        logger.info(f"Document closed: {doc_id}")
-    else:
-        logger.error(f"Document with ID {doc_id} not found for closing")
-        raise PDFProcessingError(f"Document with ID {doc_id} not found")
+    return _get_session(doc_id).content_hash
 
-def save_uploaded_pdf(file_content: bytes) -> Tuple[str, str]:
+def add_document_client(doc_id: str) -> str:
     """
-    Saves an uploaded PDF to a temporary file and opens it.
+    Gives a client (an upload or a reopened tab) its own ID on the shared
+    session of a document, so closing it only releases that client.
     
     Args:
-        file_content: PDF file bytes
+        doc_id: Document ID returned from open_pdf
         
     Returns:
-        Tuple of (doc_id, file_path)
+        Client ID, usable wherever a document ID is
         
     Raises:
-        PDFProcessingError: If the file cannot be saved or opened
+        PDFProcessingError: If the document ID is not found
     """
     try:
-        # Create a temporary file
-        temp_dir = tempfile.gettempdir()
-        file_name = f"uploaded_pdf_{uuid4()}.pdf"
-        file_path = os.path.join(temp_dir, file_name)
+        return document_sessions.add_client(doc_id)
+    except DocumentNotFoundError as e:
+        logger.error(str(e))
+        raise PDFProcessingError(str(e))
+
+def close_document(doc_id: str) -> Optional[str]:
+    """
+    Releases a client of a document; the document is closed and removed
+    from memory when its last client is released.
+    
+    Args:
+        doc_id: Client ID returned from add_document_client (or a document ID opened without clients)
         
-        # Write the file content
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+    Returns:
+        The document ID of the session that was closed, or None if other clients still use it
         
-        logger.info(f"PDF saved to temporary file: {file_path}")
+    Raises:
+        PDFProcessingError: If the ID is not found
+    """
+    try:
+        closed = document_sessions.release_client(doc_id)
+        logger.info(f"Document closed: {doc_id}" if closed else f"Document client released: {doc_id}")
+        return closed
+    except DocumentNotFoundError as e:
+        logger.error(f"Document with ID {doc_id} not found for closing")
+        raise PDFProcessingError(str(e))
+
+def store_uploaded_file(temp_path: str, content_hash: str) -> Tuple[str, bool]:
+    """
+    Moves a PDF that was streamed to a temporary file into the
+    content-addressed store; identical uploads share one stored file.
+    
+    Args:
+        temp_path: Temporary file holding the upload
+        content_hash: SHA-256 digest computed while the file was written
         
-        # Open the PDF and get its ID
-        doc_id, _ = open_pdf(file_path)
+    Returns:
+        Tuple of (file_path, already_stored)
         
-        return doc_id, file_path
+    Raises:
+        PDFProcessingError: If the file cannot be stored
+    """
+    try:
+        file_path, already_stored = pdf_store.put_file(temp_path, content_hash)
+        logger.info(f"PDF stored at {file_path} (already stored: {already_stored})")
+        return file_path, already_stored
     except Exception as e:
-        logger.error(f"Failed to save uploaded PDF: {str(e)}")
-        raise PDFProcessingError(f"Failed to save uploaded PDF: {str(e)}")
+        logger.error(f"Failed to store uploaded PDF: {str(e)}")
+        raise PDFProcessingError(f"Failed to store uploaded PDF: {str(e)}")
 
 def get_page_count(doc_id: str) -> int:
     """
@@ -135,63 +211,28 @@ def get_page_count(doc_id: str) -> int:
     Raises:
         PDFProcessingError: If the document ID is not found
     """
-    document = get_document(doc_id)
-    return len(document)
+    return _get_session(doc_id).page_count
 
-def render_page_to_image(doc_id: str, page_number: int, zoom: float = 2.0) -> str:
+def get_page_size(doc_id: str, page_number: int) -> Tuple[float, float]:
     """
-    Renders a PDF page as a base64-encoded PNG image.
+    Returns the size of a page in points.
     
     Args:
         doc_id: Document ID
         page_number: 1-based page number
-        zoom: Zoom factor for rendering (higher values for better quality)
         
     Returns:
-        Base64-encoded PNG image
+        Tuple of (width, height)
         
     Raises:
-        PDFProcessingError: If rendering fails or page number is invalid
+        PDFProcessingError: If the document or page is not found
     """
-    try:
-        document = get_document(doc_id)
-        
-        # Adjust for 0-based indexing
+    with use_document(doc_id) as document:
         page_idx = page_number - 1
-        
         if page_idx < 0 or page_idx >= len(document):
-            logger.error(f"Invalid page number {page_number} (document has {len(document)} pages)")
             raise PDFProcessingError(f"Invalid page number {page_number}")
-        
-        logger.info(f"Rendering page {page_number} of document {doc_id}")
-        
-        try:
-            page = document[page_idx]
-        except Exception as e:
-            logger.error(f"Error accessing page {page_number}: {str(e)}")
-            # Try to reopen the document if page access fails
-            file_path = _open_documents[doc_id][1]
-            logger.info(f"Attempting to reopen document from {file_path}")
-            document.close()
-            document = fitz.open(file_path)
-            _open_documents[doc_id] = (document, file_path)
-            page = document[page_idx]
-            
-        # Create a pixmap with higher resolution for better quality
-        matrix = fitz.Matrix(zoom, zoom)
-        pixmap = page.get_pixmap(matrix=matrix, alpha=False)
-        
-        # Convert to PNG and encode as base64
-        png_bytes = pixmap.tobytes("png")
-        base64_image = base64.b64encode(png_bytes).decode('utf-8')
-        
-        logger.info(f"Successfully rendered page {page_number}")
-        return base64_image
-    except Exception as e:
-        logger.error(f"Failed to render page {page_number}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise PDFProcessingError(f"Failed to render page {page_number}: {str(e)}")
+        rect = document[page_idx].rect
+        return rect.width, rect.height
 
 def extract_text_from_page(doc_id: str, page_number: int) -> str:
     """
@@ -208,28 +249,19 @@ def extract_text_from_page(doc_id: str, page_number: int) -> str:
         PDFProcessingError: If extraction fails or page number is invalid
     """
     try:
-        document = get_document(doc_id)
-        
-        # Adjust for 0-based indexing
-        page_idx = page_number - 1
-        
-        if page_idx < 0 or page_idx >= len(document):
-            raise PDFProcessingError(f"Invalid page number {page_number}")
-        
-        try:
-            page = document[page_idx]
-        except Exception as e:
-            logger.error(f"Error accessing page {page_number} for text extraction: {str(e)}")
-            # Try to reopen the document if page access fails
-            file_path = _open_documents[doc_id][1]
-            document.close()
-            document = fitz.open(file_path)
-            _open_documents[doc_id] = (document, file_path)
-            page = document[page_idx]
+        with use_document(doc_id) as document:
+            # Adjust for 0-based indexing
+            page_idx = page_number - 1
             
-        # Extract text with format data to better preserve layout
-        text = page.get_text("text")
-        return text
+            if page_idx < 0 or page_idx >= len(document):
+                raise PDFProcessingError(f"Invalid page number {page_number}")
+            
+            # Evicted handles are reopened by the session manager
+            page = document[page_idx]
+                
+            # Extract text with format data to better preserve layout
+            text = page.get_text("text")
+            return text
     except Exception as e:
         logger.error(f"Failed to extract text from page {page_number}: {str(e)}")
         raise PDFProcessingError(f"Failed to extract text from page {page_number}: {str(e)}")
@@ -249,19 +281,52 @@ def extract_structured_text(doc_id: str, page_number: int) -> Dict[str, Any]:
         PDFProcessingError: If extraction fails or page number is invalid
     """
     try:
-        document = get_document(doc_id)
-        
-        # Adjust for 0-based indexing
-        page_idx = page_number - 1
-        
-        if page_idx < 0 or page_idx >= len(document):
-            raise PDFProcessingError(f"Invalid page number {page_number}")
-        
-        page = document[page_idx]
-        
-        # Get text in dict format to preserve layout information
-        dict_text = page.get_text("dict")
-        return dict_text
+        with use_document(doc_id) as document:
+            # Adjust for 0-based indexing
+            page_idx = page_number - 1
+            
+            if page_idx < 0 or page_idx >= len(document):
+                raise PDFProcessingError(f"Invalid page number {page_number}")
+            
+            page = document[page_idx]
+            return _page_text_dict(page)
     except Exception as e:
         logger.error(f"Failed to extract structured text from page {page_number}: {str(e)}")
         raise PDFProcessingError(f"Failed to extract structured text from page {page_number}: {str(e)}")
+
+def _page_text_dict(page: fitz.Page) -> Dict[str, Any]:
+    """Returns the text blocks of a page with their positions."""
+    # Get text in dict format to preserve layout information; image
+    # blocks are left out since only text is translated
+    return page.get_text("dict", flags=fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES)
+
+def extract_page_content(doc_id: str, page_number: int) -> Tuple[Dict[str, Any], bool]:
+    """
+    Extracts structured text data from a PDF page and whether the page is
+    image-only (no text, but images, e.g. a scan), in one page access.
+    
+    Args:
+        doc_id: Document ID
+        page_number: 1-based page number
+        
+    Returns:
+        Tuple of (text blocks dictionary, image_only)
+        
+    Raises:
+        PDFProcessingError: If extraction fails or page number is invalid
+    """
+    try:
+        with use_document(doc_id) as document:
+            page_idx = page_number - 1
+            if page_idx < 0 or page_idx >= len(document):
+                raise PDFProcessingError(f"Invalid page number {page_number}")
+            
+            page = document[page_idx]
+            dict_text = _page_text_dict(page)
+            has_text = any(block.get('lines') for block in dict_text.get('blocks', []))
+            # Images are only looked up on pages without text, which are rare
+            image_only = not has_text and bool(page.get_image_info())
+            return dict_text, image_only
+    except Exception as e:
+        logger.error(f"Failed to extract content from page {page_number}: {str(e)}")
+        raise PDFProcessingError(f"Failed to extract content from page {page_number}: {str(e)}")
@@ -0,0 +1,178 @@
+"""
+MoziTranslate - Content-addressed PDF store module
+Stores uploaded PDFs once per content (SHA-256), so identical uploads share
+one file, one open document and one set of cached page results; least
+recently used files are evicted under a disk budget
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import PDF_STORE_DIR, PDF_STORE_MAX_BYTES
+
+logger = logging.getLogger("pdf_store")
+
+_HASH_NAME = re.compile(r"^([0-9a-f]{64})\.pdf$")
+
+
+class PdfStore:
+    """
+    Directory of PDFs named after their SHA-256 digest, sharded by the
+    first two hex digits (``ab/abcdef....pdf``).
+
+    Files are written atomically and their modification time is refreshed
+    on every use, so eviction removes the least recently used files first.
+    Files for which ``is_protected(path)`` is true (e.g. open documents)
+    are never evicted.
+    """
+
+    def __init__(self, root: str = PDF_STORE_DIR, max_bytes: int = PDF_STORE_MAX_BYTES,
+                 is_protected: Optional[Callable[[str], bool]] = None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.is_protected = is_protected
+        self._lock = threading.Lock()
+        self._stored = 0
+        self._deduplicated = 0
+        self._evicted = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, content_hash: str) -> str:
+        """Returns the path of the file with a given content hash."""
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}.pdf")
+
+    def hash_from_path(self, file_path: str) -> Optional[str]:
+        """Returns the content hash of a stored file from its path, or None for files outside the store."""
+        match = _HASH_NAME.match(os.path.basename(file_path))
+        if match is None or os.path.abspath(file_path) != os.path.abspath(self.path_for(match.group(1))):
+            return None
+        return match.group(1)
+
+    def contains(self, content_hash: str) -> bool:
+        """Whether a file with this content hash is stored."""
+        return os.path.exists(self.path_for(content_hash))
+
+    def touch(self, content_hash: str) -> None:
+        """Marks a stored file as recently used."""
+        try:
+            os.utime(self.path_for(content_hash))
+        except OSError:
+            pass
+
+    def put_bytes(self, content: bytes) -> Tuple[str, str, bool]:
+        """
+        Stores file content unless identical content is already stored.
+
+        Returns:
+            Tuple of (content_hash, file_path, already_stored)
+        """
+        content_hash = hashlib.sha256(content).hexdigest()
+        path = self.path_for(content_hash)
+        with self._lock:
+            if os.path.exists(path):
+                self._deduplicated += 1
+                self.touch(content_hash)
+                return content_hash, path, True
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(content)
+                os.replace(temp_path, path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            self._stored += 1
+        logger.info(f"Stored PDF {content_hash} ({len(content)} bytes)")
+        self.evict(keep=content_hash)
+        return content_hash, path, False
+
+    def put_file(self, source_path: str, content_hash: str) -> Tuple[str, bool]:
+        """
+        Moves a file whose content hash is already known into the store,
+        discarding it if identical content is already stored.
+
+        Returns:
+            Tuple of (file_path, already_stored)
+        """
+        path = self.path_for(content_hash)
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(source_path)
+                self._deduplicated += 1
+                self.touch(content_hash)
+                return path, True
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(source_path, path)
+            self._stored += 1
+        logger.info(f"Stored PDF {content_hash}")
+        self.evict(keep=content_hash)
+        return path, False
+
+    def _scan(self) -> Dict[str, Tuple[float, int]]:
+        """Returns {path: (mtime, size)} of every stored file."""
+        files = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if not _HASH_NAME.match(name):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files[path] = (stat.st_mtime, stat.st_size)
+        return files
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Removes least recently used files until the store fits its budget.
+
+        Args:
+            keep: Content hash that must not be evicted (e.g. the file just stored)
+
+        Returns:
+            Number of bytes freed
+        """
+        with self._lock:
+            files = self._scan()
+            total = sum(size for _, size in files.values())
+            freed = 0
+            keep_path = os.path.abspath(self.path_for(keep)) if keep else None
+            for path, (_, size) in sorted(files.items(), key=lambda item: item[1][0]):
+                if total - freed <= self.max_bytes:
+                    break
+                if os.path.abspath(path) == keep_path or (self.is_protected and self.is_protected(path)):
+                    continue
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"Failed to evict {path}: {str(e)}")
+                    continue
+                freed += size
+                self._evicted += 1
+                logger.info(f"Evicted stored PDF {os.path.basename(path)}")
+            return freed
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Returns store usage and deduplication counters."""
+        with self._lock:
+            files = self._scan()
+            return {
+                'files': len(files),
+                'bytes': sum(size for _, size in files.values()),
+                'max_bytes': self.max_bytes,
+                'stored': self._stored,
+                'deduplicated': self._deduplicated,
+                'evicted': self._evicted
+            }
+
+
+# Initialize global PDF store instance
+pdf_store = PdfStore()
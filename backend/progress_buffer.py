@@ -0,0 +1,108 @@
+"""
+MoziTranslate - Progress buffer module
+Buffers reading-progress updates in memory, keeping only the latest update
+per document, and writes them to the history in one transaction on a timer,
+when too many are pending, and on shutdown
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from config import PROGRESS_FLUSH_MAX_PENDING
+
+logger = logging.getLogger("progress_buffer")
+
+# Writes buffered updates in one transaction; each update has pdf_id,
+# last_page, total_pages, progress and last_read_date
+ProgressWriter = Callable[[List[Dict[str, Any]]], None]
+
+
+class ProgressBuffer:
+    """
+    Last-write-wins buffer of progress updates keyed on ``pdf_id``.
+
+    Turning ten pages between two flushes costs one row write instead of
+    ten transactions. Pending updates are visible through ``pending`` so
+    reads can overlay them; a failed flush keeps its updates for the next
+    attempt unless newer ones arrived meanwhile.
+    """
+
+    def __init__(self, writer: ProgressWriter, max_pending: int = PROGRESS_FLUSH_MAX_PENDING):
+        self.writer = writer
+        self.max_pending = max_pending
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        # Serializes flushes, so an older batch never lands after a newer one
+        self._flush_lock = threading.Lock()
+        self._recorded = 0
+        self._written = 0
+        self._flushes = 0
+
+    def record(self, pdf_id: str, current_page: int, total_pages: int) -> None:
+        """Buffers a progress update, replacing any pending update of the same document."""
+        progress = round((current_page / total_pages) * 100, 1) if total_pages > 0 else 0
+        update = {
+            'pdf_id': pdf_id,
+            'last_page': current_page,
+            'total_pages': total_pages,
+            'progress': progress,
+            'last_read_date': datetime.now().isoformat()
+        }
+        with self._lock:
+            self._pending[pdf_id] = update
+            self._recorded += 1
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self.flush()
+
+    def pending(self, pdf_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the pending update of a document, if any."""
+        with self._lock:
+            update = self._pending.get(pdf_id)
+            return dict(update) if update else None
+
+    def discard(self, pdf_id: Optional[str] = None) -> None:
+        """Drops the pending update of a document (of every document if None), e.g. when its row is rewritten."""
+        with self._lock:
+            if pdf_id is None:
+                self._pending.clear()
+            else:
+                self._pending.pop(pdf_id, None)
+
+    def flush(self) -> int:
+        """
+        Writes every pending update in one transaction.
+
+        Returns:
+            Number of documents written
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+            try:
+                self.writer(list(batch.values()))
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} progress updates: {str(e)}")
+                with self._lock:
+                    # Updates recorded during the write are newer; keep them
+                    for pdf_id, update in batch.items():
+                        self._pending.setdefault(pdf_id, update)
+                raise
+            with self._lock:
+                self._written += len(batch)
+                self._flushes += 1
+            return len(batch)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Returns pending, recorded and written update counters."""
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'recorded': self._recorded,
+                'written': self._written,
+                'flushes': self._flushes,
+                'coalesced': self._recorded - self._written - len(self._pending)
+            }
@@ -0,0 +1,197 @@
+"""
+MoziTranslate - Read-ahead scheduler module
+Prefetches the pages a reader is about to open, with a window that adapts
+to the reading pace and cancellation when the reader jumps elsewhere
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from config import READ_AHEAD_CONCURRENCY, READ_AHEAD_HORIZON, READ_AHEAD_IDLE_TIMEOUT, READ_AHEAD_MAX_WINDOW
+
+logger = logging.getLogger("read_ahead")
+
+# Coroutine function that warms the caches for (doc_id, page_number, source_lang, target_lang)
+PageLoader = Callable[[str, int, str, str], Awaitable[Any]]
+
+# (doc_id, source_lang, target_lang)
+ReaderKey = Tuple[str, str, str]
+
+
+class _ReaderState:
+    """Position and pace of one reader of one document."""
+
+    def __init__(self):
+        self.last_page = 0
+        self.reads: Deque[Tuple[float, int]] = deque(maxlen=5)
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self.last_used = time.monotonic()
+
+
+class ReadAheadScheduler:
+    """
+    Enqueues background work for pages N+1..N+k whenever page N is served
+    in the foreground.
+
+    The window k grows with the reading pace, so that it covers roughly
+    ``horizon`` seconds of reading. Prefetches for pages that fall out of
+    the window are cancelled, and a bounded semaphore keeps prefetching from
+    crowding out foreground requests. Readers that stop reading without
+    closing their document are forgotten after ``idle_timeout`` seconds
+    (see ``expire_idle``).
+    """
+
+    def __init__(self, loader: PageLoader, max_window: int = READ_AHEAD_MAX_WINDOW,
+                 concurrency: int = READ_AHEAD_CONCURRENCY, horizon: float = READ_AHEAD_HORIZON,
+                 idle_timeout: float = READ_AHEAD_IDLE_TIMEOUT):
+        self.loader = loader
+        self.max_window = max_window
+        self.concurrency = concurrency
+        self.horizon = horizon
+        self.idle_timeout = idle_timeout
+        self._readers: Dict[ReaderKey, _ReaderState] = {}
+        # Pages warmed by a prefetch that no foreground read has consumed yet
+        self._prefetched: Dict[Tuple[ReaderKey, int], float] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._scheduled = 0
+        self._completed = 0
+        self._cancelled = 0
+        self._failed = 0
+        self._hits = 0
+        self._in_flight_hits = 0
+        self._misses = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Creates the semaphore lazily, inside the running event loop."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def compute_window(self, state: _ReaderState) -> int:
+        """Returns how many pages ahead to prefetch for the reader's pace."""
+        if len(state.reads) < 2:
+            return 1
+        (first_time, first_page), (last_time, last_page) = state.reads[0], state.reads[-1]
+        elapsed = last_time - first_time
+        advanced = last_page - first_page
+        if elapsed <= 0 or advanced <= 0:
+            return 1
+        pages_per_second = advanced / elapsed
+        return max(1, min(self.max_window, math.ceil(pages_per_second * self.horizon)))
+
+    def record_foreground(self, doc_id: str, page_number: int, source_lang: str, target_lang: str) -> bool:
+        """
+        Records a foreground read for the prefetch hit-rate metrics.
+
+        Returns:
+            True if the page had been (or is being) prefetched
+        """
+        reader = (doc_id, source_lang, target_lang)
+        if self._prefetched.pop((reader, page_number), None) is not None:
+            self._hits += 1
+            return True
+        state = self._readers.get(reader)
+        if state is not None and page_number in state.tasks:
+            self._in_flight_hits += 1
+            return True
+        self._misses += 1
+        return False
+
+    def on_page_served(self, doc_id: str, page_number: int, total_pages: int,
+                       source_lang: str, target_lang: str) -> None:
+        """Updates the reader position and (re)schedules the read-ahead window."""
+        reader = (doc_id, source_lang, target_lang)
+        state = self._readers.setdefault(reader, _ReaderState())
+
+        window = self.compute_window(state) if state.reads else 1
+        if state.reads and abs(page_number - state.last_page) > max(window, 1) + 1:
+            # A jump resets the pace estimate
+            state.reads.clear()
+        state.last_used = time.monotonic()
+        state.reads.append((state.last_used, page_number))
+        state.last_page = page_number
+
+        window = self.compute_window(state)
+        wanted = set(range(page_number + 1, min(total_pages, page_number + window) + 1))
+
+        # Cancel prefetches the reader has moved away from
+        for page, task in list(state.tasks.items()):
+            if page not in wanted:
+                task.cancel()
+                del state.tasks[page]
+                self._cancelled += 1
+
+        for page in sorted(wanted):
+            if page in state.tasks or (reader, page) in self._prefetched:
+                continue
+            state.tasks[page] = asyncio.ensure_future(self._prefetch(reader, state, page))
+            self._scheduled += 1
+
+    async def _prefetch(self, reader: ReaderKey, state: _ReaderState, page_number: int) -> None:
+        """Runs one prefetch job under the concurrency limit."""
+        doc_id, source_lang, target_lang = reader
+        try:
+            async with self._get_semaphore():
+                await self.loader(doc_id, page_number, source_lang, target_lang)
+            self._prefetched[(reader, page_number)] = time.monotonic()
+            self._completed += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._failed += 1
+            logger.warning(f"Prefetch of page {page_number} of {doc_id} failed: {str(e)}")
+        finally:
+            if state.tasks.get(page_number) is asyncio.current_task():
+                del state.tasks[page_number]
+
+    def cancel_document(self, doc_id: str) -> None:
+        """Cancels every prefetch of a document and forgets its readers."""
+        for reader in [reader for reader in self._readers if reader[0] == doc_id]:
+            for task in self._readers.pop(reader).tasks.values():
+                task.cancel()
+                self._cancelled += 1
+        for key in [key for key in self._prefetched if key[0][0] == doc_id]:
+            del self._prefetched[key]
+
+    def expire_idle(self) -> int:
+        """
+        Forgets the readers idle for longer than the idle timeout, e.g. tabs
+        closed without closing their document, and the prefetched pages no
+        read consumed in that time.
+
+        Returns:
+            Number of readers forgotten
+        """
+        deadline = time.monotonic() - self.idle_timeout
+        idle = [reader for reader, state in self._readers.items()
+                if state.last_used < deadline and not state.tasks]
+        for reader in idle:
+            del self._readers[reader]
+        for key in [key for key, prefetched_at in self._prefetched.items() if prefetched_at < deadline]:
+            del self._prefetched[key]
+        return len(idle)
+
+    def cancel_all(self) -> None:
+        """Cancels every pending prefetch."""
+        for doc_id in {reader[0] for reader in self._readers}:
+            self.cancel_document(doc_id)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Returns prefetch counters and the prefetch hit rate."""
+        foreground = self._hits + self._in_flight_hits + self._misses
+        return {
+            'scheduled': self._scheduled,
+            'completed': self._completed,
+            'cancelled': self._cancelled,
+            'failed': self._failed,
+            'hits': self._hits,
+            'in_flight_hits': self._in_flight_hits,
+            'misses': self._misses,
+            'hit_rate': round((self._hits + self._in_flight_hits) / foreground, 3) if foreground else 0.0,
+            'pending': sum(len(state.tasks) for state in self._readers.values()),
+            'active_readers': len(self._readers),
+            'prefetched_unread': len(self._prefetched)
+        }
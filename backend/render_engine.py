@@ -0,0 +1,233 @@
+"""
+MoziTranslate - Rendering engine module
+Rasterizes PDF pages on a pool of worker processes so rendering scales
+across CPU cores instead of being bound to the GIL of the API process
+"""
+import importlib.util
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import NamedTuple, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from config import (
+    DEFAULT_IMAGE_QUALITY,
+    IMAGE_PAGE_COVERAGE,
+    MAX_TILE_ZOOM,
+    MAX_ZOOM,
+    MIN_ZOOM,
+    RENDER_WORKER_MAX_DOCUMENTS,
+    RENDER_WORKERS
+)
+
+logger = logging.getLogger("render_engine")
+
+# WebP output goes through Pillow, which is an optional dependency
+WEBP_SUPPORTED = importlib.util.find_spec("PIL") is not None
+
+IMAGE_FORMATS = ("auto", "png", "jpeg", "webp")
+
+# Per-process state of a render worker: open documents keyed by content hash
+_worker_documents: "OrderedDict[str, fitz.Document]" = OrderedDict()
+_worker_max_documents = RENDER_WORKER_MAX_DOCUMENTS
+
+
+def _init_worker(max_documents: int) -> None:
+    """Initializes a render worker process."""
+    global _worker_max_documents
+    _worker_max_documents = max_documents
+
+
+def _get_worker_document(file_path: str, document_key: str) -> fitz.Document:
+    """Returns a cached document handle of this worker, opening it if needed."""
+    document = _worker_documents.get(document_key)
+    if document is not None and not document.is_closed:
+        _worker_documents.move_to_end(document_key)
+        return document
+
+    document = fitz.open(file_path)
+    _worker_documents[document_key] = document
+    while len(_worker_documents) > _worker_max_documents:
+        _, oldest = _worker_documents.popitem(last=False)
+        oldest.close()
+    return document
+
+
+class RenderOptions(NamedTuple):
+    """
+    Client-selectable rendering parameters. Hashable, so a set of options
+    identifies one cacheable variant of a page.
+
+    Resolution is taken from ``width`` (pixels), then ``dpi``, then ``zoom``.
+    ``image_format`` is ``auto``, ``png``, ``jpeg`` or ``webp``; with ``auto``
+    the worker picks PNG for text pages and a lossy format for scans.
+    ``clip`` restricts rendering to a region ``(x0, y0, x1, y1)`` in page
+    points, which is how tiles and visible-region renders are produced.
+    """
+    image_format: str = "auto"
+    quality: int = DEFAULT_IMAGE_QUALITY
+    zoom: float = 2.0
+    width: Optional[int] = None
+    dpi: Optional[int] = None
+    grayscale: bool = False
+    allow_webp: bool = False
+    clip: Optional[Tuple[float, float, float, float]] = None
+
+
+def normalize_render_options(options: RenderOptions) -> RenderOptions:
+    """
+    Resets the options that cannot change the rendered image to their
+    defaults, so equivalent requests share one ETag and one cache entry:
+    the quality of PNG output, the zoom or DPI overridden by a width or DPI,
+    and WebP permission when the format is not automatic (or WebP is unavailable).
+    """
+    defaults = RenderOptions()
+    changes = {}
+    if options.image_format == "png" and options.quality != defaults.quality:
+        changes['quality'] = defaults.quality
+    if options.width and (options.dpi is not None or options.zoom != defaults.zoom):
+        changes.update(dpi=None, zoom=defaults.zoom)
+    elif options.dpi and options.zoom != defaults.zoom:
+        changes['zoom'] = defaults.zoom
+    if options.allow_webp and (options.image_format != "auto" or not WEBP_SUPPORTED):
+        changes['allow_webp'] = False
+    return options._replace(**changes) if changes else options
+
+
+def _resolve_zoom(page: fitz.Page, options: RenderOptions) -> float:
+    """Computes the zoom factor from the requested width, DPI or zoom."""
+    if options.width:
+        zoom = options.width / page.rect.width
+    elif options.dpi:
+        zoom = options.dpi / 72.0
+    else:
+        zoom = options.zoom
+    # Clipped renders only rasterize a region, so they may use a higher zoom
+    max_zoom = MAX_TILE_ZOOM if options.clip else MAX_ZOOM
+    return max(MIN_ZOOM, min(max_zoom, zoom))
+
+
+def is_image_page(page: fitz.Page) -> bool:
+    """Detects pages that are mostly raster images (scans, photos)."""
+    page_area = abs(page.rect)
+    if not page_area:
+        return False
+    covered = 0.0
+    for info in page.get_image_info():
+        covered += abs(fitz.Rect(info["bbox"]) & page.rect)
+    return covered / page_area >= IMAGE_PAGE_COVERAGE
+
+
+def _resolve_format(page: fitz.Page, options: RenderOptions) -> str:
+    """Picks the output format, resolving ``auto`` from the page content."""
+    if options.image_format != "auto":
+        return options.image_format
+    if not is_image_page(page):
+        return "png"
+    return "webp" if options.allow_webp and WEBP_SUPPORTED else "jpeg"
+
+
+def render_page_job(file_path: str, document_key: str, page_number: int,
+                    options: RenderOptions = RenderOptions()) -> Tuple[bytes, str]:
+    """
+    Renders and encodes a page. Runs inside a render worker process,
+    but can also be called in-process.
+
+    Args:
+        file_path: Path to the PDF file
+        document_key: Stable key of the document (its content hash)
+        page_number: 1-based page number
+        options: Format, quality, resolution and colorspace of the image
+
+    Returns:
+        Tuple of (encoded image bytes, media type)
+
+    Raises:
+        ValueError: If the page number or the requested format is invalid
+    """
+    document = _get_worker_document(file_path, document_key)
+
+    page_idx = page_number - 1
+    if page_idx < 0 or page_idx >= len(document):
+        raise ValueError(f"Invalid page number {page_number}")
+
+    try:
+        page = document[page_idx]
+    except Exception:
+        # The cached handle may be stale; reopen it once
+        _worker_documents.pop(document_key, None)
+        document.close()
+        document = _get_worker_document(file_path, document_key)
+        page = document[page_idx]
+
+    image_format = _resolve_format(page, options)
+    zoom = _resolve_zoom(page, options)
+    colorspace = fitz.csGRAY if options.grayscale else fitz.csRGB
+    clip = None
+    if options.clip:
+        clip = fitz.Rect(options.clip) & page.rect
+        if clip.is_empty:
+            raise ValueError(f"Clip region {options.clip} is outside page {page_number}")
+    pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace,
+                             clip=clip, alpha=False)
+
+    if image_format == "png":
+        return pixmap.tobytes("png"), "image/png"
+    if image_format == "jpeg":
+        return pixmap.tobytes("jpeg", jpg_quality=options.quality), "image/jpeg"
+    if image_format == "webp":
+        if not WEBP_SUPPORTED:
+            raise ValueError("WebP encoding requires Pillow")
+        return pixmap.pil_tobytes(format="WEBP", quality=options.quality), "image/webp"
+    raise ValueError(f"Unsupported image format: {image_format}")
+
+
+class RenderEngine:
+    """
+    Pool of render worker processes. Each worker keeps its own LRU of open
+    ``fitz.Document`` handles, so repeated renders of a document skip
+    reopening the file.
+    """
+
+    def __init__(self, workers: int = RENDER_WORKERS, max_documents: int = RENDER_WORKER_MAX_DOCUMENTS):
+        self.workers = workers
+        self.max_documents = max_documents
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether rendering is delegated to worker processes."""
+        return self.workers > 0
+
+    @property
+    def executor(self) -> Executor:
+        """The process pool, started on first use and restarted if it broke."""
+        with self._lock:
+            if self._executor is None or getattr(self._executor, "_broken", False):
+                if self._executor is not None:
+                    logger.error("Render process pool is broken, restarting it")
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                # Spawn keeps the workers free of the API process threads and fitz state
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.max_documents,)
+                )
+                logger.info(f"Render process pool started with {self.workers} workers")
+            return self._executor
+
+    def shutdown(self) -> None:
+        """Stops the worker processes."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Initialize global render engine instance
+render_engine = RenderEngine()
@@ -0,0 +1,133 @@
+"""
+MoziTranslate - Layout-aware segmentation module
+Turns the block/line/span structure of a page (PyMuPDF ``get_text("dict")``)
+into translatable units with bounding boxes, merging lines broken by
+hyphenation or wrapping, and packs units into translation chunks
+"""
+import re
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+# (x0, y0, x1, y1) in page points
+BBox = Tuple[float, float, float, float]
+
+# PyMuPDF block type of text blocks (images are type 1)
+TEXT_BLOCK = 0
+
+# Hyphens that may end a line broken inside a word
+_HYPHENS = ("-", "\u2010")
+
+# A line starting with a list marker starts a new unit even inside a block
+_LIST_MARKER = re.compile(r"^\s*(?:[\u2022\u25cf\u25aa\u2013*]|\d{1,3}[.)]|[a-zA-Z][.)])\s+")
+
+
+class TextUnit(NamedTuple):
+    """One translatable unit of a page: a paragraph, heading, caption or list item."""
+    text: str
+    bbox: BBox
+    block_number: int
+
+
+def _line_text(line: Dict[str, Any]) -> str:
+    """Joins the spans of a line."""
+    return "".join(span.get("text", "") for span in line.get("spans", ()))
+
+
+def _union(first: BBox, second: BBox) -> BBox:
+    """Returns the bounding box covering both boxes."""
+    return (min(first[0], second[0]), min(first[1], second[1]),
+            max(first[2], second[2]), max(first[3], second[3]))
+
+
+def merge_lines(lines: List[str]) -> str:
+    """
+    Joins the lines of a paragraph into one string.
+
+    A line ending in a hyphen after a letter is joined to the next line
+    without a space: the hyphen is dropped when the next line starts in lower
+    case (``trans-`` + ``lation``) and kept otherwise (``Franco-`` +
+    ``Prussian``). Soft hyphens are always dropped; other lines are joined
+    with a space. Runs in time linear in the length of the text.
+    """
+    parts: List[str] = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if parts:
+            previous = parts[-1]
+            if previous.endswith("\u00ad"):
+                parts[-1] = previous[:-1]
+            elif previous.endswith(_HYPHENS) and len(previous) > 1 and previous[-2].isalpha():
+                if line[0].islower():
+                    parts[-1] = previous[:-1]
+            else:
+                parts.append(" ")
+        parts.append(line)
+    return "".join(parts).replace("\u00ad", "")
+
+
+def segment_page(page_dict: Dict[str, Any]) -> List[TextUnit]:
+    """
+    Extracts the translatable units of a page in reading order.
+
+    Each text block becomes one unit, except that lines starting with a list
+    marker start a new unit. Blocks without text (and image blocks) are skipped.
+
+    Args:
+        page_dict: Output of ``page.get_text("dict")``
+
+    Returns:
+        List of units with their text and bounding box
+    """
+    units: List[TextUnit] = []
+    for block in page_dict.get("blocks", ()):
+        if block.get("type", TEXT_BLOCK) != TEXT_BLOCK:
+            continue
+        block_number = block.get("number", len(units))
+        lines: List[str] = []
+        bbox = None
+
+        for line in block.get("lines", ()):
+            text = _line_text(line)
+            if not text.strip():
+                continue
+            if lines and _LIST_MARKER.match(text):
+                units.append(TextUnit(merge_lines(lines), bbox, block_number))
+                lines, bbox = [], None
+            lines.append(text)
+            line_bbox = tuple(line.get("bbox", block.get("bbox", (0.0, 0.0, 0.0, 0.0))))
+            bbox = line_bbox if bbox is None else _union(bbox, line_bbox)
+
+        if lines:
+            units.append(TextUnit(merge_lines(lines), bbox, block_number))
+    return [unit for unit in units if unit.text]
+
+
+def pack_units(texts: List[str], max_chunk_size: int = 1000, separator_size: int = 2) -> List[Tuple[int, int]]:
+    """
+    Groups consecutive units into chunks of at most ``max_chunk_size``
+    characters (a unit larger than that forms a chunk on its own).
+    Runs in time linear in the number of units.
+
+    Args:
+        texts: Unit texts in reading order
+        max_chunk_size: Maximum characters per chunk
+        separator_size: Characters added between units when they are joined
+
+    Returns:
+        List of (start, end) index ranges into ``texts``
+    """
+    chunks: List[Tuple[int, int]] = []
+    start = 0
+    size = 0
+    for index, text in enumerate(texts):
+        added = len(text) + (separator_size if index > start else 0)
+        if index > start and size + added > max_chunk_size:
+            chunks.append((start, index))
+            start = index
+            added = len(text)
+            size = 0
+        size += added
+    if start < len(texts):
+        chunks.append((start, len(texts)))
+    return chunks
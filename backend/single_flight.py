@@ -0,0 +1,95 @@
+"""
+MoziTranslate - Single-flight module
+Coalesces concurrent identical requests: the first caller starts the work,
+later callers with the same key await the same result instead of repeating it
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+logger = logging.getLogger("single_flight")
+
+T = TypeVar("T")
+
+
+class _Flight:
+    """One shared piece of work and the number of callers awaiting it."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one coroutine per key at a time.
+
+    Callers that arrive while the work for their key is running share its
+    result (or its exception). The work is shielded from the callers: a
+    caller that is cancelled (e.g. its client disconnected, or its prefetch
+    fell out of the read-ahead window) stops waiting, while the others keep
+    waiting for the same work. Only when the last caller is gone is the
+    work cancelled, as it would have been without coalescing.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._started = 0
+        self._coalesced = 0
+        self._abandoned = 0
+
+    async def run(self, key: Hashable, work: Callable[[], Awaitable[T]]) -> T:
+        """
+        Returns the result of ``work()``, or of the work already running for ``key``.
+
+        Args:
+            key: Identifies identical requests (e.g. the page cache key)
+            work: Coroutine function producing the result; only called if no work is running for the key
+
+        Returns:
+            The result of the shared work
+
+        Raises:
+            Any exception raised by the shared work
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(work()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task: self._finish(key, flight))
+            self._started += 1
+        else:
+            self._coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # Nobody wants the result any more; a later request starts afresh
+                self._abandoned += 1
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        """Removes a flight, unless a newer one already replaced it."""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _finish(self, key: Hashable, flight: _Flight) -> None:
+        """Forgets a finished flight, so the next request for its key starts new work."""
+        self._forget(key, flight)
+        if not flight.task.cancelled() and flight.task.exception() is not None:
+            # Retrieving the exception keeps asyncio from reporting it as lost when every caller left
+            logger.debug(f"Shared {self.name} work failed: {flight.task.exception()}")
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Returns started, coalesced and abandoned work counters."""
+        return {
+            'in_flight': len(self._flights),
+            'started': self._started,
+            'coalesced': self._coalesced,
+            'abandoned': self._abandoned
+        }
@@ -0,0 +1,92 @@
+"""
+Tests for whole-document batch translation jobs
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from batch_jobs import BatchJobManager, BatchJobError, JobNotFoundError
+
+
+class FakeTranslator:
+    """Records translated pages; fails on the pages it is told to."""
+
+    def __init__(self, delay: float = 0.0, failing_pages=()):
+        self.delay = delay
+        self.failing_pages = set(failing_pages)
+        self.pages = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, doc_id, page_number, source_lang, target_lang):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if page_number in self.failing_pages:
+                raise RuntimeError("upstream error")
+            self.pages.append(page_number)
+        finally:
+            self.in_flight -= 1
+
+
+def test_job_translates_range_with_bounded_parallelism():
+    async def scenario():
+        translator = FakeTranslator(delay=0.01, failing_pages={4})
+        manager = BatchJobManager(translator, concurrency=2)
+        job = manager.start_job("doc", 2, 6, "auto", "pt")
+        snapshots = [snapshot async for snapshot in manager.watch(job.job_id)]
+        return translator, snapshots
+
+    translator, snapshots = asyncio.run(scenario())
+    assert sorted(translator.pages) == [2, 3, 5, 6]
+    assert translator.max_in_flight == 2
+    final = snapshots[-1]
+    assert final['status'] == "completed"
+    assert final['pages_done'] == 4
+    assert final['pages_failed'] == 1
+    assert final['errors'] == [{'page': 4, 'error': "upstream error"}]
+    assert final['progress'] == 100.0
+
+
+def test_pause_resume_and_cancel():
+    async def scenario():
+        translator = FakeTranslator(delay=0.02)
+        manager = BatchJobManager(translator, concurrency=1)
+        job = manager.start_job("doc", 1, 50, "auto", "pt")
+
+        await asyncio.sleep(0.05)
+        await manager.pause_job(job.job_id)
+        await asyncio.sleep(0.05)
+        paused_at = len(translator.pages)
+        await asyncio.sleep(0.1)
+        assert len(translator.pages) == paused_at
+        assert job.status == "paused"
+
+        await manager.resume_job(job.job_id)
+        await asyncio.sleep(0.05)
+        assert len(translator.pages) > paused_at
+
+        await manager.cancel_job(job.job_id)
+        with pytest.raises(BatchJobError):
+            await manager.resume_job(job.job_id)
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.status == "cancelled"
+    assert job.pages_done < 50
+
+
+def test_unknown_job_and_invalid_range():
+    async def scenario():
+        manager = BatchJobManager(FakeTranslator())
+        with pytest.raises(JobNotFoundError):
+            manager.get_job("missing")
+        with pytest.raises(BatchJobError):
+            manager.start_job("doc", 5, 2, "auto", "pt")
+
+    asyncio.run(scenario())
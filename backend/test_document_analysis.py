@@ -0,0 +1,94 @@
+"""
+Tests for repeated-block detection and the document index
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from document_analysis import (
+    block_signature,
+    classify_segment,
+    find_repeated_blocks,
+    is_number_only,
+    position_band,
+    reuse_translation,
+    ROLE_NUMBER,
+    ROLE_REPEATED,
+    ROLE_TEXT
+)
+from document_index import DocumentIndex
+
+
+def _page(number):
+    return [
+        {'text': "ACME Annual Report 2023", 'band': "header"},
+        {'text': f"Body text unique to page {number} about topic {number * 7}.", 'band': "body"},
+        {'text': f"Page {number} of 40", 'band': "footer"},
+        {'text': str(number), 'band': "footer"}
+    ]
+
+
+def test_number_only_units_and_bands():
+    assert is_number_only("12")
+    assert is_number_only("- 12 -")
+    assert is_number_only("3/40")
+    assert is_number_only("xiv", "footer")
+    assert is_number_only("XIV.", "header")
+    assert not is_number_only("Page 12")
+    assert not is_number_only("Chapter")
+    assert not is_number_only("civil", "footer")
+    # Words that read as roman numerals are text in the body, and mixed case is never a numeral
+    for word in ("mix", "div", "Mix", "CD", "DC", "MD", "CV", "I", "xiv"):
+        assert not is_number_only(word), word
+    assert not is_number_only("Mix", "footer")
+    assert not is_number_only("Div", "header")
+
+    assert position_band([50, 20, 500, 35], 800) == "header"
+    assert position_band([50, 760, 500, 780], 800) == "footer"
+    assert position_band([50, 300, 500, 320], 800) == "body"
+
+
+def test_repeated_blocks_are_found_by_position_and_masked_content():
+    repeated = find_repeated_blocks([_page(number) for number in range(1, 6)], min_pages=3)
+
+    assert {block['sample_text'] for block in repeated.values()} == {"ACME Annual Report 2023", "Page 1 of 40"}
+    assert all(block['pages'] == 5 for block in repeated.values())
+
+    signatures = set(repeated)
+    page = _page(9)
+    assert [classify_segment(segment, signatures) for segment in page] == \
+        [ROLE_REPEATED, ROLE_TEXT, ROLE_REPEATED, ROLE_NUMBER]
+    assert classify_segment({'text': "iv", 'band': "footer"}, signatures) == ROLE_NUMBER
+    assert classify_segment({'text': "Mix", 'band': "body"}, signatures) == ROLE_TEXT
+    assert classify_segment({'text': "CD", 'band': "body"}, signatures) == ROLE_TEXT
+    # The same text in another band is a different block
+    assert block_signature("Page 9 of 40", "body") not in signatures
+
+
+def test_reuse_translation_substitutes_numbers():
+    assert reuse_translation("Page 1 of 40", "Página 1 de 40", "Page 9 of 40") == "Página 9 de 40"
+    assert reuse_translation("Report", "Relatório", "Report ") == "Relatório"
+    # Numbers reordered or spelled out by the translation cannot be mapped back
+    assert reuse_translation("Page 1 of 40", "Página um de 40", "Page 9 of 40") is None
+
+
+def test_document_index_stores_analysis_and_block_translations(tmp_path):
+    index = DocumentIndex(str(tmp_path / "index.db"))
+    repeated = find_repeated_blocks([_page(number) for number in range(1, 4)], min_pages=3)
+
+    assert index.get_repeated_signatures("hash") is None
+    index.save_analysis("hash", 3, repeated)
+    assert index.get_repeated_signatures("hash") == set(repeated)
+
+    signature = next(iter(repeated))
+    index.put_block_translation("hash", signature, "en", "pt", "ACME Annual Report 2023", "Relatório")
+    assert index.get_block_translation("hash", signature, "en", "pt") == ("ACME Annual Report 2023", "Relatório")
+    assert index.get_block_translation("hash", signature, "en", "es") is None
+    index.close()
+
+    reopened = DocumentIndex(str(tmp_path / "index.db"))
+    analysis = reopened.get_analysis("hash")
+    assert analysis['page_count'] == 3
+    assert len(analysis['repeated_blocks']) == 2
+    reopened.close()
@@ -0,0 +1,105 @@
+"""
+Tests for the page text search of the document index
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from document_index import DocumentIndex, ORIGINAL_TEXT, parse_snippet
+
+HASH = "ab" * 32
+OTHER_HASH = "cd" * 32
+
+
+def test_pages_are_found_in_original_and_translated_text(tmp_path):
+    index = DocumentIndex(str(tmp_path / "index.db"))
+    index.put_page_texts(HASH, [
+        (1, ORIGINAL_TEXT, "A tradução automática de documentos é útil."),
+        (1, "en", "Automatic translation of documents is useful."),
+        (2, ORIGINAL_TEXT, "Capítulo sobre tabelas e figuras."),
+        (2, "en", "Chapter about tables and figures.")
+    ])
+    index.put_page_texts(OTHER_HASH, [(1, ORIGINAL_TEXT, "Documentos de outro arquivo")])
+
+    # Accents and case are ignored, the last word is a prefix, other documents are not searched
+    results = index.search_pages(HASH, "TRADUCAO docu")
+    assert [(result['page_number'], result['original']) for result in results] == [(1, True)]
+    snippet = results[0]['snippet']
+    assert [snippet[start:end] for start, end in results[0]['highlights']] == ["tradução", "documentos"]
+
+    assert [result['page_number'] for result in index.search_pages(HASH, "tables")] == [2]
+    assert index.search_pages(HASH, "tables", language=ORIGINAL_TEXT) == []
+    assert index.search_pages(HASH, "tabelas", language="en") == []
+    assert index.count_indexed_pages(HASH) == 2
+
+    # A newer translation replaces the indexed one
+    index.put_page_texts(HASH, [(2, "en", "Chapter about charts.")])
+    assert index.search_pages(HASH, "tables") == []
+    assert index.search_pages(HASH, "charts")[0]['language'] == "en"
+
+    with pytest.raises(ValueError):
+        index.search_pages(HASH, "?!")
+    index.close()
+
+
+def test_best_matches_come_first(tmp_path):
+    index = DocumentIndex(str(tmp_path / "index.db"))
+    filler = " ".join(["lorem ipsum dolor"] * 50)
+    index.put_page_texts(HASH, [(page, ORIGINAL_TEXT, f"{filler} page {page}") for page in range(1, 1001)] +
+                         [(500, "en", "glossary glossary glossary of terms"), (700, "en", f"{filler} glossary")])
+
+    results = index.search_pages(HASH, "glossary", limit=5)
+    assert [result['page_number'] for result in results] == [500, 700]
+    assert results[0]['score'] > results[1]['score']
+    assert len(index.search_pages(HASH, "lorem", limit=5)) == 5
+    index.close()
+
+
+def test_snippet_markers_become_offsets():
+    assert parse_snippet("a \ue000bc\ue001 d \ue000e\ue001") == ("a bc d e", [(2, 4), (7, 8)])
+
+
+def test_page_extracts_are_stored_compactly_with_flags(tmp_path):
+    index = DocumentIndex(str(tmp_path / "index.db"))
+    segments = [
+        {'text': "Capítulo 1", 'bbox': [72.0241, 90.5, 300.3333, 110.0], 'band': "header"},
+        {'text': "Texto do corpo " * 40, 'bbox': [72.0, 120.0, 520.0, 700.0], 'band': "body"}
+    ]
+    assert index.get_page_extract(HASH, 1) is None
+
+    index.put_page_extract(HASH, 1, segments)
+    # The extraction pass stores several pages per transaction
+    index.put_page_extracts(HASH, [(2, [], True), (3, [], False)])
+    index.put_page_extracts(HASH, [])
+    index.put_page_extract(OTHER_HASH, 1, segments[:1])
+
+    extract = index.get_page_extract(HASH, 1)
+    assert [segment['text'] for segment in extract['segments']] == [segment['text'] for segment in segments]
+    assert extract['segments'][0]['bbox'] == [72.02, 90.5, 300.33, 110.0]
+    assert extract['segments'][1]['band'] == "body"
+    assert extract['char_count'] == sum(len(segment['text']) for segment in segments)
+    assert not extract['empty'] and not extract['image_only']
+    assert index.get_page_extract(HASH, 2) == {'segments': [], 'char_count': 0, 'empty': True, 'image_only': True}
+    assert index.get_page_extract(HASH, 3)['image_only'] is False
+
+    # Repetitive page text compresses well below its size
+    with index._lock:
+        (size,) = index._conn.execute(
+            'SELECT length(segments) FROM page_extracts WHERE content_hash = ? AND page_number = 1', (HASH,)
+        ).fetchone()
+    assert size < extract['char_count'] / 2
+
+    assert index.get_extracted_pages(HASH) == {1, 2, 3}
+    assert list(index.get_page_segments(OTHER_HASH)) == [1]
+    assert index.get_extract_summary(HASH) == {
+        'pages': 3, 'characters': extract['char_count'], 'empty_pages': 2, 'image_only_pages': 1
+    }
+    assert index.get_extract_summary("ef" * 32)['pages'] == 0
+
+    # Extracting a page again replaces its extract
+    index.put_page_extract(HASH, 3, segments[:1])
+    assert index.get_extract_summary(HASH)['empty_pages'] == 1
+    index.close()
@@ -0,0 +1,246 @@
+"""
+Tests for the bounded document session manager
+"""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from document_sessions import DocumentNotFoundError, DocumentSessionManager
+
+
+class FakeDocument:
+    def __init__(self, path):
+        self.path = path
+        self.closed = False
+
+    def __len__(self):
+        return 3
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for index in range(3):
+        path = tmp_path / f"doc{index}.pdf"
+        path.write_bytes(b"%PDF-1.4 " + bytes([index]))
+        paths.append(str(path))
+    return paths
+
+
+def make_manager(**kwargs):
+    opened = []
+
+    def opener(path):
+        document = FakeDocument(path)
+        opened.append(document)
+        return document
+
+    manager = DocumentSessionManager(opener, lambda path: f"hash-{os.path.basename(path)}", **kwargs)
+    return manager, opened
+
+
+def test_lru_eviction_and_transparent_reopen(files):
+    manager, opened = make_manager(max_open=2)
+    first = manager.open(files[0]).doc_id
+    manager.open(files[1])
+    manager.open(files[2])
+
+    # The least recently used handle was closed, but the session survives
+    assert opened[0].closed
+    assert manager.get_session(first).content_hash == "hash-doc0.pdf"
+    with manager.acquire(first) as document:
+        assert document.path == files[0]
+        assert not document.closed
+    assert manager.get_statistics()['open_handles'] == 2
+    assert manager.get_statistics()['reopened'] == 1
+
+
+def test_same_file_reuses_the_session(files):
+    manager, opened = make_manager()
+    session = manager.open(files[0])
+    assert manager.open(os.path.join(os.path.dirname(files[0]), ".", "doc0.pdf")) is session
+    assert len(opened) == 1
+
+
+def test_handles_in_use_are_not_evicted(files):
+    manager, opened = make_manager(max_open=2, idle_timeout=0)
+    doc_id = manager.open(files[0]).doc_id
+    with manager.acquire(doc_id) as document:
+        manager.open(files[1])
+        # Only the idle handle of the second file is closed
+        assert manager.evict_idle() == 1
+        assert opened[1].closed
+        assert not document.closed
+        manager.close(doc_id)
+        assert not document.closed
+    # A handle closed while in use is closed on release
+    assert document.closed
+    with pytest.raises(DocumentNotFoundError):
+        manager.get_session(doc_id)
+
+
+def test_unknown_ids_are_restored_through_the_resolver(files):
+    manager, _ = make_manager(path_resolver=lambda doc_id: files[1] if doc_id == "history-id" else None)
+    session = manager.get_session("history-id")
+    assert session.doc_id == "history-id"
+    assert session.file_path == files[1]
+    with pytest.raises(DocumentNotFoundError):
+        manager.get_session("missing")
+
+
+def test_forgotten_clients_are_restored_from_their_id(files):
+    def make_restartable_manager():
+        return make_manager(client_timeout=0,
+                            path_resolver=lambda doc_id: files[1] if doc_id == "history-id" else None)[0]
+
+    manager = make_restartable_manager()
+    client_id = manager.add_client(manager.open(files[1], "history-id").doc_id)
+    assert client_id.startswith("history-id")
+
+    # After a restart the client ID still finds its document, and is a client again
+    manager = make_restartable_manager()
+    assert manager.get_session(client_id).file_path == files[1]
+    assert manager.get_statistics()['clients'] == 1
+
+    # An expired client comes back the same way
+    assert manager.expire_clients() == {client_id: "history-id"}
+    with manager.acquire(client_id) as document:
+        assert document.path == files[1]
+    assert manager.release_client(client_id) == "history-id"
+    with pytest.raises(DocumentNotFoundError):
+        make_restartable_manager().get_session("missing~client")
+
+
+def test_clients_share_a_session_until_the_last_is_released(files):
+    manager, opened = make_manager()
+    doc_id = manager.open(files[0]).doc_id
+    first = manager.add_client(doc_id)
+    second = manager.add_client(doc_id)
+    assert first != second
+    assert manager.get_session(first) is manager.get_session(second) is manager.get_session(doc_id)
+
+    # Releasing one client leaves the document open for the other
+    assert manager.release_client(first) is None
+    assert not opened[0].closed
+    with manager.acquire(second) as document:
+        assert document is opened[0]
+    assert manager.get_statistics()['clients'] == 1
+    # The shared ID cannot end a session its clients still use
+    assert manager.release_client(doc_id) is None
+    assert not opened[0].closed
+
+    assert manager.release_client(second) == doc_id
+    assert opened[0].closed
+    with pytest.raises(DocumentNotFoundError):
+        manager.get_session(doc_id)
+    # Releasing a client twice ends nothing
+    assert manager.release_client(second) is None
+
+
+def test_sessions_without_clients_are_closed_by_their_id(files):
+    manager, opened = make_manager()
+    doc_id = manager.open(files[0]).doc_id
+    assert manager.release_client(doc_id) == doc_id
+    assert opened[0].closed
+
+
+def test_idle_clients_expire(files):
+    manager, opened = make_manager(client_timeout=0)
+    doc_id = manager.open(files[0]).doc_id
+    client_id = manager.add_client(doc_id)
+    assert manager.get_statistics()['clients'] == 1
+
+    assert manager.expire_clients() == {client_id: doc_id}
+    assert opened[0].closed
+    assert manager.get_statistics()['clients'] == 0
+
+
+def test_sessions_with_clients_are_not_forgotten(files):
+    manager, _ = make_manager(max_open=1, max_sessions=1)
+    first = manager.add_client(manager.open(files[0]).doc_id)
+    manager.open(files[1])
+    manager.open(files[2])
+    # The first session lost its handle but not its client
+    assert manager.get_session(first).file_path == files[0]
+
+
+def test_files_are_opened_and_hashed_outside_the_lock(files):
+    release = threading.Event()
+    started = threading.Event()
+    opened = []
+
+    def slow_opener(path):
+        document = FakeDocument(path)
+        opened.append(document)
+        started.set()
+        release.wait(5)
+        return document
+
+    manager = DocumentSessionManager(slow_opener, lambda path: f"hash-{os.path.basename(path)}")
+    sessions = []
+    threads = [threading.Thread(target=lambda: sessions.append(manager.open(files[0]))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(5)
+    # The manager answers while a file is being opened
+    assert manager.get_statistics()['sessions'] == 0
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    # Concurrent opens of one file end up with one session; the extra handle is closed
+    assert sessions[0] is sessions[1]
+    assert manager.get_statistics()['sessions'] == 1
+    assert [document.closed for document in opened].count(True) == len(opened) - 1
+
+
+def test_concurrent_restores_of_one_id_resolve_and_open_the_file_once(files):
+    resolved = []
+    release = threading.Event()
+
+    def slow_resolver(doc_id):
+        resolved.append(doc_id)
+        release.wait(5)
+        return files[1] if doc_id == "history-id" else None
+
+    manager, opened = make_manager(path_resolver=slow_resolver)
+    manager.open(files[0])
+    sessions = []
+    threads = [threading.Thread(target=lambda: sessions.append(manager.get_session("history-id")))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    # Other documents are served while the restore waits for the history
+    assert manager.get_session(manager.open(files[0]).doc_id).file_path == files[0]
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(sessions) == 4 and all(session is sessions[0] for session in sessions)
+    assert resolved == ["history-id"]
+    assert [document.path for document in opened] == [files[0], files[1]]
+
+
+def test_evicted_handles_are_reopened_once(files):
+    manager, opened = make_manager(max_open=1)
+    doc_id = manager.open(files[0]).doc_id
+    manager.open(files[1])
+    assert opened[0].closed
+
+    def read():
+        with manager.acquire(doc_id) as document:
+            assert not document.closed
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert [document.path for document in opened].count(files[0]) == 2
@@ -0,0 +1,267 @@
+"""
+Tests for the API endpoints that serve page images, previews, tiles and thumbnails
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pdf_history_db as history_module
+from pdf_history_db import PdfHistoryDB
+
+# The app records uploads in a temporary history, not in the database of the working tree
+history_module._instance = PdfHistoryDB(os.path.join(tempfile.mkdtemp(), "pdf_history.db"))
+
+import main
+import page_pipeline
+from config import DEFAULT_IMAGE_QUALITY, MAX_TILE_ZOOM, PREVIEW_ZOOM
+from page_cache import image_cache, make_image_key
+from pdf_processor import document_sessions
+from pdf_store import pdf_store
+from thumbnails import thumbnail_store
+from render_engine import WEBP_SUPPORTED, render_engine
+
+
+def _build(zoom=2.0, image_format="auto", quality=DEFAULT_IMAGE_QUALITY, width=None, dpi=None,
+           grayscale=False, accept=""):
+    return main._build_render_options(zoom, image_format, quality, width, dpi, grayscale, accept)
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    # Render on the PDF executor rather than starting worker processes
+    monkeypatch.setattr(render_engine, "workers", 0)
+    monkeypatch.setattr(pdf_store, "root", str(tmp_path / "store"))
+    monkeypatch.setattr(thumbnail_store, "root", str(tmp_path / "thumbnails"))
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def book(tmp_path):
+    """A PDF with a text page and a 600x800 scanned page."""
+    document = fitz.open()
+    text_page = document.new_page(width=600, height=800)
+    text_page.insert_text((72, 100), f"Chapter one {tmp_path.name}")
+    scan_page = document.new_page(width=600, height=800)
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 60, 80), False)
+    pixmap.set_rect(pixmap.irect, (200, 180, 160))
+    scan_page.insert_image(scan_page.rect, pixmap=pixmap)
+    content = document.tobytes()
+    document.close()
+    return content
+
+
+@pytest.fixture
+def upload(client, book):
+    """Uploads the book and returns the upload response."""
+    response = client.post("/pdf/upload", files={"file": ("book.pdf", book, "application/pdf")})
+    assert response.status_code == 200
+    yield response.json()
+    client.delete(f"/pdf/{response.json()['doc_id']}")
+
+
+@pytest.fixture
+def doc_id(upload):
+    return upload["doc_id"]
+
+
+def test_render_options_are_validated():
+    for arguments in ({'zoom': 0.1}, {'zoom': 10.0}, {'image_format': "gif"}, {'quality': 0},
+                      {'quality': 101}, {'width': 0}, {'dpi': -1}):
+        with pytest.raises(HTTPException) as error:
+            _build(**arguments)
+        assert error.value.status_code == 400
+    assert _build(image_format="JPG").image_format == "jpeg"
+
+
+def test_render_options_only_keep_what_changes_the_image():
+    # WebP is only considered for automatic format selection
+    assert _build(accept="image/webp,*/*").allow_webp is WEBP_SUPPORTED
+    assert not _build(image_format="jpeg", accept="image/webp,*/*").allow_webp
+    assert not _build(accept="image/png").allow_webp
+    # Requests that render the same image build the same options
+    assert _build(image_format="png", quality=20) == _build(image_format="png", quality=90)
+    assert _build(width=800, dpi=100, zoom=3.0) == _build(width=800)
+    assert _build(image_format="jpeg", quality=20) != _build(image_format="jpeg", quality=90)
+
+
+def test_image_etag_ignores_options_that_do_not_change_the_image(client, doc_id):
+    url = f"/pdf/{doc_id}/page/1/image"
+    png = client.get(url, params={'format': "png", 'quality': 20})
+    assert png.status_code == 200
+    assert png.headers["content-type"] == "image/png"
+    assert png.headers["cache-control"].startswith("public")
+    assert "Accept" not in png.headers.get("vary", "")
+    assert client.get(url, params={'format': "png", 'quality': 90}).headers["etag"] == png.headers["etag"]
+    assert client.get(url, params={'format': "jpeg", 'quality': 20},
+                      headers={'accept': "image/webp"}).headers["etag"] == \
+        client.get(url, params={'format': "jpeg", 'quality': 20}).headers["etag"]
+
+    auto = client.get(url)
+    assert "Accept" in auto.headers["vary"]
+    assert auto.headers["etag"] != png.headers["etag"]
+
+
+def test_matching_etag_is_answered_with_304(client, doc_id):
+    url = f"/pdf/{doc_id}/page/2/image"
+    first = client.get(url, params={'zoom': 1.0})
+    assert first.status_code == 200
+    assert first.headers["content-type"] == "image/jpeg"
+    etag = first.headers["etag"]
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        revalidated = client.get(url, params={'zoom': 1.0}, headers={'if-none-match': if_none_match})
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+        assert revalidated.headers["etag"] == etag
+    assert client.get(url, params={'zoom': 1.0}, headers={'if-none-match': '"other"'}).status_code == 200
+    assert client.get(url, params={'zoom': 1.5}, headers={'if-none-match': etag}).status_code == 200
+
+
+def test_invalid_image_requests_are_rejected(client, doc_id):
+    assert client.get(f"/pdf/{doc_id}/page/3/image").status_code == 400
+    assert client.get(f"/pdf/{doc_id}/page/1/image", params={'format': "gif"}).status_code == 400
+    assert client.get("/pdf/missing/page/1/image").status_code == 400
+
+
+def _image_size(response):
+    pixmap = fitz.Pixmap(response.content)
+    return pixmap.width, pixmap.height
+
+
+def test_preview_is_small_and_warms_the_full_image(client, doc_id):
+    url = f"/pdf/{doc_id}/page/1/image"
+    full_options = _build(image_format="png")
+    full_key = make_image_key(main.get_document_hash(doc_id), 1, full_options)
+    assert image_cache.get(full_key) is None
+
+    preview = client.get(url, params={'format': "png", 'preview': "true"})
+    assert preview.status_code == 200
+    assert preview.headers["content-type"] == "image/jpeg"
+    assert _image_size(preview) == (round(600 * PREVIEW_ZOOM), round(800 * PREVIEW_ZOOM))
+
+    # The requested image was rendered into the cache after the preview was sent
+    assert image_cache.get(full_key) is not None
+    full = client.get(url, params={'format': "png"})
+    assert full.headers["content-type"] == "image/png"
+    assert _image_size(full) == (1200, 1600)
+    assert full.headers["etag"] != preview.headers["etag"]
+
+
+def test_tiles_are_clipped_to_the_page(client, doc_id):
+    url = f"/pdf/{doc_id}/page/1/tile"
+    # At zoom 2 the 1200x1600 pixel page is 5 columns and 7 rows of 256 pixels
+    tile = client.get(url, params={'x': 0, 'y': 0, 'zoom': 2.0, 'tile_size': 256, 'format': "png"})
+    assert tile.status_code == 200
+    assert tile.headers["content-type"] == "image/png"
+    assert _image_size(tile) == (256, 256)
+
+    # Tiles on the right and bottom edges stop at the page
+    assert _image_size(client.get(url, params={'x': 4, 'y': 6, 'zoom': 2.0, 'tile_size': 256,
+                                               'format': "png"})) == (1200 - 4 * 256, 1600 - 6 * 256)
+
+    other = client.get(url, params={'x': 1, 'y': 0, 'zoom': 2.0, 'tile_size': 256, 'format': "png"})
+    assert other.headers["etag"] != tile.headers["etag"]
+    assert client.get(url, params={'x': 0, 'y': 0, 'zoom': 2.0, 'tile_size': 256, 'format': "png"},
+                      headers={'if-none-match': tile.headers["etag"]}).status_code == 304
+
+
+def test_invalid_tiles_are_rejected(client, doc_id):
+    url = f"/pdf/{doc_id}/page/1/tile"
+    for params in ({'x': 5, 'y': 0}, {'x': 0, 'y': 7}, {'x': -1, 'y': 0}):
+        assert client.get(url, params={**params, 'zoom': 2.0, 'tile_size': 256}).status_code == 400
+    assert client.get(url, params={'x': 0, 'y': 0, 'zoom': MAX_TILE_ZOOM * 2}).status_code == 400
+    assert client.get(url, params={'x': 0, 'y': 0, 'tile_size': 32}).status_code == 400
+    assert client.get(url, params={'x': 0, 'y': 0, 'format': "gif"}).status_code == 400
+    assert client.get(f"/pdf/{doc_id}/page/3/tile", params={'x': 0, 'y': 0}).status_code == 400
+
+
+def test_thumbnails_are_rendered_on_demand_and_removed_with_the_history_entry(client, upload):
+    pdf_id = upload["pdf_id"]
+    url = f"/pdf/history/{pdf_id}/thumbnail"
+    thumbnail = client.get(url)
+    assert thumbnail.status_code == 200
+    assert thumbnail.headers["content-type"] == "image/jpeg"
+    assert _image_size(thumbnail)[0] == 160
+    assert client.get(url, headers={'if-none-match': thumbnail.headers["etag"]}).status_code == 304
+    assert client.get(url, params={'page': 3}).status_code == 400
+
+    content_hash = main.get_document_hash(upload["doc_id"])
+    assert thumbnail_store.contains(content_hash, 1)
+    assert client.delete(f"/pdf/history/{pdf_id}").status_code == 200
+    assert not thumbnail_store.contains(content_hash, 1)
+    assert client.get(url).status_code == 404
+
+
+def test_page_is_translated_again_for_another_target_language(client, doc_id, monkeypatch):
+    monkeypatch.setattr(page_pipeline, "translate_units",
+                        lambda texts, source_lang, target_lang: [f"{target_lang}:{text}" for text in texts])
+    url = f"/pdf/{doc_id}/page/1"
+    english = client.get(url, params={'source_lang': "de", 'target_lang': "en"})
+    assert english.status_code == 200
+    assert english.json()["translated_text"].startswith("en:")
+
+    # The second language reuses the units extracted for the first
+    french = client.get(url, params={'source_lang': "de", 'target_lang': "fr"})
+    assert french.status_code == 200
+    assert french.json()["translated_text"].startswith("fr:")
+    assert french.json()["original_text"] == english.json()["original_text"]
+
+
+
+def test_uploading_a_known_pdf_keeps_its_reading_progress(client, book, upload):
+    pdf_id = upload["pdf_id"]
+    assert upload["last_page"] == 1
+    assert client.put("/pdf/history/progress", json={'pdf_id': pdf_id, 'current_page': 2,
+                                                     'total_pages': 2}).status_code == 200
+
+    # The same file again: the same history entry, opened where the reader stopped
+    again = client.post("/pdf/upload", files={"file": ("copy.pdf", book, "application/pdf")})
+    assert again.status_code == 200
+    assert again.json()["pdf_id"] == pdf_id
+    assert again.json()["last_page"] == 2
+    # Re-adding it to the history without progress keeps the progress too
+    assert client.post("/pdf/history", json={'pdf_id': pdf_id, 'filename': "copy.pdf"}).status_code == 200
+    entry = client.get(f"/pdf/history/{pdf_id}").json()["data"]
+    assert (entry["last_page"], entry["total_pages"], entry["progress"]) == (2, 2, 100.0)
+    client.delete(f"/pdf/{again.json()['doc_id']}")
+
+
+def test_client_ids_survive_a_restart(client, upload, monkeypatch):
+    # The server forgets its clients and sessions, as after a restart
+    monkeypatch.setattr(document_sessions, "_clients", {})
+    monkeypatch.setattr(document_sessions, "_client_counts", {})
+    document_sessions.close(upload["pdf_id"])
+
+    response = client.get(f"/pdf/{upload['doc_id']}/page/2/image", params={'zoom': 1.0})
+    assert response.status_code == 200
+    assert main.get_document_hash(upload["doc_id"]) == main.get_document_hash(upload["pdf_id"])
+
+
+def test_uploads_do_not_read_the_document_index_on_the_event_loop(client, book, monkeypatch):
+    is_analyzed = page_pipeline.document_index.is_analyzed
+    on_loop = []
+
+    def checked_is_analyzed(content_hash):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(content_hash)
+        except RuntimeError:
+            pass
+        return is_analyzed(content_hash)
+
+    monkeypatch.setattr(page_pipeline.document_index, "is_analyzed", checked_is_analyzed)
+    response = client.post("/pdf/upload", files={"file": ("book.pdf", book, "application/pdf")})
+    assert response.status_code == 200
+    assert on_loop == []
+    client.delete(f"/pdf/{response.json()['doc_id']}")
@@ -0,0 +1,50 @@
+"""
+Tests for the page result and image caches
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from page_cache import PageCache, make_image_key, make_page_key
+
+
+def _entry(original: str = "original", translated: str = "traduzido"):
+    return {'original_text': original, 'translated_text': translated}
+
+
+def test_language_pair_is_part_of_the_key():
+    cache = PageCache(max_entries=10, max_bytes=10_000)
+    cache.put(make_page_key("abc", 1, "auto", "pt"), _entry("Hello", "Olá"))
+
+    assert cache.get(make_page_key("abc", 1, "auto", "pt"))['translated_text'] == "Olá"
+    assert cache.get(make_page_key("abc", 1, "auto", "es")) is None
+    assert cache.get(make_page_key("abc", 2, "auto", "pt")) is None
+
+    # The extracted text can still be reused for the other language pair
+    assert cache.get_original_text("abc", 1) == "Hello"
+    assert cache.get_original_text("abc", 2) is None
+
+
+def test_eviction_by_entry_count_and_bytes():
+    cache = PageCache(max_entries=2, max_bytes=10_000)
+    for page in range(1, 4):
+        cache.put(make_page_key("abc", page, "auto", "pt"), _entry())
+    assert cache.get(make_page_key("abc", 1, "auto", "pt")) is None
+    assert cache.get_statistics()['evictions'] == 1
+
+    images = PageCache(max_entries=10, max_bytes=100)
+    images.put(make_image_key("abc", 1, ("png", 2.0)), {'image': b"x" * 60})
+    images.put(make_image_key("abc", 2, ("png", 2.0)), {'image': b"y" * 60})
+    stats = images.get_statistics()
+    assert stats['entries'] == 1
+    assert stats['bytes'] <= 100
+    assert images.get(make_image_key("abc", 1, ("png", 2.0))) is None
+    assert images.get(make_image_key("abc", 2, ("png", 2.0))) == {'image': b"y" * 60}
+
+
+def test_invalidate_document():
+    cache = PageCache(max_entries=10, max_bytes=10_000)
+    cache.put(make_page_key("abc", 1, "auto", "pt"), _entry())
+    cache.put(make_page_key("def", 1, "auto", "pt"), _entry())
+    assert cache.invalidate("abc") == 1
+    assert cache.get_statistics()['entries'] == 1
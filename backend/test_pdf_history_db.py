@@ -0,0 +1,263 @@
+"""
+Tests for the PDF history database
+"""
+import gc
+import os
+import sqlite3
+import sys
+import threading
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pdf_history_db
+from pdf_history_db import PdfHistoryDB
+
+
+def test_existing_databases_gain_the_content_hash_column(tmp_path):
+    db_path = str(tmp_path / "history.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('''
+            CREATE TABLE pdf_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pdf_id TEXT UNIQUE NOT NULL,
+                filename TEXT NOT NULL,
+                file_path TEXT,
+                last_page INTEGER DEFAULT 1,
+                total_pages INTEGER DEFAULT 0,
+                progress REAL DEFAULT 0.0,
+                language TEXT DEFAULT 'Português',
+                language_flag TEXT DEFAULT '🇧🇷',
+                upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_read_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                thumbnail_path TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute("INSERT INTO pdf_history (pdf_id, filename) VALUES ('old', 'old.pdf')")
+
+    db = PdfHistoryDB(db_path)
+    assert db.get_pdf_by_id("old")['content_hash'] is None
+    # Rows written before the filename index existed are indexed too
+    assert [pdf['pdf_id'] for pdf in db.get_history_page(search="old")['items']] == ["old"]
+
+    db.add_or_update_pdf({'pdf_id': "doc", 'filename': "handbook.pdf", 'file_path': "/store/ab.pdf",
+                          'content_hash': "ab" * 32, 'total_pages': 10})
+    db.update_progress("doc", 4, 10)
+    known = db.get_pdf_by_hash("ab" * 32)
+    assert known['pdf_id'] == "doc"
+    assert known['last_page'] == 4
+
+    # Updates without a hash or path keep the stored ones
+    db.add_or_update_pdf({'pdf_id': "doc", 'filename': "renamed.pdf", 'last_page': 4, 'total_pages': 10})
+    assert db.get_pdf_by_id("doc")['content_hash'] == "ab" * 32
+    assert db.get_pdf_by_id("doc")['file_path'] == "/store/ab.pdf"
+    assert db.get_pdf_by_hash("cd" * 32) is None
+
+
+def test_threads_reuse_their_connection_in_wal_mode(tmp_path):
+    db = PdfHistoryDB(str(tmp_path / "history.db"))
+    assert db._connection() is db._connection()
+    assert db._connection().execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    for number in range(4):
+        db.add_or_update_pdf({'pdf_id': f"doc-{number}", 'filename': f"{number}.pdf", 'total_pages': 100})
+
+    results = []
+
+    def reader_and_writer(number):
+        for page in range(1, 51):
+            results.append(db.update_progress(f"doc-{number}", page, 100))
+            results.append(db.get_pdf_by_id(f"doc-{number}") is not None)
+
+    threads = [threading.Thread(target=reader_and_writer, args=(number,)) for number in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 400 and all(results)
+    assert [pdf['progress'] for pdf in db.get_history(limit=4)] == [50.0] * 4
+    # The worker threads closed their connections when they ended; this thread keeps its own
+    gc.collect()
+    assert len(db._connections) == 1
+    db.close()
+    assert db.get_pdf_by_id("doc-0")['last_page'] == 50
+
+
+def test_connection_of_an_ended_thread_is_closed(tmp_path):
+    db = PdfHistoryDB(str(tmp_path / "history.db"))
+    connections = []
+    thread = threading.Thread(target=lambda: connections.append(db._connection()))
+    thread.start()
+    thread.join()
+    del thread
+    gc.collect()
+
+    assert len(db._connections) == 1
+    with pytest.raises(sqlite3.ProgrammingError):
+        connections[0].execute('SELECT 1')
+    db.close()
+
+
+def test_global_instance_is_created_on_first_use(monkeypatch, tmp_path):
+    monkeypatch.setattr(pdf_history_db, '_instance', None)
+    monkeypatch.chdir(tmp_path)
+    db_path = tmp_path / os.path.basename(PdfHistoryDB.__init__.__defaults__[0])
+    assert not db_path.exists()
+
+    db = pdf_history_db.pdf_history_db
+    assert db is pdf_history_db.get_pdf_history_db()
+    assert db_path.exists()
+    db.close()
+
+
+def test_progress_is_buffered_and_visible_before_it_is_written(tmp_path):
+    db = PdfHistoryDB(str(tmp_path / "history.db"))
+    db.add_or_update_pdf({'pdf_id': "doc", 'filename': "book.pdf", 'total_pages': 200})
+    assert not db.update_progress("missing", 1, 10)
+
+    for page in range(1, 31):
+        assert db.update_progress("doc", page, 200)
+
+    # Nothing was written yet, but reads see the latest page
+    with db._connection() as conn:
+        assert conn.execute("SELECT last_page FROM pdf_history WHERE pdf_id = 'doc'").fetchone()[0] == 1
+    assert db.get_pdf_by_id("doc")['last_page'] == 30
+    assert db.get_pdf_by_id("doc")['progress'] == 15.0
+
+    # Listings flush first, in a single write
+    assert db.get_history()[0]['last_page'] == 30
+    assert db.progress_buffer.get_statistics()['flushes'] == 1
+
+    db.update_progress("doc", 31, 200)
+    db.close()
+    assert PdfHistoryDB(str(tmp_path / "history.db")).get_pdf_by_id("doc")['last_page'] == 31
+
+
+def test_history_pages_by_cursor_with_search_and_filters(tmp_path):
+    db = PdfHistoryDB(str(tmp_path / "history.db"))
+    for number in range(25):
+        language = "English" if number % 2 else "Português"
+        db.add_or_update_pdf({'pdf_id': f"doc-{number:02d}", 'filename': f"Relatório_{number:02d}.pdf",
+                              'total_pages': 10, 'last_page': 10 if number < 5 else 1,
+                              'progress': 100.0 if number < 5 else 10.0, 'language': language})
+    db.add_or_update_pdf({'pdf_id': "python", 'filename': "Python Cookbook.pdf", 'total_pages': 10})
+
+    seen = []
+    cursor = None
+    while True:
+        page = db.get_history_page(limit=10, cursor=cursor)
+        seen.extend(pdf['pdf_id'] for pdf in page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == [pdf['pdf_id'] for pdf in db.get_history(limit=100)]
+    assert len(seen) == len(set(seen)) == 26
+    assert seen[0] == "python" and seen[-1] == "doc-00"
+
+    # Word prefixes match, case and accents aside
+    assert [pdf['pdf_id'] for pdf in db.get_history_page(search="cook PYTH")['items']] == ["python"]
+    assert len(db.get_history_page(limit=100, search="relatorio")['items']) == 25
+    assert db.get_history_page(search="report")['items'] == []
+    assert db.get_history_page(search="%")['items'] == []
+
+    english = db.get_history_page(limit=100, language="English")['items']
+    assert len(english) == 12 and {pdf['language'] for pdf in english} == {"English"}
+    completed = db.get_history_page(limit=3, completed=True)
+    assert [pdf['pdf_id'] for pdf in completed['items']] == ["doc-04", "doc-03", "doc-02"]
+    rest = db.get_history_page(limit=3, completed=True, cursor=completed['next_cursor'])
+    assert [pdf['pdf_id'] for pdf in rest['items']] == ["doc-01", "doc-00"]
+    assert rest['next_cursor'] is None
+    assert len(db.get_history_page(limit=100, completed=False)['items']) == 21
+
+    # Renamed and removed entries leave the filename index
+    db.add_or_update_pdf({'pdf_id': "python", 'filename': "Rust Book.pdf", 'total_pages': 10})
+    assert db.get_history_page(search="python")['items'] == []
+    db.remove_pdf("doc-00")
+    assert len(db.get_history_page(limit=100, search="relatorio")['items']) == 24
+
+    with pytest.raises(ValueError):
+        db.get_history_page(cursor="not-a-cursor")
+
+
+def test_statistics_are_maintained_by_every_write(tmp_path):
+    db = PdfHistoryDB(str(tmp_path / "history.db"))
+    languages = ["English", "Português", "Español"]
+    for number in range(30):
+        db.add_or_update_pdf({'pdf_id': f"doc-{number}", 'filename': f"{number}.pdf", 'total_pages': 10,
+                              'last_page': number % 10 + 1, 'progress': (number % 10 + 1) * 10.0,
+                              'language': languages[number % 3],
+                              'upload_date': f"2024-01-{number % 5 + 1:02d}T10:00:00"})
+    for number in range(0, 30, 4):
+        db.update_progress(f"doc-{number}", 10, 10)
+    db.remove_pdf("doc-7")
+    db.add_or_update_pdf({'pdf_id': "doc-8", 'filename': "8.pdf", 'total_pages': 10, 'last_page': 2,
+                          'progress': 20.0, 'language': "English"})
+
+    def scan():
+        with db._connection() as conn:
+            return conn.execute('''
+                SELECT COUNT(*), SUM(progress >= 100), AVG(progress), SUM(last_page) FROM pdf_history
+            ''').fetchone()
+
+    stats = db.get_statistics()
+    total, completed, average, pages = scan()
+    assert stats['total_documents'] == total == 29
+    assert stats['completed_documents'] == completed
+    assert stats['average_progress'] == round(average, 1)
+    assert stats['total_pages_read'] == pages
+
+    with db._connection() as conn:
+        by_language = dict(conn.execute('SELECT language, COUNT(*) FROM pdf_history GROUP BY language').fetchall())
+        uploads = dict(conn.execute('SELECT date(upload_date), COUNT(*) FROM pdf_history GROUP BY 1').fetchall())
+    assert {row['language']: row['total_documents'] for row in stats['by_language']} == by_language
+    assert {row['date']: row['uploaded'] for row in stats['by_day'] if row['uploaded']} == uploads
+    assert sum(row['last_read'] for row in stats['by_day']) == 29
+    assert len(db.get_statistics(days=2)['by_day']) == 2
+
+    db.clear_history()
+    assert db.get_statistics()['total_documents'] == 0
+    assert db.get_statistics()['by_language'] == []
+    assert db.get_statistics()['by_day'] == []
+
+
+def test_thumbnail_path_is_recorded_without_touching_the_read_date(tmp_path):
+    db = PdfHistoryDB(str(tmp_path / "history.db"))
+    db.add_or_update_pdf({'pdf_id': "doc-1", 'filename': "handbook.pdf", 'total_pages': 10})
+    before = db.get_pdf_by_id("doc-1")
+    assert before['thumbnail_path'] is None
+
+    assert db.set_thumbnail("doc-1", "/thumbnails/ab/cover-p1.jpg")
+    assert not db.set_thumbnail("missing", "/thumbnails/ab/other-p1.jpg")
+    after = db.get_pdf_by_id("doc-1")
+    assert after['thumbnail_path'] == "/thumbnails/ab/cover-p1.jpg"
+    assert after['last_read_date'] == before['last_read_date']
+    assert db.get_history_page()['items'][0]['thumbnail_path'] == "/thumbnails/ab/cover-p1.jpg"
+
+    # Re-uploading the same file keeps the thumbnail
+    db.add_or_update_pdf({'pdf_id': "doc-1", 'filename': "handbook.pdf", 'total_pages': 10})
+    assert db.get_pdf_by_id("doc-1")['thumbnail_path'] == "/thumbnails/ab/cover-p1.jpg"
+    db.close()
+
+
+def test_recording_a_known_pdf_again_keeps_its_progress(tmp_path):
+    db = PdfHistoryDB(str(tmp_path / "history.db"))
+    db.add_or_update_pdf({'pdf_id': "doc", 'filename': "handbook.pdf", 'total_pages': 10})
+    db.update_progress("doc", 6, 10)
+    db.flush_progress()
+
+    db.add_or_update_pdf({'pdf_id': "doc", 'filename': "handbook.pdf", 'total_pages': 10})
+    pdf = db.get_pdf_by_id("doc")
+    assert (pdf['last_page'], pdf['total_pages'], pdf['progress']) == (6, 10, 60.0)
+
+    # Progress still in the buffer is not dropped either
+    db.update_progress("doc", 8, 10)
+    db.add_or_update_pdf({'pdf_id': "doc", 'filename': "renamed.pdf"})
+    assert db.get_pdf_by_id("doc")['last_page'] == 8
+
+    # Values given explicitly are written
+    db.add_or_update_pdf({'pdf_id': "doc", 'filename': "renamed.pdf", 'last_page': 1, 'progress': 0.0})
+    assert db.get_pdf_by_id("doc")['last_page'] == 1
+    db.close()
@@ -0,0 +1,65 @@
+"""
+Tests for the content-addressed PDF store
+"""
+import hashlib
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pdf_store import PdfStore
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = PdfStore(str(tmp_path / "store"), max_bytes=1024 * 1024)
+    content = b"%PDF-1.4 handbook"
+
+    content_hash, path, already_stored = store.put_bytes(content)
+    assert content_hash == hashlib.sha256(content).hexdigest()
+    assert not already_stored
+    assert path == store.path_for(content_hash)
+    assert store.hash_from_path(path) == content_hash
+    assert store.hash_from_path(str(tmp_path / f"{content_hash}.pdf")) is None
+
+    assert store.put_bytes(content) == (content_hash, path, True)
+    stats = store.get_statistics()
+    assert stats['files'] == 1
+    assert stats['stored'] == 1
+    assert stats['deduplicated'] == 1
+
+
+def test_least_recently_used_files_are_evicted(tmp_path):
+    protected = set()
+    store = PdfStore(str(tmp_path / "store"), max_bytes=250, is_protected=lambda path: path in protected)
+    paths = []
+    for index in range(3):
+        _, path, _ = store.put_bytes(bytes([index]) * 100)
+        # Distinct modification times for a deterministic eviction order
+        os.utime(path, (time.time() - 100 + index, time.time() - 100 + index))
+        paths.append(path)
+
+    # The third upload pushed the store over budget and evicted the oldest file
+    assert not os.path.exists(paths[0])
+    assert os.path.exists(paths[1]) and os.path.exists(paths[2])
+
+    protected.add(paths[1])
+    _, newest, _ = store.put_bytes(b"\xff" * 100)
+    # The open (protected) file survives; the next oldest is evicted instead
+    assert os.path.exists(paths[1])
+    assert not os.path.exists(paths[2])
+    assert os.path.exists(newest)
+
+
+def test_put_file_moves_or_discards(tmp_path):
+    store = PdfStore(str(tmp_path / "store"))
+    source = tmp_path / "upload.part"
+    source.write_bytes(b"%PDF-1.7 data")
+    content_hash = hashlib.sha256(b"%PDF-1.7 data").hexdigest()
+
+    path, already_stored = store.put_file(str(source), content_hash)
+    assert not already_stored and not source.exists()
+
+    source.write_bytes(b"%PDF-1.7 data")
+    assert store.put_file(str(source), content_hash) == (path, True)
+    assert not source.exists()
@@ -0,0 +1,58 @@
+"""
+Tests for the reading-progress write buffer
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from progress_buffer import ProgressBuffer
+
+
+def test_updates_are_merged_per_document():
+    batches = []
+    buffer = ProgressBuffer(batches.append, max_pending=100)
+    for page in range(1, 11):
+        buffer.record("doc", page, 20)
+    buffer.record("other", 3, 30)
+
+    assert buffer.pending("doc")['last_page'] == 10
+    assert buffer.pending("doc")['progress'] == 50.0
+    assert buffer.flush() == 2
+    assert len(batches) == 1
+    assert sorted((update['pdf_id'], update['last_page']) for update in batches[0]) == [("doc", 10), ("other", 3)]
+    assert buffer.pending("doc") is None
+    assert buffer.flush() == 0
+
+    stats = buffer.get_statistics()
+    assert stats['recorded'] == 11
+    assert stats['written'] == 2
+    assert stats['coalesced'] == 9
+
+
+def test_buffer_flushes_when_full():
+    batches = []
+    buffer = ProgressBuffer(batches.append, max_pending=3)
+    buffer.record("a", 1, 10)
+    buffer.record("b", 1, 10)
+    assert batches == []
+    buffer.record("c", 1, 10)
+    assert len(batches) == 1 and len(batches[0]) == 3
+
+
+def test_failed_flush_keeps_updates_unless_newer_ones_arrived():
+    def failing_writer(updates):
+        # A newer update arrives while the batch is being written
+        buffer.record("doc", 7, 10)
+        raise RuntimeError("disk full")
+
+    buffer = ProgressBuffer(failing_writer, max_pending=100)
+    buffer.record("doc", 5, 10)
+    buffer.record("other", 2, 10)
+    with pytest.raises(RuntimeError):
+        buffer.flush()
+
+    assert buffer.pending("doc")['last_page'] == 7
+    assert buffer.pending("other")['last_page'] == 2
@@ -0,0 +1,92 @@
+"""
+Tests for the server-side read-ahead scheduler
+"""
+import asyncio
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from read_ahead import ReadAheadScheduler
+
+
+class RecordingLoader:
+    """Fake page loader that records the pages it was asked to warm."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.loaded = []
+
+    async def __call__(self, doc_id, page_number, source_lang, target_lang):
+        await asyncio.sleep(self.delay)
+        self.loaded.append(page_number)
+
+
+def test_prefetches_next_page_and_counts_hits():
+    async def scenario():
+        loader = RecordingLoader()
+        scheduler = ReadAheadScheduler(loader, max_window=4, concurrency=2, horizon=20)
+
+        assert not scheduler.record_foreground("doc", 1, "auto", "pt")
+        scheduler.on_page_served("doc", 1, 10, "auto", "pt")
+        await asyncio.sleep(0.05)
+        assert loader.loaded == [2]
+
+        assert scheduler.record_foreground("doc", 2, "auto", "pt")
+        return scheduler.get_statistics()
+
+    stats = asyncio.run(scenario())
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['hit_rate'] == 0.5
+
+
+def test_window_grows_with_pace_and_jumps_cancel():
+    async def scenario():
+        loader = RecordingLoader(delay=0.2)
+        scheduler = ReadAheadScheduler(loader, max_window=4, concurrency=4, horizon=20)
+
+        # Fast page flipping widens the window up to the maximum
+        for page in range(1, 4):
+            scheduler.on_page_served("doc", page, 100, "auto", "pt")
+            await asyncio.sleep(0.01)
+        assert scheduler.get_statistics()['pending'] == 4
+
+        # Jumping far ahead cancels the old window
+        scheduler.on_page_served("doc", 50, 100, "auto", "pt")
+        await asyncio.sleep(0.3)
+        return scheduler.get_statistics(), loader.loaded
+
+    stats, loaded = asyncio.run(scenario())
+    assert stats['cancelled'] >= 4
+    assert loaded == [51]
+
+
+def test_cancel_document():
+    async def scenario():
+        scheduler = ReadAheadScheduler(RecordingLoader(delay=1.0), max_window=2)
+        scheduler.on_page_served("doc", 1, 10, "auto", "pt")
+        scheduler.cancel_document("doc")
+        await asyncio.sleep(0)
+        return scheduler.get_statistics()
+
+    stats = asyncio.run(scenario())
+    assert stats['pending'] == 0
+    assert stats['active_readers'] == 0
+
+
+def test_idle_readers_and_unread_prefetches_expire():
+    async def scenario():
+        scheduler = ReadAheadScheduler(RecordingLoader(), max_window=2, idle_timeout=0.05)
+        scheduler.on_page_served("doc", 1, 10, "auto", "pt")
+        await asyncio.sleep(0.01)
+        # Still reading, and page 2 was prefetched
+        assert scheduler.expire_idle() == 0
+        assert scheduler.get_statistics()['prefetched_unread'] == 1
+
+        await asyncio.sleep(0.1)
+        assert scheduler.expire_idle() == 1
+        return scheduler.get_statistics()
+
+    stats = asyncio.run(scenario())
+    assert stats['active_readers'] == 0
+    assert stats['prefetched_unread'] == 0
@@ -0,0 +1,112 @@
+"""
+Tests for page rendering options, format selection and resolution
+"""
+import os
+import sys
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import DEFAULT_IMAGE_QUALITY, MAX_TILE_ZOOM, MAX_ZOOM, MIN_ZOOM
+from render_engine import (
+    WEBP_SUPPORTED,
+    RenderOptions,
+    _resolve_format,
+    _resolve_zoom,
+    is_image_page,
+    normalize_render_options,
+    render_page_job
+)
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    """A two-page PDF: a text page, then a page covered by an image (like a scan)."""
+    document = fitz.open()
+    text_page = document.new_page(width=600, height=800)
+    text_page.insert_text((72, 100), "Chapter one")
+    scan_page = document.new_page(width=600, height=800)
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 60, 80), False)
+    pixmap.set_rect(pixmap.irect, (200, 180, 160))
+    scan_page.insert_image(scan_page.rect, pixmap=pixmap)
+    path = str(tmp_path / "book.pdf")
+    document.save(path)
+    document.close()
+    return path
+
+
+@pytest.fixture
+def pages(pdf_path):
+    document = fitz.open(pdf_path)
+    yield document[0], document[1]
+    document.close()
+
+
+def test_options_that_cannot_change_the_image_are_normalized():
+    # PNG is lossless: the quality is ignored
+    assert normalize_render_options(RenderOptions(image_format="png", quality=30)) == \
+        RenderOptions(image_format="png")
+    # A width overrides the DPI and zoom, a DPI overrides the zoom
+    assert normalize_render_options(RenderOptions(width=800, dpi=150, zoom=3.0)) == RenderOptions(width=800)
+    assert normalize_render_options(RenderOptions(dpi=150, zoom=3.0)) == RenderOptions(dpi=150)
+    # Only automatic format selection looks at WebP support
+    assert normalize_render_options(RenderOptions(image_format="jpeg", allow_webp=True)) == \
+        RenderOptions(image_format="jpeg")
+    assert normalize_render_options(RenderOptions(allow_webp=True)).allow_webp is WEBP_SUPPORTED
+
+
+def test_options_that_change_the_image_are_kept():
+    for options in (
+        RenderOptions(image_format="jpeg", quality=30),
+        # Automatic format may pick a lossy format for scans
+        RenderOptions(quality=30),
+        RenderOptions(zoom=3.0),
+        RenderOptions(grayscale=True),
+        RenderOptions(clip=(0.0, 0.0, 100.0, 100.0))
+    ):
+        assert normalize_render_options(options) == options
+
+
+def test_zoom_is_resolved_from_width_then_dpi_then_zoom(pages):
+    text_page, _ = pages
+    assert _resolve_zoom(text_page, RenderOptions(width=900, dpi=300, zoom=1.0)) == 1.5
+    assert _resolve_zoom(text_page, RenderOptions(dpi=144, zoom=1.0)) == 2.0
+    assert _resolve_zoom(text_page, RenderOptions(zoom=1.0)) == 1.0
+    assert _resolve_zoom(text_page, RenderOptions(zoom=0.01)) == MIN_ZOOM
+    assert _resolve_zoom(text_page, RenderOptions(zoom=100.0)) == MAX_ZOOM
+    # Clipped renders only rasterize a region, so they may zoom further
+    assert _resolve_zoom(text_page, RenderOptions(zoom=100.0, clip=(0.0, 0.0, 10.0, 10.0))) == MAX_TILE_ZOOM
+
+
+def test_scanned_pages_get_a_lossy_format(pages):
+    text_page, scan_page = pages
+    assert not is_image_page(text_page)
+    assert is_image_page(scan_page)
+
+    assert _resolve_format(text_page, RenderOptions()) == "png"
+    assert _resolve_format(text_page, RenderOptions(allow_webp=True)) == "png"
+    assert _resolve_format(scan_page, RenderOptions()) == "jpeg"
+    assert _resolve_format(scan_page, RenderOptions(allow_webp=True)) == ("webp" if WEBP_SUPPORTED else "jpeg")
+    # An explicit format always wins
+    assert _resolve_format(scan_page, RenderOptions(image_format="png")) == "png"
+    assert _resolve_format(text_page, RenderOptions(image_format="jpeg")) == "jpeg"
+
+
+def test_render_follows_the_resolved_format_and_size(pdf_path):
+    image, media_type = render_page_job(pdf_path, "book", 1, RenderOptions(width=300))
+    assert media_type == "image/png"
+    assert fitz.Pixmap(image).width == 300
+
+    image, media_type = render_page_job(pdf_path, "book", 2, RenderOptions(zoom=1.0))
+    assert media_type == "image/jpeg"
+    assert (fitz.Pixmap(image).width, fitz.Pixmap(image).height) == (600, 800)
+
+    # The quality of PNG output makes no difference, which is why it is normalized away
+    assert render_page_job(pdf_path, "book", 1, RenderOptions(image_format="png", quality=10))[0] == \
+        render_page_job(pdf_path, "book", 1, RenderOptions(image_format="png", quality=DEFAULT_IMAGE_QUALITY))[0]
+
+    with pytest.raises(ValueError):
+        render_page_job(pdf_path, "book", 3)
@@ -0,0 +1,50 @@
+"""
+Tests for layout-aware segmentation of page text
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from segmentation import merge_lines, pack_units, segment_page
+
+
+def _line(text, y):
+    return {'bbox': (50.0, y, 300.0, y + 12.0), 'spans': [{'text': text}]}
+
+
+def test_merge_lines_dehyphenates_and_unwraps():
+    assert merge_lines(["A long trans-", "lation of the", "text. "]) == "A long translation of the text."
+    # Hyphenated compounds broken before a capital keep their hyphen
+    assert merge_lines(["the Franco-", "Prussian war"]) == "the Franco-Prussian war"
+    assert merge_lines(["COVID-", "19 cases"]) == "COVID-19 cases"
+    # A dash standing apart is not a word break
+    assert merge_lines(["prices rose -", "Sharply"]) == "prices rose - Sharply"
+    assert merge_lines(["soft\u00ad", "hyphen"]) == "softhyphen"
+
+
+def test_segment_page_returns_units_with_bboxes():
+    page_dict = {'blocks': [
+        {'type': 0, 'number': 0, 'lines': [_line("Heading", 40.0)]},
+        {'type': 1, 'number': 1, 'bbox': (0.0, 0.0, 10.0, 10.0)},
+        {'type': 0, 'number': 2, 'lines': [
+            _line("First para-", 80.0),
+            _line("graph line.", 92.0),
+            _line("• item one", 104.0),
+            _line("• item two", 116.0),
+            _line("   ", 128.0)
+        ]}
+    ]}
+    units = segment_page(page_dict)
+
+    assert [unit.text for unit in units] == ["Heading", "First paragraph line.", "• item one", "• item two"]
+    assert units[1].bbox == (50.0, 80.0, 300.0, 104.0)
+    assert units[1].block_number == 2
+
+
+def test_pack_units_respects_the_chunk_size():
+    texts = ["a" * 400, "b" * 400, "c" * 400, "d" * 1500, "e" * 10]
+    chunks = pack_units(texts, max_chunk_size=1000, separator_size=2)
+
+    assert chunks == [(0, 2), (2, 3), (3, 4), (4, 5)]
+    assert pack_units([]) == []
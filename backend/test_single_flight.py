@@ -0,0 +1,106 @@
+"""
+Tests for single-flight coalescing of identical requests
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from single_flight import SingleFlight
+
+
+class SlowWork:
+    """Counts how often the work runs; finishes when released."""
+
+    def __init__(self, result="page", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_callers_share_one_run():
+    async def scenario():
+        flights = SingleFlight("page")
+        work = SlowWork()
+        callers = [asyncio.ensure_future(flights.run(("hash", 1, "auto", "en"), work)) for _ in range(3)]
+        other = asyncio.ensure_future(flights.run(("hash", 2, "auto", "en"), SlowWork("other")))
+        await asyncio.sleep(0)
+        work.release.set()
+        assert await asyncio.gather(*callers) == ["page"] * 3
+        assert work.calls == 1
+        other.cancel()
+
+        # Finished work is forgotten: the next request runs again
+        again = SlowWork("again")
+        again.release.set()
+        assert await flights.run(("hash", 1, "auto", "en"), again) == "again"
+        await asyncio.sleep(0)
+        stats = flights.get_statistics()
+        assert stats['started'] == 3
+        assert stats['coalesced'] == 2
+        assert stats['in_flight'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_does_not_abort_shared_work():
+    async def scenario():
+        flights = SingleFlight("image")
+        work = SlowWork()
+        prefetch = asyncio.ensure_future(flights.run("key", work))
+        navigation = asyncio.ensure_future(flights.run("key", work))
+        await asyncio.sleep(0)
+
+        prefetch.cancel()
+        await asyncio.sleep(0)
+        assert prefetch.cancelled()
+        work.release.set()
+        assert await navigation == "page"
+        assert work.calls == 1
+        assert flights.get_statistics()['abandoned'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_work_is_cancelled_when_every_caller_left():
+    async def scenario():
+        flights = SingleFlight("page")
+        work = SlowWork()
+        caller = asyncio.ensure_future(flights.run("key", work))
+        await asyncio.sleep(0)
+        caller.cancel()
+        await asyncio.sleep(0)
+        assert flights.get_statistics() == {'in_flight': 0, 'started': 1, 'coalesced': 0, 'abandoned': 1}
+
+        # A new request does not join the cancelled work
+        fresh = SlowWork("fresh")
+        fresh.release.set()
+        assert await flights.run("key", fresh) == "fresh"
+
+    asyncio.run(scenario())
+
+
+def test_failures_reach_every_caller():
+    async def scenario():
+        flights = SingleFlight("page")
+        work = SlowWork(error=RuntimeError("upstream error"))
+        callers = [asyncio.ensure_future(flights.run("key", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        work.release.set()
+        for caller in callers:
+            with pytest.raises(RuntimeError):
+                await caller
+        assert work.calls == 1
+
+    asyncio.run(scenario())
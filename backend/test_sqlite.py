@@ -140,6 +140,7 @@ def test_sqlite_implementation():
     print("✅ Dados de teste removidos")
     
     # Remover arquivo de teste
+    db.close()
     try:
         os.remove("test_pdf_history.db")
         print("✅ Arquivo de teste removido")
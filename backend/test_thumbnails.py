@@ -0,0 +1,75 @@
+"""
+Tests for the thumbnail store
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from thumbnails import ThumbnailStore
+
+CONTENT_HASH = "ab" + "0" * 62
+
+
+def test_thumbnails_are_keyed_on_content_and_page(tmp_path):
+    store = ThumbnailStore(str(tmp_path / "thumbnails"))
+    assert not store.contains(CONTENT_HASH, 1)
+
+    path = store.put(CONTENT_HASH, 1, b"\xff\xd8cover")
+    assert path == store.path_for(CONTENT_HASH, 1)
+    assert os.path.basename(os.path.dirname(path)) == "ab"
+    assert store.contains(CONTENT_HASH, 1)
+    assert not store.contains(CONTENT_HASH, 2)
+    assert store.read(CONTENT_HASH, 1) == b"\xff\xd8cover"
+    with pytest.raises(FileNotFoundError):
+        store.read(CONTENT_HASH, 2)
+
+    # A re-render replaces the file without leaving temporary files behind
+    store.put(CONTENT_HASH, 1, b"\xff\xd8new")
+    store.put(CONTENT_HASH, 7, b"\xff\xd8last")
+    assert store.read(CONTENT_HASH, 1) == b"\xff\xd8new"
+    assert sorted(os.listdir(os.path.dirname(path))) == [f"{CONTENT_HASH}-p1.jpg", f"{CONTENT_HASH}-p7.jpg"]
+
+    stats = store.get_statistics()
+    assert stats['files'] == 2
+    assert stats['bytes'] == len(b"\xff\xd8new") + len(b"\xff\xd8last")
+    assert stats['stored'] == 3
+
+
+def test_least_recently_read_thumbnails_are_evicted_under_the_budget(tmp_path):
+    store = ThumbnailStore(str(tmp_path / "thumbnails"), max_bytes=250)
+    for page in (1, 2):
+        store.put(CONTENT_HASH, page, b"x" * 100)
+        os.utime(store.path_for(CONTENT_HASH, page), (page, page))
+    # Reading page 1 makes page 2 the least recently used
+    store.read(CONTENT_HASH, 1)
+
+    store.put(CONTENT_HASH, 3, b"x" * 100)
+    assert store.contains(CONTENT_HASH, 1)
+    assert not store.contains(CONTENT_HASH, 2)
+    assert store.contains(CONTENT_HASH, 3)
+    stats = store.get_statistics()
+    assert stats['bytes'] == 200 and stats['evicted'] == 1
+
+    # A thumbnail larger than the whole budget is still kept once stored
+    store.put(CONTENT_HASH, 4, b"x" * 300)
+    assert store.contains(CONTENT_HASH, 4)
+
+
+def test_thumbnails_of_a_document_are_removed(tmp_path):
+    store = ThumbnailStore(str(tmp_path / "thumbnails"))
+    other_hash = "ab" + "1" * 62
+    store.put(CONTENT_HASH, 1, b"cover")
+    store.put(CONTENT_HASH, 12, b"page")
+    store.put(other_hash, 1, b"other")
+
+    assert store.remove(CONTENT_HASH) == 2
+    assert not store.contains(CONTENT_HASH, 1) and not store.contains(CONTENT_HASH, 12)
+    assert store.contains(other_hash, 1)
+    assert store.remove("cd" + "0" * 62) == 0
+
+    assert store.clear() == 1
+    assert store.get_statistics()['files'] == 0
+    assert store.get_statistics()['removed'] == 3
@@ -0,0 +1,144 @@
+"""
+Tests for the pooled upstream translation client, against a local stub server
+"""
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from translation_client import TokenBucket, TranslationClient, TranslationError
+
+
+class StubTranslateHandler(BaseHTTPRequestHandler):
+    """Answers like the gtx endpoint, upper-casing the text as its 'translation'."""
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    posts = 0
+    delay = 0.0
+    merge_lines = False
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        self._answer(query["q"][0])
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = urllib.parse.parse_qs(self.rfile.read(length).decode("utf-8"))
+        type(self).posts += 1
+        self._answer(form["q"][0])
+
+    def _answer(self, text):
+        if "fail" in text:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        time.sleep(self.delay)
+        translated = text.upper()
+        if self.merge_lines:
+            translated = translated.replace("\n", " ")
+        body = json.dumps([[[translated, text, None, None]]]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    StubTranslateHandler.connections = 0
+    StubTranslateHandler.posts = 0
+    StubTranslateHandler.delay = 0.0
+    StubTranslateHandler.merge_lines = False
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubTranslateHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/translate_a/single"
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_reused(stub_server):
+    client = TranslationClient(stub_server, pool_size=2, max_concurrency=1,
+                               rate_limiter=TokenBucket(rate=0, capacity=1))
+    for _ in range(5):
+        assert client.translate("hello", "en", "pt") == "HELLO"
+
+    stats = client.get_statistics()
+    assert stats['requests_sent'] == 5
+    assert stats['connections_opened'] == 1
+    assert StubTranslateHandler.connections == 1
+    client.close()
+
+
+def test_translate_many_is_concurrent_and_ordered(stub_server):
+    StubTranslateHandler.delay = 0.2
+    client = TranslationClient(stub_server, pool_size=4, max_concurrency=4,
+                               rate_limiter=TokenBucket(rate=0, capacity=1))
+    started = time.monotonic()
+    result = client.translate_many(["a.", "b.", "c.", "d."], "en", "pt")
+    elapsed = time.monotonic() - started
+
+    assert result == ["A.", "B.", "C.", "D."]
+    assert elapsed < 0.6
+    client.close()
+
+
+def test_translate_batch_packs_segments(stub_server):
+    client = TranslationClient(stub_server, pool_size=2, max_concurrency=2,
+                               rate_limiter=TokenBucket(rate=0, capacity=1))
+    segments = [f"cell {i}" for i in range(30)] + ["", "two\nlines"]
+    result = client.translate_batch(segments, "en", "pt", max_bytes=100)
+
+    assert result == [f"CELL {i}" for i in range(30)] + ["", "TWO\nLINES"]
+    stats = client.get_statistics()
+    # 30 segments of 7-8 bytes fit in 3 batches of 100 bytes, plus the multi-line segment
+    assert stats['requests_sent'] == 4
+    assert stats['batches_sent'] == 3
+    assert StubTranslateHandler.posts == 4
+    client.close()
+
+
+def test_translate_batch_falls_back_when_lines_do_not_align(stub_server):
+    StubTranslateHandler.merge_lines = True
+    client = TranslationClient(stub_server, max_concurrency=1,
+                               rate_limiter=TokenBucket(rate=0, capacity=1))
+    result = client.translate_batch(["one", "two", "three"], "en", "pt")
+
+    assert result == ["ONE", "TWO", "THREE"]
+    stats = client.get_statistics()
+    assert stats['batch_fallbacks'] == 1
+    assert stats['requests_sent'] == 4
+    client.close()
+
+
+def test_http_errors_raise_translation_error(stub_server):
+    client = TranslationClient(stub_server, rate_limiter=TokenBucket(rate=0, capacity=1))
+    with pytest.raises(TranslationError):
+        client.translate("please fail", "en", "pt")
+    client.close()
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=20, capacity=2)
+    started = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    # Two tokens are available immediately, the other two take 1/20 s each
+    assert time.monotonic() - started >= 0.09
+    assert not bucket.try_acquire()
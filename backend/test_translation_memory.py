@@ -0,0 +1,46 @@
+"""
+Tests for the persistent translation memory
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from translation_memory import TranslationMemory, normalize_segment, segment_key
+
+
+def test_normalized_segments_share_a_key():
+    assert normalize_segment("  Hello \t world  \nsecond line   ") == "Hello world\nsecond line"
+    assert segment_key("Hello  world", "en", "pt") == segment_key("Hello world ", "en", "pt")
+    assert segment_key("Hello world", "en", "pt") != segment_key("Hello world", "en", "es")
+
+
+def test_lru_and_disk_tiers(tmp_path):
+    db_path = str(tmp_path / "memory.db")
+    memory = TranslationMemory(db_path, lru_size=1)
+
+    assert memory.get("Hello", "en", "pt") is None
+    memory.put("Hello", "en", "pt", "Olá")
+    memory.put("World", "en", "pt", "Mundo")
+
+    # "World" is in the LRU tier, "Hello" was evicted to disk only
+    assert memory.get("World", "en", "pt") == "Mundo"
+    assert memory.get("Hello", "en", "pt") == "Olá"
+
+    stats = memory.get_statistics()
+    assert stats['memory_hits'] == 1
+    assert stats['disk_hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['stored_entries'] == 2
+    memory.close()
+
+
+def test_translations_survive_restart(tmp_path):
+    db_path = str(tmp_path / "memory.db")
+    memory = TranslationMemory(db_path)
+    memory.put("Good morning", "auto", "pt", "Bom dia")
+    memory.close()
+
+    restarted = TranslationMemory(db_path)
+    assert restarted.get("Good  morning", "auto", "pt") == "Bom dia"
+    assert restarted.get_statistics()['disk_hits'] == 1
+    restarted.close()
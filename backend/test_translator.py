@@ -0,0 +1,48 @@
+"""
+Tests for text chunking in the translation module
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from translator import split_into_chunks, split_into_chunks_with_offsets
+
+
+def test_chunk_offsets_locate_chunks_in_text():
+    text = "First sentence. Second one!\nThird line? " * 40
+    chunks = split_into_chunks_with_offsets(text, max_chunk_size=120)
+
+    assert [chunk for _, chunk in chunks] == split_into_chunks(text, 120)
+    assert len(chunks) > 1
+    for offset, chunk in chunks:
+        assert text[offset:offset + len(chunk)] == chunk
+    last_offset, last_chunk = chunks[-1]
+    assert last_offset + len(last_chunk) == len(text)
+
+
+def test_chunk_offsets_of_empty_text():
+    assert split_into_chunks_with_offsets("") == []
+
+
+def test_translate_units_translates_repeated_units_once(monkeypatch):
+    import translator
+
+    memory = {("Cached unit", "en", "pt"): "Unidade em cache"}
+    batches = []
+
+    def fake_translate_segments(segments, source_lang, target_lang):
+        batches.append(list(segments))
+        return [segment.upper() for segment in segments]
+
+    monkeypatch.setattr(translator, "get_cached_translation",
+                        lambda text, sl, tl: memory.get((text, sl, tl)))
+    monkeypatch.setattr(translator, "cache_translation",
+                        lambda text, sl, tl, translated: memory.__setitem__((text, sl, tl), translated))
+    monkeypatch.setattr(translator, "translate_segments", fake_translate_segments)
+
+    result = translator.translate_units(["Footer", "Cached unit", "Body", "Footer "], "en", "pt")
+
+    assert result == ["FOOTER", "Unidade em cache", "BODY", "FOOTER"]
+    assert batches == [["Footer", "Body"]]
+    assert memory[("Body", "en", "pt")] == "BODY"
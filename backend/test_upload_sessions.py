@@ -0,0 +1,96 @@
+"""
+Tests for streamed and resumable uploads
+"""
+import hashlib
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from upload_sessions import (
+    IncrementalUpload,
+    InvalidUploadError,
+    UploadNotFoundError,
+    UploadOffsetError,
+    UploadSessionManager,
+    UploadTooLargeError
+)
+
+PDF = b"%PDF-1.7\n" + b"x" * 5000
+
+
+def test_chunks_are_hashed_as_they_are_written(tmp_path):
+    upload = IncrementalUpload(str(tmp_path), max_bytes=len(PDF))
+    for start in range(0, len(PDF), 1000):
+        upload.write(PDF[start:start + 1000])
+
+    assert upload.finish() == hashlib.sha256(PDF).hexdigest()
+    with open(upload.temp_path, "rb") as f:
+        assert f.read() == PDF
+
+
+def test_invalid_and_oversized_uploads_fail_early(tmp_path):
+    upload = IncrementalUpload(str(tmp_path), max_bytes=10000)
+    with pytest.raises(InvalidUploadError):
+        upload.write(b"<html>" + b" " * 2000)
+    assert upload.size == 0
+
+    # The signature may be split across chunks
+    upload = IncrementalUpload(str(tmp_path), max_bytes=10000)
+    upload.write(b"  %PD")
+    upload.write(b"F-1.4")
+    assert upload.size == 10
+
+    upload = IncrementalUpload(str(tmp_path), max_bytes=3000)
+    upload.write(PDF[:2000])
+    with pytest.raises(UploadTooLargeError):
+        upload.write(PDF[2000:4000])
+
+    with pytest.raises(UploadTooLargeError):
+        IncrementalUpload(str(tmp_path), max_bytes=100, expected_size=101)
+
+    # A short file without a signature is rejected when it is complete
+    upload = IncrementalUpload(str(tmp_path))
+    upload.write(b"tiny")
+    with pytest.raises(InvalidUploadError):
+        upload.finish()
+
+
+def test_resumable_upload_continues_from_its_offset(tmp_path):
+    manager = UploadSessionManager(str(tmp_path), max_bytes=len(PDF))
+    session = manager.create("large.pdf", len(PDF))
+
+    chunk = manager.begin_chunk(session.upload_id, 0)
+    chunk.upload.write(PDF[:3000])
+    manager.end_chunk(chunk)
+
+    # A retried chunk at a stale offset is refused with the current offset
+    with pytest.raises(UploadOffsetError) as error:
+        manager.begin_chunk(session.upload_id, 0)
+    assert error.value.offset == 3000
+    with pytest.raises(UploadOffsetError):
+        manager.complete(session.upload_id)
+
+    chunk = manager.begin_chunk(session.upload_id, manager.get(session.upload_id).upload.size)
+    chunk.upload.write(PDF[3000:])
+    manager.end_chunk(chunk)
+
+    completed, content_hash = manager.complete(session.upload_id)
+    assert content_hash == hashlib.sha256(PDF).hexdigest()
+    assert completed.filename == "large.pdf"
+    with pytest.raises(UploadNotFoundError):
+        manager.get(session.upload_id)
+
+
+def test_stale_sessions_are_discarded(tmp_path):
+    manager = UploadSessionManager(str(tmp_path), ttl=0)
+    session = manager.create("stale.pdf", 100)
+    assert os.path.exists(session.upload.temp_path)
+
+    assert manager.expire_stale() == 1
+    assert not os.path.exists(session.upload.temp_path)
+    with pytest.raises(UploadNotFoundError):
+        manager.abort(session.upload_id)
+    assert manager.get_statistics()['expired'] == 1
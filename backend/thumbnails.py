@@ -0,0 +1,189 @@
+"""
+MoziTranslate - Thumbnail store module
+Keeps small JPEG thumbnails of document pages on disk, keyed on content hash
+and page, so history cards are served a few kilobytes instead of full renders;
+least recently used thumbnails are evicted under a disk budget
+"""
+import logging
+import os
+import re
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from config import THUMBNAIL_DIR, THUMBNAIL_MAX_BYTES
+
+logger = logging.getLogger("thumbnails")
+
+_THUMBNAIL_NAME = re.compile(r"^[0-9a-f]{64}-p\d+\.jpg$")
+
+
+class ThumbnailStore:
+    """
+    Directory of page thumbnails named ``<content hash>-p<page>.jpg`` and
+    sharded by the first two hex digits of the hash, like the PDF store.
+    Identical uploads share their thumbnails. Files are written atomically,
+    so a reader never sees a partial image, and their modification time is
+    refreshed on every read, so eviction removes the least recently used
+    thumbnails first.
+    """
+
+    def __init__(self, root: str = THUMBNAIL_DIR, max_bytes: int = THUMBNAIL_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stored = 0
+        self._evicted = 0
+        self._removed = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, content_hash: str, page_number: int) -> str:
+        """Returns the path of the thumbnail of a page."""
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}-p{page_number}.jpg")
+
+    def contains(self, content_hash: str, page_number: int) -> bool:
+        """Whether the thumbnail of a page is stored."""
+        return os.path.exists(self.path_for(content_hash, page_number))
+
+    def put(self, content_hash: str, page_number: int, image: bytes) -> str:
+        """
+        Stores the thumbnail of a page, replacing any previous one.
+
+        Returns:
+            Path of the stored thumbnail
+        """
+        path = self.path_for(content_hash, page_number)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(image)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        with self._lock:
+            self._stored += 1
+        self.evict(keep=path)
+        return path
+
+    def read(self, content_hash: str, page_number: int) -> bytes:
+        """
+        Returns the stored thumbnail of a page.
+
+        Raises:
+            FileNotFoundError: If the thumbnail is not stored
+        """
+        path = self.path_for(content_hash, page_number)
+        with open(path, "rb") as f:
+            image = f.read()
+        try:
+            # A read counts as a use for the eviction order
+            os.utime(path)
+        except OSError:
+            pass
+        return image
+
+    def remove(self, content_hash: str) -> int:
+        """
+        Removes every thumbnail of a document, e.g. when it leaves the history.
+
+        Returns:
+            Number of thumbnails removed
+        """
+        directory = os.path.join(self.root, content_hash[:2])
+        prefix = f"{content_hash}-p"
+        try:
+            names = [name for name in os.listdir(directory)
+                     if name.startswith(prefix) and _THUMBNAIL_NAME.match(name)]
+        except FileNotFoundError:
+            return 0
+        removed = 0
+        for name in names:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                continue
+            removed += 1
+        with self._lock:
+            self._removed += removed
+        return removed
+
+    def clear(self) -> int:
+        """
+        Removes every thumbnail, e.g. when the history is cleared.
+
+        Returns:
+            Number of thumbnails removed
+        """
+        removed = 0
+        for path in self._scan():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+        with self._lock:
+            self._removed += removed
+        return removed
+
+    def _scan(self) -> Dict[str, Tuple[float, int]]:
+        """Returns {path: (mtime, size)} of every stored thumbnail."""
+        files = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if not _THUMBNAIL_NAME.match(name):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files[path] = (stat.st_mtime, stat.st_size)
+        return files
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Removes least recently used thumbnails until the store fits its budget.
+
+        Args:
+            keep: Path of a thumbnail that must not be evicted (e.g. the one just stored)
+
+        Returns:
+            Number of bytes freed
+        """
+        files = self._scan()
+        total = sum(size for _, size in files.values())
+        freed = 0
+        for path, (_, size) in sorted(files.items(), key=lambda item: item[1][0]):
+            if total - freed <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Failed to evict thumbnail {path}: {str(e)}")
+                continue
+            freed += size
+            with self._lock:
+                self._evicted += 1
+        return freed
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Returns stored thumbnail usage and counters."""
+        files = self._scan()
+        with self._lock:
+            return {
+                'files': len(files),
+                'bytes': sum(size for _, size in files.values()),
+                'max_bytes': self.max_bytes,
+                'stored': self._stored,
+                'evicted': self._evicted,
+                'removed': self._removed
+            }
+
+
+# Initialize global thumbnail store instance
+thumbnail_store = ThumbnailStore()
@@ -0,0 +1,328 @@
+"""
+MoziTranslate - Upstream translation client module
+Keep-alive connection pool, token-bucket rate limiter, concurrent chunk
+translation and multi-segment batching for the unofficial Google Translate
+API (or a compatible stub)
+"""
+import http.client
+import json
+import logging
+import queue
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    TRANSLATE_BATCH_MAX_BYTES,
+    TRANSLATE_BURST,
+    TRANSLATE_MAX_CONCURRENCY,
+    TRANSLATE_POOL_SIZE,
+    TRANSLATE_RATE_PER_SECOND,
+    TRANSLATE_TIMEOUT,
+    TRANSLATE_URL
+)
+
+logger = logging.getLogger("translation_client")
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+
+class TranslationError(Exception):
+    """Exception raised for errors in the translation process."""
+    pass
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter.
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``;
+    each upstream request consumes one token.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        """Adds the tokens accrued since the last update; the caller must hold the lock."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Takes tokens if they are available right now."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Blocks until the requested tokens are available and takes them."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class TranslationClient:
+    """
+    HTTP client for the upstream translation API.
+
+    Connections are kept alive and reused through a bounded pool, every
+    request passes through a shared token bucket, and the chunks of a text
+    can be translated concurrently up to ``max_concurrency``.
+    """
+
+    def __init__(self, base_url: str = TRANSLATE_URL, pool_size: int = TRANSLATE_POOL_SIZE,
+                 max_concurrency: int = TRANSLATE_MAX_CONCURRENCY, timeout: float = TRANSLATE_TIMEOUT,
+                 rate_limiter: Optional[TokenBucket] = None):
+        parsed = urllib.parse.urlsplit(base_url)
+        if parsed.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported translation URL: {base_url}")
+
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate_limiter = rate_limiter or TokenBucket(TRANSLATE_RATE_PER_SECOND, TRANSLATE_BURST)
+        self._scheme = parsed.scheme
+        self._host = parsed.hostname
+        self._port = parsed.port
+        self._path = parsed.path or "/"
+        self._pool: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=pool_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                            thread_name_prefix="translate")
+        self._connections_opened = 0
+        self._requests_sent = 0
+        self._batches_sent = 0
+        self._batch_fallbacks = 0
+        self._segments_batched = 0
+        self._stats_lock = threading.Lock()
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        """Opens a new connection to the upstream host."""
+        with self._stats_lock:
+            self._connections_opened += 1
+        if self._scheme == "https":
+            return http.client.HTTPSConnection(self._host, self._port, timeout=self.timeout)
+        return http.client.HTTPConnection(self._host, self._port, timeout=self.timeout)
+
+    def _checkout(self) -> http.client.HTTPConnection:
+        """Takes an idle connection from the pool or opens a new one."""
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._new_connection()
+
+    def _checkin(self, connection: http.client.HTTPConnection) -> None:
+        """Returns a connection to the pool, closing it if the pool is full."""
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _request_json(self, params: dict, form: Optional[dict] = None) -> Any:
+        """
+        Sends one request and returns the decoded JSON body. ``params`` go in
+        the query string; ``form`` fields, if any, are sent as a POST body,
+        which is not subject to URL length limits.
+        """
+        target = f"{self._path}?{urllib.parse.urlencode(params)}"
+        headers = {"User-Agent": USER_AGENT, "Connection": "keep-alive"}
+        method, body = "GET", None
+        if form is not None:
+            method = "POST"
+            body = urllib.parse.urlencode(form).encode("utf-8")
+            headers["Content-Type"] = "application/x-www-form-urlencoded;charset=utf-8"
+
+        self.rate_limiter.acquire()
+        with self._stats_lock:
+            self._requests_sent += 1
+
+        # A pooled connection may have been closed by the server; retry once on a fresh one
+        for attempt in range(2):
+            connection = self._checkout() if attempt == 0 else self._new_connection()
+            try:
+                connection.request(method, target, body=body, headers=headers)
+                response = connection.getresponse()
+                body_bytes = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+                if attempt == 0:
+                    continue
+                raise TranslationError(f"Network error during translation: {str(e)}")
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._checkin(connection)
+
+            if response.status != 200:
+                raise TranslationError(f"Translation API returned HTTP {response.status}")
+            try:
+                return json.loads(body_bytes.decode("utf-8"))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                raise TranslationError("Failed to parse translation API response")
+
+    def translate(self, text: str, source_lang: str = "auto", target_lang: str = "en") -> str:
+        """
+        Translates a single text.
+
+        Raises:
+            TranslationError: If translation fails
+        """
+        if not text.strip():
+            return ""
+
+        data = self._request_json({
+            "client": "gtx",
+            "sl": source_lang,
+            "tl": target_lang,
+            "dt": "t"
+        }, form={"q": text})
+
+        if not data or not isinstance(data, list) or len(data) < 1 or not isinstance(data[0], list):
+            raise TranslationError("Invalid response format from translation API")
+
+        # Extract translated segments and join them
+        translated_segments = [segment[0] for segment in data[0] if segment and segment[0]]
+        return "".join(translated_segments)
+
+    def translate_many(self, texts: List[str], source_lang: str = "auto", target_lang: str = "en") -> List[str]:
+        """
+        Translates several texts concurrently and returns them in input order.
+
+        Raises:
+            TranslationError: If any of the translations fails
+        """
+        if len(texts) <= 1:
+            return [self.translate(text, source_lang, target_lang) for text in texts]
+
+        futures = [self._executor.submit(self.translate, text, source_lang, target_lang) for text in texts]
+        try:
+            return [future.result() for future in futures]
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def translate_batch(self, segments: List[str], source_lang: str = "auto", target_lang: str = "en",
+                        max_bytes: int = TRANSLATE_BATCH_MAX_BYTES) -> List[str]:
+        """
+        Translates many short segments in few upstream requests.
+
+        Single-line segments are packed, one per line, into batches of at
+        most ``max_bytes`` UTF-8 bytes; each batch is one request and the
+        translated lines are mapped back to their segments. When the
+        upstream merges or splits lines of a batch, its segments are
+        translated one by one instead. Multi-line and oversized segments are
+        always translated on their own. Batches run concurrently.
+
+        Returns:
+            Translations in input order (empty for blank segments)
+
+        Raises:
+            TranslationError: If any of the translations fails
+        """
+        results: List[Optional[str]] = [None] * len(segments)
+        batches: List[List[Tuple[int, str]]] = []
+        singles: List[int] = []
+        current: List[Tuple[int, str]] = []
+        current_bytes = 0
+
+        for index, segment in enumerate(segments):
+            if not segment.strip():
+                results[index] = ""
+                continue
+            size = len(segment.encode("utf-8")) + 1
+            if "\n" in segment or "\r" in segment or size > max_bytes:
+                singles.append(index)
+                continue
+            if current and current_bytes + size > max_bytes:
+                batches.append(current)
+                current, current_bytes = [], 0
+            current.append((index, segment))
+            current_bytes += size
+        if current:
+            batches.append(current)
+
+        futures = [self._executor.submit(self._translate_packed, batch, source_lang, target_lang)
+                   for batch in batches]
+        futures += [self._executor.submit(self._translate_single, index, segments[index], source_lang, target_lang)
+                    for index in singles]
+        try:
+            for future in futures:
+                for index, translated in future.result().items():
+                    results[index] = translated
+        finally:
+            for future in futures:
+                future.cancel()
+
+        with self._stats_lock:
+            self._segments_batched += sum(len(batch) for batch in batches)
+        return results
+
+    def _translate_single(self, index: int, segment: str, source_lang: str, target_lang: str) -> Dict[int, str]:
+        """Translates one segment of a batch call on its own."""
+        return {index: self.translate(segment, source_lang, target_lang)}
+
+    def _translate_packed(self, batch: List[Tuple[int, str]], source_lang: str,
+                          target_lang: str) -> Dict[int, str]:
+        """Translates the segments of one batch in a single request, falling back when lines do not align."""
+        if len(batch) == 1:
+            index, segment = batch[0]
+            return {index: self.translate(segment, source_lang, target_lang)}
+
+        translated = self.translate("\n".join(segment for _, segment in batch), source_lang, target_lang)
+        lines = translated.split("\n")
+        # A trailing newline in the response would produce one empty extra line
+        if len(lines) == len(batch) + 1 and not lines[-1].strip():
+            lines.pop()
+        if len(lines) == len(batch):
+            with self._stats_lock:
+                self._batches_sent += 1
+            return {index: line.strip() for (index, _), line in zip(batch, lines)}
+
+        logger.warning(f"Batch of {len(batch)} segments came back as {len(lines)} lines, "
+                       f"translating them one by one")
+        with self._stats_lock:
+            self._batch_fallbacks += 1
+        return {index: self.translate(segment, source_lang, target_lang) for index, segment in batch}
+
+    def get_statistics(self) -> dict:
+        """Returns connection reuse and batching counters."""
+        with self._stats_lock:
+            return {
+                'requests_sent': self._requests_sent,
+                'connections_opened': self._connections_opened,
+                'batches_sent': self._batches_sent,
+                'batch_fallbacks': self._batch_fallbacks,
+                'segments_batched': self._segments_batched,
+                'idle_connections': self._pool.qsize(),
+                'max_concurrency': self.max_concurrency
+            }
+
+    def close(self) -> None:
+        """Closes pooled connections and stops the worker threads."""
+        self._executor.shutdown(wait=False)
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# Initialize global translation client instance
+translation_client = TranslationClient()
@@ -0,0 +1,153 @@
+"""
+MoziTranslate - Translation memory module
+Persistent, content-addressed store of translated segments backed by SQLite,
+with an in-memory LRU tier in front of it
+"""
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from config import TRANSLATION_MEMORY_DB, TRANSLATION_MEMORY_LRU_SIZE
+
+logger = logging.getLogger("translation_memory")
+
+_HORIZONTAL_WHITESPACE = re.compile(r"[ \t\f\v\u00a0]+")
+
+
+def normalize_segment(text: str) -> str:
+    """
+    Normalizes a segment so that trivially different copies share one entry.
+
+    Applies Unicode NFC, collapses runs of horizontal whitespace, strips
+    trailing spaces from every line and trims the whole segment. Line breaks
+    are kept because they are preserved by the translation.
+    """
+    text = unicodedata.normalize("NFC", text)
+    lines = [_HORIZONTAL_WHITESPACE.sub(" ", line).rstrip() for line in text.split("\n")]
+    return "\n".join(lines).strip()
+
+
+def segment_key(text: str, source_lang: str, target_lang: str) -> str:
+    """Returns the content-addressed key for a segment and language pair."""
+    payload = f"{source_lang}\x00{target_lang}\x00{normalize_segment(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TranslationMemory:
+    """
+    Two-tier translation cache: a bounded LRU dict in memory, backed by a
+    SQLite table that survives restarts.
+    """
+
+    def __init__(self, db_path: str = TRANSLATION_MEMORY_DB, lru_size: int = TRANSLATION_MEMORY_LRU_SIZE):
+        self.db_path = db_path
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.init_database()
+
+    def init_database(self):
+        """Initialize the SQLite database with the translation_memory table"""
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS translation_memory (
+                    segment_key TEXT PRIMARY KEY,
+                    source_lang TEXT NOT NULL,
+                    target_lang TEXT NOT NULL,
+                    source_text TEXT NOT NULL,
+                    translated_text TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            self._conn.commit()
+
+    def _remember(self, key: str, translated_text: str) -> None:
+        """Stores a value in the LRU tier, evicting the oldest entry if full."""
+        self._lru[key] = translated_text
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get(self, text: str, source_lang: str, target_lang: str) -> Optional[str]:
+        """Returns the stored translation for a segment, or None on a miss."""
+        key = segment_key(text, source_lang, target_lang)
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self._memory_hits += 1
+                return self._lru[key]
+
+            row = self._conn.execute(
+                'SELECT translated_text FROM translation_memory WHERE segment_key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self._misses += 1
+                return None
+
+            self._disk_hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, text: str, source_lang: str, target_lang: str, translated_text: str) -> None:
+        """Stores a translation in both tiers."""
+        key = segment_key(text, source_lang, target_lang)
+        with self._lock:
+            self._remember(key, translated_text)
+            try:
+                self._conn.execute('''
+                    INSERT OR REPLACE INTO translation_memory
+                    (segment_key, source_lang, target_lang, source_text, translated_text, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (key, source_lang, target_lang, normalize_segment(text),
+                      translated_text, datetime.now().isoformat()))
+                self._conn.commit()
+                self._writes += 1
+            except sqlite3.Error as e:
+                # The LRU tier still holds the value; a failed disk write only costs persistence
+                logger.error(f"Failed to persist translation: {str(e)}")
+
+    def clear(self) -> None:
+        """Removes every stored translation and resets the counters."""
+        with self._lock:
+            self._lru.clear()
+            self._conn.execute('DELETE FROM translation_memory')
+            self._conn.commit()
+            self._memory_hits = self._disk_hits = self._misses = self._writes = 0
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Returns hit/miss counters and tier sizes."""
+        with self._lock:
+            stored = self._conn.execute('SELECT COUNT(*) FROM translation_memory').fetchone()[0]
+            lookups = self._memory_hits + self._disk_hits + self._misses
+            hits = self._memory_hits + self._disk_hits
+            return {
+                'memory_hits': self._memory_hits,
+                'disk_hits': self._disk_hits,
+                'misses': self._misses,
+                'writes': self._writes,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+                'memory_entries': len(self._lru),
+                'stored_entries': stored
+            }
+
+    def close(self) -> None:
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+# Initialize global translation memory instance
+translation_memory = TranslationMemory()
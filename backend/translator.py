@@ -2,15 +2,15 @@
 MoziTranslate - PDF translation module
 Uses the unofficial Google Translate API to translate text
 """
-import urllib.request
-import urllib.parse
-import json
-import time
-from typing import Dict, List, Optional
+import re
+from typing import Dict, List, Optional, Tuple
 
-class TranslationError(Exception):
-    """Exception raised for errors in the translation process."""
-    pass
+from config import TRANSLATE_BATCH_MAX_BYTES
+from translation_client import translation_client, TranslationError
+from translation_memory import translation_memory, normalize_segment
+
+# A sentence runs up to and including a terminator, or to the end of the text
+_SENTENCE = re.compile(r"[^.!?\n]*(?:[.!?\n]|$)")
 
 def translate(text: str, source_lang: str = "auto", target_lang: str = "en") -> str:
     """
@@ -27,61 +27,75 @@ def translate(text: str, source_lang: str = "auto", target_lang: str = "en") ->
     Raises:
         TranslationError: If translation fails
     """
-    if not text.strip():
-        return ""
-        
-    # Prepare the request
-    url = "https://translate.googleapis.com/translate_a/single"
-    params = {
-        "client": "gtx",
-        "sl": source_lang,
-        "tl": target_lang,
-        "dt": "t",
-        "q": text
-    }
-    
-    url = f"{url}?{urllib.parse.urlencode(params)}"
-    
     try:
-        # Create request with a user agent to avoid blocks
-        request = urllib.request.Request(
-            url,
-            headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
-        )
-        
-        # Make the request
-        with urllib.request.urlopen(request, timeout=5) as response:
-            response_data = response.read().decode("utf-8")
-            data = json.loads(response_data)
-        
-        # Process response
-        if not data or not isinstance(data, list) or len(data) < 1:
-            raise TranslationError("Invalid response format from translation API")
-            
-        # Extract translated segments and join them
-        translated_segments = [segment[0] for segment in data[0] if segment and len(segment) > 0]
-        return "".join(translated_segments)
-        
-    except urllib.error.URLError as e:
-        raise TranslationError(f"Network error during translation: {str(e)}")
-    except json.JSONDecodeError:
-        raise TranslationError("Failed to parse translation API response")
+        return translation_client.translate(text, source_lang, target_lang)
+    except TranslationError:
+        raise
     except Exception as e:
         raise TranslationError(f"Unexpected error during translation: {str(e)}")
 
+def split_into_chunks(text: str, max_chunk_size: int = 1000) -> List[str]:
+    """
+    Splits text into chunks of at most max_chunk_size characters,
+    breaking after sentence terminators where possible.
+    
+    Args:
+        text: Text to split
+        max_chunk_size: Maximum characters per chunk
+        
+    Returns:
+        List of chunks that concatenate back to the original text
+    """
+    chunks = []
+    current_parts: List[str] = []
+    current_size = 0
+    
+    # Split after common sentence terminators, preserving the terminators
+    sentences = [match.group(0) for match in _SENTENCE.finditer(text) if match.group(0)]
+    
+    # Group sentences into chunks that don't exceed max_chunk_size
+    for sentence in sentences:
+        if current_parts and current_size + len(sentence) > max_chunk_size:
+            chunks.append("".join(current_parts))
+            current_parts = []
+            current_size = 0
+        current_parts.append(sentence)
+        current_size += len(sentence)
+    
+    # Add the last chunk if there is one
+    if current_parts:
+        chunks.append("".join(current_parts))
+    
+    return chunks
+
+def split_into_chunks_with_offsets(text: str, max_chunk_size: int = 1000) -> List[Tuple[int, str]]:
+    """
+    Splits text like split_into_chunks and pairs each chunk with its
+    character offset in the original text.
+    
+    Returns:
+        List of (offset, chunk) tuples in text order
+    """
+    chunks = []
+    offset = 0
+    for chunk in split_into_chunks(text, max_chunk_size):
+        chunks.append((offset, chunk))
+        offset += len(chunk)
+    return chunks
+
 def translate_long_text(text: str, source_lang: str = "auto", target_lang: str = "en", 
-                        max_chunk_size: int = 1000, delay_seconds: float = 0.5) -> str:
+                        max_chunk_size: int = 1000) -> str:
     """
     Translates a long text by breaking it into smaller chunks.
     
+    Chunks are translated concurrently through the pooled translation client;
+    its shared token bucket keeps the request rate under the upstream limit.
+    
     Args:
         text: Long text to translate
         source_lang: Source language code
         target_lang: Target language code
         max_chunk_size: Maximum characters per chunk
-        delay_seconds: Delay between API requests to avoid rate limiting
         
     Returns:
         Complete translated text
@@ -89,71 +103,96 @@ def translate_long_text(text: str, source_lang: str = "auto", target_lang: str =
     if not text.strip():
         return ""
     
-    # Simple chunking by sentences to avoid cutting in the middle of sentences
-    chunks = []
-    current_chunk = ""
-    
-    # Split by common sentence terminators, preserving the terminators
-    sentences = []
-    current_sentence = ""
+    chunks = split_into_chunks(text, max_chunk_size)
     
-    for char in text:
-        current_sentence += char
-        if char in ['.', '!', '?', '\n']:
-            sentences.append(current_sentence)
-            current_sentence = ""
+    # Translate chunks concurrently, keeping their original order
+    try:
+        translated_chunks = translation_client.translate_many(chunks, source_lang, target_lang)
+    except TranslationError:
+        raise
+    except Exception as e:
+        raise TranslationError(f"Unexpected error during translation: {str(e)}")
     
-    # Add any remaining text as the last sentence
-    if current_sentence:
-        sentences.append(current_sentence)
+    # Join translated chunks
+    return "".join(translated_chunks)
+
+def translate_segments(segments: List[str], source_lang: str = "auto", target_lang: str = "en") -> List[str]:
+    """
+    Translates many short segments (table cells, captions, list items),
+    packing them into as few upstream requests as the byte budget allows.
     
-    # Group sentences into chunks that don't exceed max_chunk_size
-    for sentence in sentences:
-        if len(current_chunk) + len(sentence) <= max_chunk_size:
-            current_chunk += sentence
-        else:
-            if current_chunk:
-                chunks.append(current_chunk)
-            current_chunk = sentence
+    Args:
+        segments: Segments to translate
+        source_lang: Source language code
+        target_lang: Target language code
+        
+    Returns:
+        Translated segments in input order
+    """
+    try:
+        return translation_client.translate_batch(segments, source_lang, target_lang)
+    except TranslationError:
+        raise
+    except Exception as e:
+        raise TranslationError(f"Unexpected error during translation: {str(e)}")
+
+def translate_units(units: List[str], source_lang: str = "auto", target_lang: str = "en") -> List[str]:
+    """
+    Translates the units of a page (paragraphs, captions, list items), each
+    cached on its own in the translation memory.
     
-    # Add the last chunk if there is one
-    if current_chunk:
-        chunks.append(current_chunk)
+    Units repeated on the page or found in the memory are not sent upstream;
+    the remaining short units are packed into batched requests and long
+    units are split into chunks.
     
-    # Translate each chunk with delays between requests
-    translated_chunks = []
-    for i, chunk in enumerate(chunks):
-        translated_chunks.append(translate(chunk, source_lang, target_lang))
+    Args:
+        units: Unit texts in reading order
+        source_lang: Source language code
+        target_lang: Target language code
         
-        # Add delay between requests to avoid rate limiting, except after the last chunk
-        if i < len(chunks) - 1:
-            time.sleep(delay_seconds)
+    Returns:
+        Translated units in input order
+    """
+    translations: Dict[str, str] = {}
+    missing: List[str] = []
+    seen = set()
+    for unit in units:
+        key = normalize_segment(unit)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        cached = get_cached_translation(unit, source_lang, target_lang)
+        if cached is not None:
+            translations[key] = cached
+        else:
+            missing.append(key)
     
-    # Join translated chunks
-    return "".join(translated_chunks)
-
-# Simple in-memory cache for translations
-_translation_cache: Dict[str, Dict[str, str]] = {}
+    short_units = [unit for unit in missing if len(unit.encode("utf-8")) <= TRANSLATE_BATCH_MAX_BYTES]
+    long_units = [unit for unit in missing if len(unit.encode("utf-8")) > TRANSLATE_BATCH_MAX_BYTES]
+    translated_units = translate_segments(short_units, source_lang, target_lang)
+    translated_units += [translate_long_text(unit, source_lang, target_lang) for unit in long_units]
+    for unit, translated in zip(short_units + long_units, translated_units):
+        translations[unit] = translated
+        cache_translation(unit, source_lang, target_lang, translated)
+    
+    return [translations.get(normalize_segment(unit), "") for unit in units]
 
 def get_cached_translation(text: str, source_lang: str, target_lang: str) -> Optional[str]:
-    """Gets a cached translation if available."""
-    cache_key = f"{source_lang}|{target_lang}"
-    if cache_key in _translation_cache and text in _translation_cache[cache_key]:
-        return _translation_cache[cache_key][text]
-    return None
+    """Gets a cached translation from the translation memory if available."""
+    return translation_memory.get(text, source_lang, target_lang)
 
 def cache_translation(text: str, source_lang: str, target_lang: str, translated_text: str) -> None:
-    """Caches a translation result."""
-    cache_key = f"{source_lang}|{target_lang}"
-    if cache_key not in _translation_cache:
-        _translation_cache[cache_key] = {}
-    _translation_cache[cache_key][text] = translated_text
+    """Stores a translation result in the translation memory."""
+    translation_memory.put(text, source_lang, target_lang, translated_text)
 
 def translate_with_cache(text: str, source_lang: str = "auto", target_lang: str = "en") -> str:
     """Translates text with caching for efficiency."""
-    # Check cache first
+    if not text.strip():
+        return ""
+    
+    # Check the translation memory first
     cached = get_cached_translation(text, source_lang, target_lang)
-    if cached:
+    if cached is not None:
         return cached
     
     # If not in cache, translate and then cache
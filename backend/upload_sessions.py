@@ -0,0 +1,313 @@
+"""
+MoziTranslate - Upload module
+Writes uploaded PDFs to disk chunk by chunk, hashing them and validating the
+PDF header as the bytes arrive, so memory per upload stays constant; large
+files can be sent as resumable chunked uploads
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from uuid import uuid4
+
+from config import PDF_STORE_DIR, UPLOAD_MAX_BYTES, UPLOAD_SESSION_TTL
+
+logger = logging.getLogger("upload_sessions")
+
+# A PDF file must start with this signature within its first kilobyte
+PDF_SIGNATURE = b"%PDF-"
+PDF_HEADER_WINDOW = 1024
+# Bytes that hold every possible position of the signature in the window
+_HEAD_SIZE = PDF_HEADER_WINDOW + len(PDF_SIGNATURE) - 1
+
+
+class UploadError(Exception):
+    """Exception raised for upload failures."""
+    pass
+
+
+class InvalidUploadError(UploadError):
+    """Exception raised when the uploaded bytes are not a PDF."""
+    pass
+
+
+class UploadTooLargeError(UploadError):
+    """Exception raised when an upload exceeds the size limit."""
+    pass
+
+
+class UploadNotFoundError(UploadError):
+    """Exception raised when an upload ID is unknown or expired."""
+    pass
+
+
+class UploadOffsetError(UploadError):
+    """Exception raised when a chunk does not continue the upload where it stands."""
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+class IncrementalUpload:
+    """
+    File written chunk by chunk to a temporary path. The SHA-256 digest and
+    the size are updated with every chunk, and the PDF header is checked as
+    soon as the first kilobyte has arrived.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = UPLOAD_MAX_BYTES, expected_size: Optional[int] = None):
+        if expected_size is not None and expected_size > max_bytes:
+            raise UploadTooLargeError(f"Upload of {expected_size} bytes exceeds the limit of {max_bytes} bytes")
+        os.makedirs(directory, exist_ok=True)
+        self.temp_path = os.path.join(directory, f"{uuid4().hex}.part")
+        self.max_bytes = max_bytes
+        self.expected_size = expected_size
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._head = b""
+        self._validated = False
+        open(self.temp_path, "wb").close()
+
+    def _check_header(self, final: bool) -> None:
+        """Validates the PDF signature once it has arrived, or once it can no longer arrive."""
+        if self._validated:
+            return
+        if PDF_SIGNATURE in self._head:
+            self._validated = True
+        elif final or len(self._head) >= _HEAD_SIZE:
+            raise InvalidUploadError("File is not a valid PDF")
+
+    def write(self, chunk: bytes) -> None:
+        """
+        Appends a chunk to the file.
+
+        Raises:
+            UploadTooLargeError: If the chunk takes the file over the size limit
+            InvalidUploadError: If the file does not start with a PDF header
+        """
+        if not chunk:
+            return
+        limit = self.max_bytes if self.expected_size is None else min(self.max_bytes, self.expected_size)
+        if self.size + len(chunk) > limit:
+            raise UploadTooLargeError(f"Upload exceeds the limit of {limit} bytes")
+        if not self._validated:
+            self._head = (self._head + chunk[:_HEAD_SIZE])[:_HEAD_SIZE]
+            self._check_header(final=False)
+
+        with open(self.temp_path, "ab") as f:
+            try:
+                f.write(chunk)
+                f.flush()
+            except BaseException:
+                # Drop a partially written chunk so the file matches its digest
+                f.truncate(self.size)
+                raise
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def finish(self) -> str:
+        """
+        Validates the complete file and returns its content hash.
+
+        Raises:
+            InvalidUploadError: If the file is empty, not a PDF or shorter than announced
+        """
+        if self.expected_size is not None and self.size != self.expected_size:
+            raise InvalidUploadError(f"Upload is incomplete: {self.size} of {self.expected_size} bytes received")
+        self._check_header(final=True)
+        return self._hash.hexdigest()
+
+    def discard(self) -> None:
+        """Removes the temporary file."""
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+
+class UploadSession:
+    """One resumable upload: its file so far and the time of its last chunk."""
+
+    def __init__(self, upload_id: str, filename: str, upload: IncrementalUpload):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.upload = upload
+        self.created_at = time.time()
+        self.last_activity = time.monotonic()
+        # Set while a chunk is being written; a second writer is rejected
+        self.busy = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the state reported to the client."""
+        return {
+            'upload_id': self.upload_id,
+            'filename': self.filename,
+            'offset': self.upload.size,
+            'total_size': self.upload.expected_size
+        }
+
+
+class UploadSessionManager:
+    """
+    Resumable uploads: a client announces the file size, sends the file in
+    chunks at increasing offsets and, after an interruption, asks for the
+    current offset and continues from there. Sessions without a chunk for
+    ``ttl`` seconds are discarded.
+    """
+
+    def __init__(self, directory: str = os.path.join(PDF_STORE_DIR, "incoming"),
+                 max_bytes: int = UPLOAD_MAX_BYTES, ttl: float = UPLOAD_SESSION_TTL):
+        # Temporary files live next to the store, so completed uploads are moved in without copying
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sessions: Dict[str, UploadSession] = {}
+        self._lock = threading.Lock()
+        self._completed = 0
+        self._expired = 0
+
+    def new_upload(self, expected_size: Optional[int] = None) -> IncrementalUpload:
+        """Starts a single-request upload under the same limits as the sessions."""
+        return IncrementalUpload(self.directory, self.max_bytes, expected_size)
+
+    def create(self, filename: str, total_size: int) -> UploadSession:
+        """
+        Starts a resumable upload.
+
+        Raises:
+            InvalidUploadError: If the announced size is not positive
+            UploadTooLargeError: If the announced size exceeds the limit
+        """
+        self.expire_stale()
+        if total_size <= 0:
+            raise InvalidUploadError("Upload size must be positive")
+        session = UploadSession(uuid4().hex, filename, self.new_upload(total_size))
+        with self._lock:
+            self._sessions[session.upload_id] = session
+        logger.info(f"Started upload {session.upload_id} of {filename} ({total_size} bytes)")
+        return session
+
+    def get(self, upload_id: str) -> UploadSession:
+        """
+        Returns an upload session.
+
+        Raises:
+            UploadNotFoundError: If the ID is unknown or expired
+        """
+        with self._lock:
+            session = self._sessions.get(upload_id)
+        if session is None:
+            raise UploadNotFoundError(f"Upload {upload_id} not found")
+        return session
+
+    def begin_chunk(self, upload_id: str, offset: int) -> UploadSession:
+        """
+        Reserves a session for writing a chunk that starts at ``offset``;
+        ``end_chunk`` must be called afterwards.
+
+        Raises:
+            UploadNotFoundError: If the ID is unknown or expired
+            UploadOffsetError: If the offset is not the current size or another chunk is being written
+        """
+        with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is None:
+                raise UploadNotFoundError(f"Upload {upload_id} not found")
+            if session.busy:
+                raise UploadOffsetError(f"Upload {upload_id} is receiving another chunk", session.upload.size)
+            if offset != session.upload.size:
+                raise UploadOffsetError(
+                    f"Chunk starts at {offset} but upload {upload_id} is at {session.upload.size}",
+                    session.upload.size
+                )
+            session.busy = True
+            session.last_activity = time.monotonic()
+            return session
+
+    def end_chunk(self, session: UploadSession) -> None:
+        """Releases a session reserved by ``begin_chunk``; releasing twice is harmless."""
+        with self._lock:
+            session.busy = False
+            session.last_activity = time.monotonic()
+
+    def complete(self, upload_id: str) -> Tuple[UploadSession, str]:
+        """
+        Ends a session whose bytes have all arrived. The caller takes over
+        its temporary file.
+
+        Returns:
+            Tuple of (session, content_hash)
+
+        Raises:
+            UploadNotFoundError: If the ID is unknown or expired
+            UploadOffsetError: If bytes are missing or a chunk is being written
+            InvalidUploadError: If the file is not a PDF (the session is discarded)
+        """
+        with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is None:
+                raise UploadNotFoundError(f"Upload {upload_id} not found")
+            upload = session.upload
+            if session.busy or upload.size != upload.expected_size:
+                raise UploadOffsetError(
+                    f"Upload {upload_id} is incomplete: {upload.size} of {upload.expected_size} bytes received",
+                    upload.size
+                )
+            del self._sessions[upload_id]
+        try:
+            content_hash = upload.finish()
+        except InvalidUploadError:
+            upload.discard()
+            raise
+        with self._lock:
+            self._completed += 1
+        return session, content_hash
+
+    def abort(self, upload_id: str) -> None:
+        """
+        Discards a session and its bytes.
+
+        Raises:
+            UploadNotFoundError: If the ID is unknown or expired
+            UploadOffsetError: If a chunk is being written
+        """
+        with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is None:
+                raise UploadNotFoundError(f"Upload {upload_id} not found")
+            if session.busy:
+                raise UploadOffsetError(f"Upload {upload_id} is receiving a chunk", session.upload.size)
+            del self._sessions[upload_id]
+        session.upload.discard()
+
+    def expire_stale(self) -> int:
+        """Discards sessions without a chunk for longer than the TTL and returns how many were discarded."""
+        deadline = time.monotonic() - self.ttl
+        with self._lock:
+            stale = [session for session in self._sessions.values()
+                     if not session.busy and session.last_activity < deadline]
+            for session in stale:
+                del self._sessions[session.upload_id]
+            self._expired += len(stale)
+        for session in stale:
+            session.upload.discard()
+            logger.info(f"Discarded stale upload {session.upload_id}")
+        return len(stale)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Returns active session and completion counters."""
+        with self._lock:
+            return {
+                'active': len(self._sessions),
+                'bytes_pending': sum(session.upload.size for session in self._sessions.values()),
+                'completed': self._completed,
+                'expired': self._expired,
+                'max_bytes': self.max_bytes
+            }
+
+
+# Initialize global upload session manager instance
+upload_sessions = UploadSessionManager()
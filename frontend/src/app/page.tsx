@@ -16,26 +16,22 @@ export default function Home() {
     history,
     isLoading,
     error,
-    addToHistory,
     updateProgress,
     removeFromHistory,
     clearHistory,
+    refreshHistory,
   } = usePdfHistoryDB();
   // Handle file upload with history tracking
-  const handleFileUploaded = (newDocId: string, fileName?: string) => {
+  const handleFileUploaded = (newDocId: string, fileName?: string, newPdfId?: string, lastPage?: number) => {
+    // doc_id is this tab's own ID of the document; pdf_id is shared with other readers of the file
+    const historyId = newPdfId || newDocId;
     setDocId(newDocId);
-    setPdfId(newDocId); // For new uploads, doc_id and pdf_id are the same
-    setStartingPage(1);
-      // Add to history when a new PDF is uploaded
-    if (fileName) {
-      addToHistory({
-        pdf_id: newDocId,
-        filename: fileName,
-        total_pages: 0, // Will be updated when first page loads
-        language: 'Português',
-        language_flag: '🇧🇷',
-      }).catch(console.error);
-    }
+    setPdfId(historyId);
+    // A file already in the history opens where the reader stopped
+    setStartingPage(lastPage || 1);
+    // The server records the upload in the history (keeping the progress of a
+    // known file), so the list only needs to be reloaded
+    refreshHistory().catch(console.error);
   };  // Handle selecting PDF from history
   const handleSelectFromHistory = async (pdfId: string, lastPage?: number) => {
     try {
@@ -63,17 +59,17 @@ export default function Home() {
     setPdfId(null);
     setStartingPage(1);
   };  // Handle removing PDF from history
-  const handleRemoveFromHistory = async (pdfId: string) => {
+  const handleRemoveFromHistory = async (removedPdfId: string) => {
     try {
       // If the currently opened PDF is being removed, close it immediately
       // This prevents the component from trying to load a document that's being deleted
-      if (docId === pdfId) {
+      if (pdfId === removedPdfId) {
         setDocId(null);
         setPdfId(null);
         setStartingPage(1);
       }
       
-      await removeFromHistory(pdfId);
+      await removeFromHistory(removedPdfId);
     } catch (error) {
       console.error('Failed to remove PDF from history:', error);
     }
@@ -4,7 +4,7 @@ import React, { useState, useRef, useEffect } from 'react';
 import axios from 'axios';
 
 interface FileUploaderProps {
-  onFileUploaded: (docId: string, fileName?: string) => void;
+  onFileUploaded: (docId: string, fileName?: string, pdfId?: string, lastPage?: number) => void;
 }
 
 const FileUploader: React.FC<FileUploaderProps> = ({ onFileUploaded }) => {
@@ -166,7 +166,7 @@ const FileUploader: React.FC<FileUploaderProps> = ({ onFileUploaded }) => {
         setUploadSuccess(true);
           // Small delay to show the full progress bar and success state before transitioning
         setTimeout(() => {
-          onFileUploaded(response.data.doc_id, file.name);
+          onFileUploaded(response.data.doc_id, file.name, response.data.pdf_id, response.data.last_page);
         }, 800);
       } else {
         throw new Error('Resposta inválida do servidor');
@@ -15,14 +15,16 @@ interface WheelState {
 }
 
 interface PdfViewerProps {
-  pageImage: string;
+  imageUrl: string;
+  previewUrl?: string;
   isLoading: boolean;
   pageNumber: number;
   totalPages: number;
 }
 
 const PdfViewer: React.FC<PdfViewerProps> = ({ 
-  pageImage, 
+  imageUrl, 
+  previewUrl,
   isLoading, 
   pageNumber, 
   totalPages 
@@ -45,13 +47,13 @@ const PdfViewer: React.FC<PdfViewerProps> = ({
   
   // Reset image loading state when page changes
   useEffect(() => {
-    if (prevPageRef.current !== pageImage) {
+    if (prevPageRef.current !== imageUrl) {
       setImgLoading(true);
       setImgError(false);
-      prevPageRef.current = pageImage;
+      prevPageRef.current = imageUrl;
       setPan({ x: 0, y: 0 });
     }
-  }, [pageImage]);
+  }, [imageUrl]);
 
   // Scroll to top when changing pages
   useEffect(() => {
@@ -136,19 +138,19 @@ const PdfViewer: React.FC<PdfViewerProps> = ({
 
   // Safety check to retry loading the image if it fails
   useEffect(() => {
-    if (imgError && pageImage && imgRef.current) {
+    if (imgError && imageUrl && imgRef.current) {
       const timer = setTimeout(() => {
         if (imgRef.current) {
           setImgError(false);
           setImgLoading(true);
           // Force a reload by updating the src
-          imgRef.current.src = `data:image/png;base64,${pageImage}?reload=${Date.now()}`;
+          imgRef.current.src = `${imageUrl}&reload=${Date.now()}`;
         }
       }, 1500);
       
       return () => clearTimeout(timer);
     }
-  }, [imgError, pageImage]);
+  }, [imgError, imageUrl]);
   
   // Toggle full screen mode
   const toggleFullScreen = () => {
@@ -281,9 +283,19 @@ const PdfViewer: React.FC<PdfViewerProps> = ({
               Carregando página {pageNumber} de {totalPages}...
             </p>
           </div>
-        ) : pageImage ? (
+        ) : imageUrl ? (
           <div className="relative h-full flex-1 min-h-0 pdf-viewer overflow-auto" ref={viewportRef}>
-            {imgLoading && (
+            {imgLoading && previewUrl && (
+              // Low-resolution preview shown while the full image is being rendered
+              <div className="absolute inset-0 flex justify-center items-center p-2 bg-neutral-50 dark:bg-neutral-900 z-10">
+                <img
+                  src={previewUrl}
+                  alt={`Pré-visualização da página ${pageNumber}`}
+                  className="max-w-full max-h-full h-auto w-auto object-contain blur-[1px]"
+                />
+              </div>
+            )}
+            {imgLoading && !previewUrl && (
               <div className="absolute inset-0 flex justify-center items-center bg-neutral-50 dark:bg-neutral-900 z-10">
                 <div className="relative w-12 h-12">
                   <div className="absolute inset-0 rounded-full border-3 border-primary-200 dark:border-primary-900"></div>
@@ -294,7 +306,7 @@ const PdfViewer: React.FC<PdfViewerProps> = ({
             <div className="flex justify-center items-center p-2 overflow-auto min-h-[400px] h-full pdf-page">
               <img
                 ref={imgRef}
-                src={`data:image/png;base64,${pageImage}`}
+                src={imageUrl}
                 alt={`PDF página ${pageNumber}`}                className="max-w-full max-h-full h-auto w-auto object-contain transition-all duration-300 ease-out"
                 style={{ 
                   transform: `scale(${zoomLevel}) translate(${pan.x}px, ${pan.y}px) rotate(${rotationDegree}deg)`,
@@ -332,7 +344,7 @@ const PdfViewer: React.FC<PdfViewerProps> = ({
                         setImgError(false);
                         setImgLoading(true);
                         if (imgRef.current) {
-                          imgRef.current.src = `data:image/png;base64,${pageImage}?reload=${Date.now()}`;
+                          imgRef.current.src = `${imageUrl}&reload=${Date.now()}`;
                         }
                       }}
                     >
@@ -2,6 +2,7 @@
 
 import { useState, useEffect, useCallback, useRef } from 'react';
 import PdfViewer from './PdfViewer';
+import { getPageImageUrl } from '@/utils/api';
 import TranslationPanel from './TranslationPanel';
 import usePdfTranslation from '@/hooks/usePdfTranslation';
 import usePageNavigation from '@/hooks/usePageNavigation';
@@ -567,7 +568,8 @@ const TranslatedView: React.FC<TranslatedViewProps> = ({
         {(!isMobile || activeTab === 'original') && (
           <div className="bg-white dark:bg-neutral-800 p-3 rounded-xl shadow-md border border-neutral-200 dark:border-neutral-700 transition-all duration-300 flex flex-col h-full min-h-0 overflow-auto">
             <PdfViewer 
-              pageImage={pageData?.page_image || ''} 
+              imageUrl={getPageImageUrl(pageData?.image_url || '')} 
+              previewUrl={getPageImageUrl(pageData?.preview_url || '')}
               isLoading={isLoading}
               pageNumber={currentPage}
               totalPages={totalPages}
@@ -71,13 +71,12 @@ export const usePdfHistoryDB = (): UsePdfHistoryDBReturn => {
   }) => {
     try {
       setError(null);
+      // The reading progress is left out, so re-adding a known PDF keeps it
       await addPdfToHistory({
         pdf_id: pdfData.pdf_id,
         filename: pdfData.filename,
         file_path: pdfData.file_path || '',
-        last_page: 1,
-        total_pages: pdfData.total_pages || 0,
-        progress: 0,
+        total_pages: pdfData.total_pages,
         language: pdfData.language || 'Português',
         language_flag: pdfData.language_flag || '🇧🇷',
         upload_date: new Date().toISOString()
@@ -3,10 +3,21 @@
 import { useState, useCallback, useEffect } from 'react';
 import axios from 'axios';
 
+interface PageSegment {
+  text: string;
+  translated_text: string;
+  bbox: [number, number, number, number];
+}
+
 interface PageData {
-  page_image: string;
+  image_url: string;
+  preview_url: string;
+  tile_url: string;
+  page_width: number;
+  page_height: number;
   original_text: string;
   translated_text: string;
+  segments: PageSegment[];
   page_number: number;
   total_pages: number;
 }
@@ -79,7 +90,9 @@ const usePdfTranslation = (
           {
             params: {
               source_lang: sourceLang,
-              target_lang: targetLang
+              target_lang: targetLang,
+              // Lets the server tell prefetches from foreground reads
+              prefetch: true
             }
           }
         );
@@ -1,15 +1,25 @@
 import axios from 'axios';
 
-const API_BASE_URL = 'http://localhost:8000';
+export const API_BASE_URL = 'http://localhost:8000';
 
 export interface UploadResponse {
+  // This client's ID of the open document, for the /pdf/{doc_id} endpoints
   doc_id: string;
+  // ID of the document in the history, shared by every client of the file
+  pdf_id: string;
   page_count: number;
   filename: string;
+  already_known?: boolean;
+  // Page the reader stopped at, for files already in the history
+  last_page?: number;
 }
 
 export interface PageResponse {
-  page_image: string;
+  image_url: string;
+  preview_url: string;
+  tile_url: string;
+  page_width: number;
+  page_height: number;
   original_text: string;
   translated_text: string;
   page_number: number;
@@ -33,6 +43,29 @@ export interface PdfHistoryItem {
 export interface HistoryResponse {
   status: string;
   data: PdfHistoryItem[];
+  next_cursor?: string | null;
+}
+
+export interface HistoryQuery {
+  limit?: number;
+  cursor?: string | null;
+  search?: string;
+  language?: string;
+  completed?: boolean;
+}
+
+export interface LanguageStats {
+  language: string;
+  total_documents: number;
+  completed_documents: number;
+  average_progress: number;
+  total_pages_read: number;
+}
+
+export interface DailyStats {
+  date: string;
+  uploaded: number;
+  last_read: number;
 }
 
 export interface HistoryStatsResponse {
@@ -42,6 +75,8 @@ export interface HistoryStatsResponse {
     completed_documents: number;
     average_progress: number;
     total_pages_read: number;
+    by_language: LanguageStats[];
+    by_day: DailyStats[];
   };
 }
 
@@ -95,6 +130,31 @@ export const getPage = async (
   return response.data;
 };
 
+// Build the absolute URL of a page image returned by the API
+export const getPageImageUrl = (imageUrl: string): string =>
+  imageUrl ? `${API_BASE_URL}${imageUrl}` : '';
+
+export interface PageSearchResult {
+  page_number: number;
+  language: string | null;
+  original: boolean;
+  score: number;
+  snippet: string;
+  highlights: [number, number][];
+}
+
+// Find the pages whose original or translated text contains every word of the query
+export const searchDocument = async (
+  docId: string,
+  query: string,
+  language?: string
+): Promise<{ results: PageSearchResult[]; indexed_pages: number; total_pages: number }> => {
+  const response = await axios.get(`${API_BASE_URL}/pdf/${docId}/search`, {
+    params: language ? { q: query, language } : { q: query }
+  });
+  return response.data.data;
+};
+
 // Close a document and free resources
 export const closeDocument = async (docId: string): Promise<void> => {
   await axios.delete(`${API_BASE_URL}/pdf/${docId}`);
@@ -119,6 +179,20 @@ export const getPdfHistory = async (limit: number = 10): Promise<PdfHistoryItem[
   return response.data.data;
 };
 
+// Get one page of PDF history; pass next_cursor back to get the following page
+export const getPdfHistoryPage = async (
+  query: HistoryQuery = {}
+): Promise<{ items: PdfHistoryItem[]; nextCursor: string | null }> => {
+  const params: Record<string, string | number | boolean> = { limit: query.limit ?? 10 };
+  if (query.cursor) params.cursor = query.cursor;
+  if (query.search) params.search = query.search;
+  if (query.language) params.language = query.language;
+  if (query.completed !== undefined) params.completed = query.completed;
+
+  const response = await axios.get<HistoryResponse>(`${API_BASE_URL}/pdf/history`, { params });
+  return { items: response.data.data, nextCursor: response.data.next_cursor ?? null };
+};
+
 // Add or update PDF in history
 export const addPdfToHistory = async (pdfData: AddPdfHistoryRequest): Promise<void> => {
   await axios.post(`${API_BASE_URL}/pdf/history`, pdfData);
@@ -146,6 +220,10 @@ export const getPdfFromHistory = async (pdfId: string): Promise<PdfHistoryItem>
   return response.data.data;
 };
 
+// Build the URL of a small cacheable thumbnail of a history entry (the first page by default)
+export const getPdfThumbnailUrl = (pdfId: string, page: number = 1): string =>
+  `${API_BASE_URL}/pdf/history/${pdfId}/thumbnail?page=${page}`;
+
 // Remove PDF from history
 export const removePdfFromHistory = async (pdfId: string): Promise<void> => {
   await axios.delete(`${API_BASE_URL}/pdf/history/${pdfId}`);